@@ -0,0 +1,66 @@
+import argparse
+import logging
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chime_reminder import extract_content
+from html_backends import available_backends, section_items
+from synthetic_docs import daily_reminder_doc
+
+# Compares the extract_content parser backends on synthetic docs from 10 KB
+# to 10 MB and checks that every backend extracts identical sections.
+#
+#   python benchmarks/bench_html_backends.py --sizes 10000,1000000
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def time_backend(html, backend, repeat):
+    best = None
+    for _ in range(repeat):
+        started = perf_counter()
+        section_items(html, backend)
+        elapsed = perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extract_content HTML parser backends")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='comma separated document sizes in bytes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backends', default=','.join(available_backends()))
+    args = parser.parse_args(argv)
+    logging.getLogger('chime_reminder').setLevel(logging.WARNING)
+
+    backends = args.backends.split(',')
+    sizes = [int(s) for s in args.sizes.split(',')]
+    mismatches = 0
+
+    print(f"{'doc':<24}" + ''.join(f"{name:>14}" for name in backends))
+    for size in sizes:
+        for history_first in (False, True):
+            html = daily_reminder_doc(size, history_first=history_first)
+            label = f"{len(html) / 1000:,.0f} KB{' (list last)' if history_first else ''}"
+            repeat = 1 if size >= 5_000_000 else args.repeat
+            timings = [time_backend(html, name, repeat) for name in backends]
+            print(f"{label:<24}" + ''.join(f"{t * 1000:>12.1f}ms" for t in timings))
+
+            results = {name: extract_content(html, parser_backend=name) for name in backends}
+            reference = results[backends[0]]
+            for name, sections in results.items():
+                if sections != reference:
+                    mismatches += 1
+                    print(f"  sections from {name} differ from {backends[0]}")
+
+    print("All backends extracted identical sections" if not mismatches
+          else f"{mismatches} backend results differ")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
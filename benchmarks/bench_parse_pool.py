@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminder_runner import available_cores, run_extractor
+from synthetic_docs import daily_reminder_doc, roster_doc
+
+# Scaling of the runner's process-pool extract stage (--parse-processes).
+# Extracts a mix of synthetic daily-reminder and roster docs in one
+# process, then through pools of 1, 2, 4, ... workers up to the available
+# cores, and reports the speedup over one process. Every pool must return
+# the same results as the serial run.
+#
+#   python benchmarks/bench_parse_pool.py --docs 60 --doc-bytes 100000
+
+DEFAULT_DOCS = 60
+DEFAULT_DOC_BYTES = 100_000
+DEFAULT_ROSTER_ROWS = 400
+
+
+def synthetic_docs(count, doc_bytes, roster_rows):
+    # Two daily docs for every roster doc, each with its own seed
+    docs = []
+    for index in range(count):
+        if index % 3 == 2:
+            docs.append(('roster', roster_doc(roster_rows, seed=index)))
+        else:
+            docs.append(('daily', daily_reminder_doc(doc_bytes, seed=index)))
+    return docs
+
+
+def worker_counts(cores):
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def time_serial(docs):
+    started = perf_counter()
+    results = [run_extractor(extractor, html) for extractor, html in docs]
+    return perf_counter() - started, results
+
+
+def time_pool(docs, workers):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Start the workers and import the extractors before timing
+        list(pool.map(run_extractor, ['daily'] * workers, ['<ul></ul>'] * workers))
+        started = perf_counter()
+        results = list(pool.map(run_extractor, *zip(*docs)))
+        return perf_counter() - started, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark extraction in a process pool')
+    parser.add_argument('--docs', type=int, default=DEFAULT_DOCS)
+    parser.add_argument('--doc-bytes', type=int, default=DEFAULT_DOC_BYTES)
+    parser.add_argument('--roster-rows', type=int, default=DEFAULT_ROSTER_ROWS)
+    parser.add_argument('--max-workers', type=int, default=available_cores())
+    args = parser.parse_args(argv)
+
+    docs = synthetic_docs(args.docs, args.doc_bytes, args.roster_rows)
+    print(f"{len(docs)} docs, {sum(len(html) for _, html in docs) / 1e6:.1f} MB, "
+          f"{available_cores()} cores available")
+    serial, expected = time_serial(docs)
+    print(f"{'in process':<14}{serial * 1000:>10.0f}ms")
+
+    mismatches = 0
+    for workers in worker_counts(args.max_workers):
+        elapsed, results = time_pool(docs, workers)
+        speedup = serial / elapsed
+        print(f"{f'{workers} workers':<14}{elapsed * 1000:>10.0f}ms  {speedup:5.2f}x  "
+              f"{speedup / workers:4.0%} per worker")
+        if results != expected:
+            mismatches += 1
+            print(f"  results from {workers} workers differ from the serial run")
+
+    print("All pools extracted identical results" if not mismatches
+          else f"{mismatches} pool results differ")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
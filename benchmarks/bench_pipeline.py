@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup
+
+import chime_reminder
+import chime_reminder_1
+from fake_services import FakeServices
+from http_session import HttpTransport
+from quip_client import SimpleQuipClient
+from reminder_runner import FanOutRunner, Job
+from state_store import open_state_store
+from synthetic_docs import daily_reminder_doc, roster_doc
+
+# Load test for the fetch -> extract -> format -> post pipeline. Synthetic
+# docs are served by a local fake Quip API and posts go to a fake Chime
+# webhook. Reports per-stage p50/p99 latency and end-to-end throughput for
+# several doc sizes and job counts, plus peak RSS, and writes everything
+# to a JSON file so runs from different commits can be compared:
+#
+#   python benchmarks/bench_pipeline.py --output before.json
+#   python benchmarks/bench_pipeline.py --output after.json --compare before.json
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_ROSTER_ROWS = [11, 200, 2000]
+DEFAULT_JOB_COUNTS = [1, 10, 50]
+NOW = datetime(2024, 5, 6, 11, 0, tzinfo=ZoneInfo('America/Los_Angeles'))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'iterations': len(samples),
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'mean_ms': sum(samples) / len(samples) * 1000,
+    }
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_stage(func, iterations):
+    samples = []
+    result = None
+    for _ in range(iterations):
+        started = perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+        samples.append(perf_counter() - started)
+    return result, samples
+
+
+def extract_roster(html):
+    index = chime_reminder_1.build_roster_index(BeautifulSoup(html, 'html.parser'))
+    return chime_reminder_1.extract_roster_data(index, NOW.strftime('%A'), chime_reminder_1.get_sweep_period(NOW.hour))
+
+
+def bench_stages(services, client, transport, doc_kind, label, html, iterations):
+    thread_id = f"{doc_kind}-{label}"
+    services.add_doc(thread_id, html)
+    webhook = services.webhook_url(thread_id)
+
+    _, fetch = time_stage(lambda: client.get_thread(thread_id), iterations)
+    if doc_kind == 'daily':
+        extracted, extract = time_stage(lambda: chime_reminder.extract_content(html), iterations)
+        message, fmt = time_stage(lambda: chime_reminder.format_message(extracted, NOW.strftime('%A')), iterations)
+    else:
+        extracted, extract = time_stage(lambda: extract_roster(html), iterations)
+        message, fmt = time_stage(lambda: chime_reminder_1.format_message(extracted), iterations)
+    _, post = time_stage(lambda: transport.post(webhook, json={'Content': message}), iterations)
+
+    rows = []
+    for stage, samples in [('fetch', fetch), ('extract', extract), ('format', fmt), ('post', post)]:
+        row = {'doc': doc_kind, 'doc_label': label, 'doc_bytes': len(html), 'stage': stage}
+        row.update(summarize(samples))
+        # Process high-water mark so far; sizes run in ascending order
+        row['peak_rss_kb'] = peak_rss_kb()
+        rows.append(row)
+        print(f"{doc_kind:<7}{label:>14}{len(html) / 1000:>12,.0f} KB  {stage:<8}"
+              f"p50 {row['p50_ms']:>9.2f} ms  p99 {row['p99_ms']:>9.2f} ms")
+    return rows
+
+
+def bench_end_to_end(services, transport, job_count, doc_bytes, iterations):
+    jobs = []
+    for index in range(job_count):
+        kind = 'daily' if index % 2 == 0 else 'roster'
+        thread_id = f"e2e-{doc_bytes}-{index}"
+        services.add_doc(thread_id, daily_reminder_doc(doc_bytes, seed=index) if kind == 'daily'
+                         else roster_doc(seed=index))
+        jobs.append(Job(thread_id, thread_id, kind, kind, [services.webhook_url(thread_id)],
+                        send_times=[(NOW.hour, NOW.minute)]))
+
+    client = SimpleQuipClient('benchmark', transport=transport, base_url=services.quip_url)
+    samples = []
+    with tempfile.TemporaryDirectory() as state_dir, \
+            open_state_store(os.path.join(state_dir, 'state.db')) as state_store:
+        runner = FanOutRunner(jobs, client, transport, state_store, force=True)
+        for iteration in range(iterations):
+            # Forced slots are per second; a new one each time so every
+            # iteration posts instead of finding its slot done in the outbox
+            now = (NOW + timedelta(seconds=iteration)).astimezone(timezone.utc)
+            started = perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                outcome = asyncio.run(runner.tick(now))
+            samples.append(perf_counter() - started)
+            if not all(outcome.values()):
+                raise RuntimeError(f"end-to-end tick failed: {outcome}")
+
+    row = {'jobs': job_count, 'doc_bytes': doc_bytes}
+    row.update(summarize(samples))
+    row['throughput_jobs_per_s'] = job_count / (sum(samples) / len(samples))
+    row['peak_rss_kb'] = peak_rss_kb()
+    print(f"e2e  {job_count:>4} jobs {doc_bytes / 1000:>8,.0f} KB  "
+          f"p50 {row['p50_ms']:>9.2f} ms  p99 {row['p99_ms']:>9.2f} ms  "
+          f"{row['throughput_jobs_per_s']:>8.1f} jobs/s")
+    return row
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    previous = {(r['doc'], r['doc_label'], r['stage']): r for r in baseline.get('stages', [])}
+    for row in results['stages']:
+        old = previous.get((row['doc'], row['doc_label'], row['stage']))
+        if old and old['p50_ms']:
+            ratio = row['p50_ms'] / old['p50_ms']
+            print(f"  {row['doc']:<7}{row['doc_label']:>14} {row['stage']:<8} p50 x{ratio:.2f}")
+    previous = {(r['jobs'], r['doc_bytes']): r for r in baseline.get('end_to_end', [])}
+    for row in results['end_to_end']:
+        old = previous.get((row['jobs'], row['doc_bytes']))
+        if old:
+            ratio = row['throughput_jobs_per_s'] / old['throughput_jobs_per_s']
+            print(f"  e2e {row['jobs']:>4} jobs {row['doc_bytes']:>10} B throughput x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the reminder pipeline against fake services')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='daily doc sizes in bytes')
+    parser.add_argument('--roster-rows', default=','.join(map(str, DEFAULT_ROSTER_ROWS)),
+                        help='roster rows per sweep')
+    parser.add_argument('--jobs', default=','.join(map(str, DEFAULT_JOB_COUNTS)),
+                        help='job counts for the end-to-end runs')
+    parser.add_argument('--e2e-doc-bytes', type=int, default=100_000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='simulated network latency per fake request')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'stages': [],
+        'end_to_end': [],
+    }
+
+    with FakeServices(latency=args.latency_ms / 1000) as services:
+        transport = HttpTransport(pool_maxsize=64)
+        client = SimpleQuipClient('benchmark', transport=transport, base_url=services.quip_url)
+        for size in [int(s) for s in args.sizes.split(',')]:
+            results['stages'] += bench_stages(services, client, transport, 'daily', f"{size}B",
+                                              daily_reminder_doc(size), args.iterations)
+        for rows in [int(r) for r in args.roster_rows.split(',')]:
+            html = roster_doc(rows_per_sweep=rows, extra_columns=7)
+            results['stages'] += bench_stages(services, client, transport, 'roster', f"{rows}rows",
+                                              html, args.iterations)
+        for job_count in [int(j) for j in args.jobs.split(',')]:
+            results['end_to_end'].append(
+                bench_end_to_end(services, transport, job_count, args.e2e_doc_bytes,
+                                 max(1, args.iterations // 4)))
+        results['posts_captured'] = len(services.posts)
+
+    results['peak_rss_kb'] = peak_rss_kb()
+    print(f"\nPeak RSS: {results['peak_rss_kb'] / 1024:.1f} MB, {results['posts_captured']} posts captured")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
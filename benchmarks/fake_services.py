@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# In-process stand-ins for the Quip API and Chime webhooks, for benchmarks
+# and load tests. Quip threads are served from FakeServices.docs at
+# /1/threads/<id> (with ETag / 304 support) and /1/threads/?ids=a,b; any
+# POST is recorded as a Chime message. Ids in bulk_omit are left out of
+# bulk answers, as Quip does for threads it can't return that way. fail()
+# queues error responses that the next requests (or the next of one
+# method) get instead, to exercise retries.
+
+
+class FakeServices:
+    def __init__(self, latency=0.0):
+        self.docs = {}      # thread id -> {'html': ..., 'updated_usec': ...}
+        self.posts = []     # (path, payload)
+        self.failures = []  # (status, headers, method) answered before anything else
+        self.requests = []  # (method, path) of every request
+        self.latency = latency
+        self.post_status = 200  # answer to a POST that isn't failed
+        self.bulk_omit = set()  # ids the bulk endpoint leaves out of its answer
+        self.lock = threading.Lock()
+        self.server = None
+
+    def add_doc(self, thread_id, html, updated_usec=1):
+        self.docs[thread_id] = {'html': html, 'updated_usec': updated_usec}
+
+    def fail(self, status, times=1, headers=None, method=None):
+        with self.lock:
+            self.failures.extend([(status, headers or {}, method)] * times)
+
+    def _next_failure(self, method, path):
+        with self.lock:
+            self.requests.append((method, path))
+            for index, (status, headers, only) in enumerate(self.failures):
+                if only is None or only == method:
+                    del self.failures[index]
+                    return status, headers
+            return None
+
+    def thread_json(self, thread_id):
+        doc = self.docs[thread_id]
+        return {'thread': {'id': thread_id, 'updated_usec': doc['updated_usec']}, 'html': doc['html']}
+
+    def start(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Send headers and body in one segment; otherwise Nagle plus
+            # delayed ACKs add ~40 ms to every keep-alive request
+            disable_nagle_algorithm = True
+            wbufsize = 64 * 1024
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _failed(self):
+                failure = services._next_failure(self.command, self.path)
+                if failure is None:
+                    return False
+                status, headers = failure
+                length = int(self.headers.get('Content-Length', 0))
+                if length:
+                    self.rfile.read(length)
+                self._send(status, b'{"error": "injected"}', headers)
+                return True
+
+            def do_GET(self):
+                if services.latency:
+                    time.sleep(services.latency)
+                if self._failed():
+                    return
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split('/') if part]
+                if parts[-1:] == ['threads']:
+                    ids = parse_qs(url.query).get('ids', [''])[0].split(',')
+                    body = {thread_id: services.thread_json(thread_id)
+                            for thread_id in ids
+                            if thread_id in services.docs and thread_id not in services.bulk_omit}
+                    return self._send(200, json.dumps(body).encode(), {'Content-Type': 'application/json'})
+                thread_id = parts[-1] if parts else ''
+                if thread_id not in services.docs:
+                    return self._send(404, b'{"error": "not found"}')
+                etag = f'"{thread_id}-{services.docs[thread_id]["updated_usec"]}"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, b'', {'ETag': etag})
+                body = json.dumps(services.thread_json(thread_id)).encode()
+                self._send(200, body, {'Content-Type': 'application/json', 'ETag': etag})
+
+            def do_POST(self):
+                if services.latency:
+                    time.sleep(services.latency)
+                if self._failed():
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with services.lock:
+                    services.posts.append((self.path, payload))
+                if services.post_status == 204:
+                    return self._send(204)
+                self._send(services.post_status, b'{"ok": true}', {'Content-Type': 'application/json'})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def quip_url(self):
+        return self.base_url + '/1'
+
+    def webhook_url(self, name):
+        return f"{self.base_url}/webhook/{name}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_services import FakeServices
+from replay import run_golden
+from synthetic_docs import daily_reminder_doc, roster_doc
+
+# Rebuilds the committed replay fixtures in fixtures/ from synthetic docs:
+# each script is recorded (--record --dry-run) against a fake Quip API
+# serving its doc, then its golden week is written from the recording.
+# Only needed when the synthetic docs or the fixture format change; after
+# a deliberate change to the messages, `replay.py golden ... --update` is
+# enough.
+#
+#   python benchmarks/make_fixtures.py
+
+DEFAULT_OUTPUT = os.path.join(ROOT, 'fixtures')
+
+# (fixture directory, script, doc id variable, webhook variable, doc html)
+FIXTURES = [
+    ('daily', 'chime_reminder', 'QUIP_DOC_ID', 'CHIME_WEBHOOK_URL',
+     lambda: daily_reminder_doc(20_000, seed=17)),
+    ('roster', 'chime_reminder_1', 'QUIP_DOCUMENT_ID_1', 'CHIME_WEBHOOK_URL_1',
+     lambda: roster_doc(seed=17)),
+]
+
+
+def record(services, directory, script, doc_var, webhook_var, state_dir):
+    doc_id = f'synthetic-{script}'
+    env = dict(os.environ, QUIP_BASE_URL=services.quip_url, QUIP_API_TOKEN='synthetic-token',
+               FORCE_SEND='true', LOG_LEVEL='WARNING',
+               STATE_PATH=os.path.join(state_dir, 'state.db'),
+               OUTBOX_PATH=os.path.join(state_dir, 'outbox.db'),
+               QUIP_CACHE_DIR=os.path.join(state_dir, 'quip_cache'),
+               RENDER_CACHE_DIR=os.path.join(state_dir, 'render_cache'))
+    env[doc_var] = doc_id
+    env[webhook_var] = services.webhook_url('room?token=synthetic')
+    for name in ('ROSTER_TASKS_PATH', 'ROSTER_LAYOUT_PATH', 'DAILY_SECTIONS_PATH'):
+        env.pop(name, None)
+    subprocess.run([sys.executable, f'{script}.py', '--record', directory, '--dry-run'],
+                   env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild the replay fixtures from synthetic docs')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args(argv)
+
+    with FakeServices() as services, tempfile.TemporaryDirectory() as state_dir:
+        for name, script, doc_var, webhook_var, doc in FIXTURES:
+            directory = os.path.join(args.output, name)
+            shutil.rmtree(directory, ignore_errors=True)
+            services.add_doc(f'synthetic-{script}', doc())
+            record(services, directory, script, doc_var, webhook_var, os.path.join(state_dir, name))
+            if run_golden(directory, script, update=True):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import random
+
+# Synthetic Quip documents shaped like the real reminder docs, padded with
+# "history" content to a target size.
+
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+WORDS = ['quip', 'chime', 'sweep', 'task', 'review', 'metric', 'deploy', 'check',
+         'reminder', 'queue', 'follow', 'up', 'team', 'goal', 'note', 'update']
+
+
+def _sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def reminder_items(rng, items_per_day=1):
+    items = []
+    for header, key in [('Joke of the Day', 'joke'), ('QA Tip of the Day', 'tip'),
+                        ('Important Reminder', 'important')]:
+        items.append(f'<li><b>{header}</b></li>')
+        for day in DAYS:
+            for _ in range(items_per_day):
+                items.append(f'<li>({day}) {key} &amp; {_sentence(rng)} <i>{rng.choice(WORDS)}</i></li>')
+        items.append(f'<li>General {key}: {_sentence(rng)}<!-- note --> done</li>')
+    items.append('<li>Metrics Goals</li>')
+    for i in range(5):
+        items.append(f'<li>Metric {i}: {rng.randint(1, 100)}%</li>')
+    items.append('<li>Remember to use the following link: <a href="https://example.com">dashboard</a></li>')
+    return items
+
+
+def history_block(rng, index):
+    rows = ''.join(f'<li>{_sentence(rng, 12)}</li>' for _ in range(10))
+    return (f'<h2>History {index}</h2><p>{_sentence(rng, 40)}</p>'
+            f'<div data-section-style="6"><ul>{rows}</ul></div>')
+
+
+def daily_reminder_doc(target_bytes, items_per_day=1, history_first=False, seed=0):
+    rng = random.Random(seed)
+    target = ('<h1>Daily Reminder</h1><div data-section-style="5"><ul>'
+              + ''.join(reminder_items(rng, items_per_day)) + '</ul></div>')
+    history = []
+    size = len(target)
+    while size < target_bytes:
+        block = history_block(rng, len(history))
+        history.append(block)
+        size += len(block)
+    if history_first:
+        return ''.join(history) + target
+    return target + ''.join(history)
+
+
+SWEEP_NAMES = ['Morning Sweep', 'Afternoon Sweep', 'Evening Sweep', 'Night Sweep', 'Weekend Sweep']
+
+
+def _roster_row(rng, label, columns, captain=False):
+    cells = [f'<td>{label}</td>']
+    for column in range(columns):
+        if captain and column < 7:
+            cells.append(f'<td>Lead{column} [CAPTAIN]</td>')
+        elif rng.random() < 0.2:
+            cells.append('<td>​</td>')
+        else:
+            cells.append(f'<td><span>{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}</span></td>')
+    return '<tr>' + ''.join(cells) + '</tr>'
+
+
+TASK_STATUSES = ['Open', 'Pending', 'In Progress', 'Done', 'Closed']
+
+
+def task_table(rng, rows):
+    # Status / Sweep / Day / Assignee rows, as read by roster_tasks.py
+    cells = ['<tr><th>Task</th><th>Status</th><th>Sweep</th><th>Day</th><th>Assignee</th></tr>']
+    for row in range(rows):
+        assignee = f'{rng.choice(WORDS).title()}{" [CAPTAIN]" if rng.random() < 0.1 else ""}'
+        cells.append(f'<tr><td>T-{row}</td><td>{rng.choice(TASK_STATUSES)}</td>'
+                     f'<td>{rng.choice(SWEEP_NAMES[:3])}</td><td>{rng.choice(DAYS)}</td><td>{assignee}</td></tr>')
+    return '<h2>Tasks</h2><table>' + ''.join(cells) + '</table>'
+
+
+def roster_doc(rows_per_sweep=11, sweeps=3, extra_columns=0, distribution_tables=True, task_rows=0, seed=0):
+    # The first table is the roster: a day header row, then a label row per
+    # sweep followed by its rows (see roster_layout.json); task_rows adds a
+    # task table at the end
+    rng = random.Random(seed)
+    columns = 7 + extra_columns
+    header = '<tr><th>Name</th>' + ''.join(
+        f'<th>{DAYS[c % 7] if c < 7 else f"Extra {c}"}</th>' for c in range(columns)) + '</tr>'
+    rows = [header, '<tr>' + '<td></td>' * (columns + 1) + '</tr>']
+    for index in range(sweeps):
+        name = SWEEP_NAMES[index % len(SWEEP_NAMES)]
+        rows.append(f'<tr><td>{name}</td>' + '<td></td>' * columns + '</tr>')
+        count = rows_per_sweep if index < 2 else max(1, rows_per_sweep // 2)
+        for row in range(count):
+            rows.append(_roster_row(rng, f'Slot {row}', columns, captain=row == 0))
+        rows.append('<tr>' + '<td></td>' * (columns + 1) + '</tr>')
+    parts = ['<h1>Roster</h1><table>' + ''.join(rows) + '</table>']
+    if distribution_tables:
+        for index in range(sweeps):
+            table_rows = [header] + [
+                _roster_row(rng, f'Task {row}', columns, captain=row == 0).replace('[CAPTAIN]', '(CAPTAIN)')
+                for row in range(rows_per_sweep)]
+            parts.append(f'<h2>{SWEEP_NAMES[index % len(SWEEP_NAMES)]}</h2><table>{"".join(table_rows)}</table>')
+    if task_rows:
+        parts.append(task_table(rng, task_rows))
+    return ''.join(parts)
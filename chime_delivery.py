@@ -0,0 +1,222 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from http_session import get_transport
+
+# Delivery queue in front of the Chime webhook posts. Messages are queued
+# per webhook, identical messages for the same room are sent once, messages
+# over Chime's size limit are split at section boundaries (blank lines),
+# and each webhook has a token bucket so a burst of jobs at the top of the
+# hour stays under its rate limit. Webhooks are flushed in parallel; the
+# chunks for one webhook go out in order.
+#
+#   CHIME_MAX_MESSAGE_CHARS  4096 by default
+#   CHIME_RATE_PER_SECOND    sustained posts per second per webhook (1)
+#   CHIME_BURST              posts a webhook may take at once (3)
+
+DEFAULT_MAX_MESSAGE_CHARS = 4096
+DEFAULT_RATE_PER_SECOND = 1.0
+DEFAULT_BURST = 3
+SECTION_SEPARATOR = '\n\n'
+
+logger = logging.getLogger(__name__)
+
+
+def webhook_label(url):
+    # Webhook URLs carry their secret; logs only get the host and a suffix
+    parts = urlparse(url)
+    return f"{parts.netloc}/...{parts.path[-6:]}"
+
+
+def accepted(status_code):
+    # Chime took the message: any 2xx, not only 200
+    return 200 <= status_code < 300
+
+
+def _split_long(text, separator, limit):
+    # Greedy packing of separator-joined pieces into chunks of at most limit
+    chunks = []
+    current = ''
+    for piece in text.split(separator):
+        candidate = piece if not current else current + separator + piece
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        current = piece
+        while len(current) > limit:
+            chunks.append(current[:limit])
+            current = current[limit:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_message(message, limit=DEFAULT_MAX_MESSAGE_CHARS):
+    if len(message) <= limit:
+        return [message]
+    # Whole sections where possible, then lines, then a hard cut
+    chunks = []
+    for chunk in _split_long(message, SECTION_SEPARATOR, limit):
+        if len(chunk) <= limit:
+            chunks.append(chunk)
+        else:
+            chunks.extend(_split_long(chunk, '\n', limit))
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Blocks until a token is available; returns the seconds waited
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class Delivery:
+    def __init__(self, url, message):
+        self.url = url
+        self.message = message
+        self.job_ids = []
+        self.chunks = 0
+        self.status_codes = []
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.latency = 0.0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and bool(self.status_codes) and all(accepted(code) for code in self.status_codes)
+
+    @property
+    def status_code(self):
+        # The first non-2xx status, for callers that log a single code
+        failed = [code for code in self.status_codes if not accepted(code)]
+        return failed[0] if failed else (self.status_codes[0] if self.status_codes else None)
+
+
+class DeliveryQueue:
+    def __init__(self, transport=None, max_chars=None, rate=None, burst=None,
+                 clock=time.monotonic, sleep=time.sleep, max_workers=8):
+        self.transport = transport or get_transport()
+        self.max_chars = max_chars or int(os.environ.get('CHIME_MAX_MESSAGE_CHARS', DEFAULT_MAX_MESSAGE_CHARS))
+        self.rate = rate or float(os.environ.get('CHIME_RATE_PER_SECOND', DEFAULT_RATE_PER_SECOND))
+        self.burst = burst or int(os.environ.get('CHIME_BURST', DEFAULT_BURST))
+        self.clock = clock
+        self.sleep = sleep
+        self.max_workers = max_workers
+        self.buckets = {}   # webhook url -> TokenBucket, kept across flushes
+        self.pending = {}   # (url, message) -> Delivery, in enqueue order
+        self.delivered = []
+
+    def enqueue(self, url, message, job_id=None):
+        key = (url, message)
+        delivery = self.pending.get(key)
+        if delivery is None:
+            delivery = self.pending[key] = Delivery(url, message)
+        elif job_id is not None:
+            logger.info("Coalesced duplicate message for %s (job %s)", webhook_label(url), job_id)
+        if job_id is not None:
+            delivery.job_ids.append(job_id)
+        return delivery
+
+    def _bucket(self, url):
+        if url not in self.buckets:
+            self.buckets[url] = TokenBucket(self.rate, self.burst, self.clock, self.sleep)
+        return self.buckets[url]
+
+    def _send(self, delivery):
+        started = time.perf_counter()
+        bucket = self._bucket(delivery.url)
+        try:
+            chunks = split_message(delivery.message, self.max_chars)
+            delivery.chunks = len(chunks)
+            for chunk in chunks:
+                delivery.throttled_seconds += bucket.acquire()
+                response = self.transport.post(delivery.url, json={"Content": chunk})
+                delivery.retries += getattr(response, 'retries', 0)
+                delivery.status_codes.append(response.status_code)
+                logger.info("Chime API Response Status: %s (%s)", response.status_code, webhook_label(delivery.url))
+                logger.debug("Chime API Response Content: %s", response.text)
+                if not accepted(response.status_code):
+                    break
+        except Exception as e:
+            # requests puts the full URL, token included, in its messages,
+            # so only the exception type is kept
+            delivery.error = f"{type(e).__name__} posting to {webhook_label(delivery.url)}"
+            logger.error("Delivery failed: %s", delivery.error)
+        delivery.latency = time.perf_counter() - started
+        return delivery
+
+    def _send_all(self, deliveries):
+        # One webhook's deliveries go out in order, behind its bucket
+        return [self._send(delivery) for delivery in deliveries]
+
+    def flush(self):
+        by_webhook = {}
+        for delivery in self.pending.values():
+            by_webhook.setdefault(delivery.url, []).append(delivery)
+        self.pending = {}
+        if len(by_webhook) <= 1:
+            sent = [self._send_all(deliveries) for deliveries in by_webhook.values()]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(by_webhook))) as executor:
+                sent = list(executor.map(self._send_all, by_webhook.values()))
+        deliveries = [delivery for group in sent for delivery in group]
+        self.delivered.extend(deliveries)
+        return deliveries
+
+    def send(self, url, message):
+        delivery = self.enqueue(url, message)
+        self.flush()
+        return delivery
+
+    def report(self):
+        summary = {}
+        for delivery in self.delivered:
+            stats = summary.setdefault(webhook_label(delivery.url), {
+                'messages': 0, 'coalesced': 0, 'chunks': 0, 'failed': 0, 'retries': 0,
+                'throttled_seconds': 0.0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['messages'] += 1
+            stats['coalesced'] += max(0, len(delivery.job_ids) - 1)
+            stats['chunks'] += delivery.chunks
+            stats['failed'] += 0 if delivery.ok else 1
+            stats['retries'] += delivery.retries
+            stats['throttled_seconds'] += delivery.throttled_seconds
+            stats['total_seconds'] += delivery.latency
+            stats['max_seconds'] = max(stats['max_seconds'], delivery.latency)
+        return summary
+
+    def log_report(self):
+        # Logs and clears the deliveries; the rate limit buckets are kept
+        for label, stats in self.report().items():
+            logger.info("Chime %s: %d messages (%d coalesced), %d chunks, %d failed, %d retries, "
+                        "avg %.1f ms, max %.1f ms, throttled %.1f s", label, stats['messages'],
+                        stats['coalesced'], stats['chunks'], stats['failed'], stats['retries'],
+                        stats['total_seconds'] / stats['messages'] * 1000, stats['max_seconds'] * 1000,
+                        stats['throttled_seconds'])
+        self.delivered = []
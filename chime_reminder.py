@@ -1,275 +1,206 @@
-import requests
+import logging
 import os
-from bs4 import BeautifulSoup
-from datetime import datetime, time, timedelta
-import pytz
-import re
+import sys
 
-CHIME_WEBHOOK_URL = os.environ['CHIME_WEBHOOK_URL']
-QUIP_API_TOKEN = os.environ['QUIP_API_TOKEN']
-QUIP_DOC_ID = os.environ['QUIP_DOC_ID']
+from reminder_log import RunRecord, configure_logging, profiled
+from run_context import RunContext, utc_now
 
-def get_last_run_time():
-    try:
-        with open('last_run.txt', 'r') as f:
-            return datetime.fromisoformat(f.read().strip())
-    except:
-        return None
-
-def save_last_run_time(dt):
-    with open('last_run.txt', 'w') as f:
-        f.write(dt.isoformat())
+# Only stdlib modules are imported up front. Most cron runs end at the
+# schedule check, so the state store, HTTP and HTML modules are imported
+# where they are first needed (check with `python -X importtime`).
 
-def is_correct_time():
-    # Get current time in Pacific timezone
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    current_time = datetime.now(pacific_tz)
-    
-    # Define the times to send the reminders (10:00 AM and 2:00 PM Pacific)
-    send_times = [
-        (10, 0),  # 10:00 AM hour range
-        (14, 0)   # 2:00 PM hour range
-    ]
-    
-    current_hour = current_time.hour
-    
-    print(f"Current Pacific time: {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    
-    # Get last run time
-    last_run = get_last_run_time()
-    
-    # Check if current hour matches any of the send times
-    for send_hour, _ in send_times:
-        if current_hour == send_hour:
-            # If we have a last run time, check if it was in the same hour of the same day
-            if last_run is not None:
-                last_run = last_run.astimezone(pacific_tz)
-                if (last_run.date() == current_time.date() and 
-                    last_run.hour == current_hour):
-                    print(f"Message already sent for {current_hour}:00. Skipping.")
-                    return False
-            
-            # If we get here, we should send the message
-            save_last_run_time(current_time)
-            return True
-    
-    # Also return True if FORCE_SEND is true
-    if os.environ.get('FORCE_SEND', 'false').lower() == 'true':
-        save_last_run_time(current_time)
-        return True
-    
-    print(f"Current time {current_time.strftime('%H:%M')} is not a scheduled reminder time. Skipping.")
-    return False
+logger = logging.getLogger(__name__)
 
-def get_current_day():
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    return datetime.now(pacific_tz).strftime('%A')
+CHIME_WEBHOOK_URL = os.environ.get('CHIME_WEBHOOK_URL', '')
+QUIP_API_TOKEN = os.environ.get('QUIP_API_TOKEN', '')
+QUIP_DOC_ID = os.environ.get('QUIP_DOC_ID', '')
+REQUIRED_ENV = ('CHIME_WEBHOOK_URL', 'QUIP_API_TOKEN', 'QUIP_DOC_ID')
 
-def extract_content(html_content):
-    print("\n=== Starting content extraction ===")
-    soup = BeautifulSoup(html_content, 'html.parser')
-    sections = {
-        'joke': {'Sunday': [], 'Monday': [], 'Tuesday': [], 'Wednesday': [], 'Thursday': [], 'Friday': [], 'Saturday': []},
-        'qa_tip': {'Sunday': [], 'Monday': [], 'Tuesday': [], 'Wednesday': [], 'Thursday': [], 'Friday': [], 'Saturday': []},
-        'important': {'Sunday': [], 'Monday': [], 'Tuesday': [], 'Wednesday': [], 'Thursday': [], 'Friday': [], 'Saturday': []},
-        'metrics': [],
-        'link': []
-    }
+# Key of this reminder in the sent-slot ledger
+JOB_ID = 'daily-team-reminder'
 
-    try:
-        div = soup.find('div', attrs={'data-section-style': '5'})
-        if div:
-            print("Found main div")
-            main_ul = div.find('ul')
-            if main_ul:
-                print("Found main ul")
-                
-                current_section = None
-                for item in main_ul.find_all('li'):
-                    text = item.get_text(strip=True)
-                    print(f"Processing item: {text}")
-                    
-                    if 'joke of the day' in text.lower():
-                        current_section = 'joke'
-                        continue
-                    elif 'qa tip of the day' in text.lower():
-                        current_section = 'qa_tip'
-                        continue
-                    elif 'important reminder' in text.lower():
-                        current_section = 'important'
-                        continue
-                    elif 'metrics goals' in text.lower():
-                        current_section = 'metrics'
-                        continue
-                    
-                    if current_section:
-                        day_match = re.match(r'\((Sunday|Monday|Tuesday|Wednesday|Thursday|Friday|Saturday)\)', text)
-                        if day_match:
-                            day = day_match.group(1)
-                            content = re.sub(r'\([^)]*\)\s*', '', text).strip()
-                            if current_section in ['joke', 'qa_tip', 'important']:
-                                sections[current_section][day].append(content)
-                                print(f"Added {current_section} for {day}: {content}")
-                        elif current_section == 'metrics':
-                            if 'remember to use the following link' in text.lower():
-                                sections['link'].append(text)
-                                print(f"Added link: {text}")
-                            else:
-                                sections['metrics'].append(text)
-                                print(f"Added metric: {text}")
-                        elif current_section in ['joke', 'qa_tip', 'important']:
-                            # For items without at a day prefix, add to all days
-                            content = text.strip()
-                            for day in sections[current_section].keys():
-                                sections[current_section][day].append(content)
-                            print(f"Added general {current_section}: {content}")
-                
-    except Exception as e:
-        print(f"Error during extraction: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+# Render slot shared by both send times; the message doesn't depend on it
+ALL_SLOTS = 'all'
 
-    print("\n=== Final content ===")
-    for section, items in sections.items():
-        if isinstance(items, dict):
-            print(f"\n{section}:")
-            for day, day_items in items.items():
-                print(f"  {day}: {day_items}")
-        else:
-            print(f"\n{section}: {items}")
-    
-    return sections
-    
-def format_message(sections, current_day):
-    print(f"=== Formatting message for {current_day} ===")
-    message = "🔔 **Daily Team Reminder**\n\n"
+PACIFIC_TZ = 'America/Los_Angeles'
 
-    # Joke Section for current day
-    if sections['joke'][current_day]:
-        message += "😄 **Joke of the Day**\n"
-        for joke in sections['joke'][current_day]:
-            message += f"• {joke}\n"
-        message += "\n"
+# The times to send the reminders (10:00 AM and 2:00 PM Pacific); each
+# covers the hour that follows it
+SEND_TIMES = [
+    (10, 0),  # 10:00 AM hour range
+    (14, 0)   # 2:00 PM hour range
+]
 
-    # QA Tip Section for current day
-    if sections['qa_tip'][current_day]:
-        message += "💡 **QA Tip of the Day**\n"
-        for tip in sections['qa_tip'][current_day]:
-            message += f"• {tip}\n"
-        message += "\n"
+def run_context(now=None):
+    # Time, day and send slot of a run, computed once; now defaults to the
+    # system clock
+    return RunContext(now or utc_now(), PACIFIC_TZ, SEND_TIMES)
 
-    # Important Reminder Section for current day
-    if sections['important'].get(current_day, []):
-        message += "⚠️ **Important Reminder**\n"
-        for reminder in sections['important'][current_day]:
-            message += f"• {reminder}\n"
-        message += "\n"
+def extract_content(html_content, parser_backend=None, items=None, registry=None):
+    logger.debug("=== Starting content extraction ===")
+    from daily_sections import load_sections
+    registry = registry or load_sections()
+    sections = registry.empty_sections()
 
-    # Metrics Section
-    if sections['metrics']:
-        message += "📊 **Metrics Goals**\n"
-        for metric in sections['metrics']:
-            if ':' in metric:
-                key, value = metric.split(':', 1)
-                message += f"• *{key.strip()}*: {value.strip()}\n"
+    try:
+        # Incremental mode passes the items in; see section_list_items()
+        if items is None:
+            from html_backends import default_backend, section_items
+            backend = parser_backend or default_backend()
+            items = section_items(html_content, backend)
+            logger.info("Found %d list items using the %s backend", len(items), backend)
+
+        # Headers, day tags and the sections they feed come from
+        # daily_sections.json
+        sections = registry.read_items(items)
+
+    except Exception:
+        logger.exception("Error during extraction")
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("=== Final content ===")
+        for section, items in sections.items():
+            if isinstance(items, dict):
+                logger.debug("%s:", section)
+                for day, day_items in items.items():
+                    logger.debug("  %s: %s", day, day_items)
             else:
-                message += f"• {metric}\n"
-        message += "\n"
-
-    # Link Section
-    if sections['link']:
-        for link in sections['link']:
-            message += f"🔗 {link}\n"
-        message += "\n"
+                logger.debug("%s: %s", section, items)
+    
+    return sections
+    
+def section_list_items(section_html):
+    # Per-section extractor for incremental mode: the list items if this
+    # top-level section holds the section list, else None
+    from html_backends import has_section_list, section_items
+    return section_items(section_html) if has_section_list(section_html) else None
+
+def format_message(sections, current_day, registry=None):
+    from daily_sections import load_sections
+    registry = registry or load_sections()
+    parts = ["🔔 **Daily Team Reminder**\n\n"]
+
+    # Sections in daily_sections.json order; per-day ones for current day
+    for section in registry.sections:
+        items = sections.get(section.key)
+        if section.per_day and items:
+            items = items.get(current_day)
+        if not items:
+            continue
+        if section.style == 'inline':
+            parts.extend(f"{section.emoji} {item}\n" for item in items)
+            parts.append("\n")
+            continue
+        parts.append(f"{section.emoji} **{section.title}**\n")
+        for item in items:
+            if section.style == 'key_value' and ':' in item:
+                key, value = item.split(':', 1)
+                parts.append(f"• *{key.strip()}*: {value.strip()}\n")
+            else:
+                parts.append(f"• {item}\n")
+        parts.append("\n")
 
     # Add footer
-    message += "-------------------\n"
-    message += "Have a great day! 🌟"
-
-    print(f"\nFormatted message:\n{message}")
-    return message.strip()
-
-def send_reminder():
-    try:
-        # Get current time in Pacific timezone
-        pacific_tz = pytz.timezone('America/Los_Angeles')
-        pacific_now = datetime.now(pacific_tz)
-        
-        # Only proceed if it's the correct time or FORCE_SEND is True
-        if not is_correct_time():
-            print(f"Current time {pacific_now.strftime('%H:%M')} is not a scheduled reminder time. Skipping.")
-            return
-        
-        print(f"\n=== Starting reminder process at {pacific_now} ===")
-        
-        current_day = get_current_day()
-        print(f"Current day: {current_day}")
-        
-        print(f"CHIME_WEBHOOK_URL length: {len(CHIME_WEBHOOK_URL)}")
-        print(f"QUIP_API_TOKEN length: {len(QUIP_API_TOKEN)}")
-        print(f"QUIP_DOC_ID: {QUIP_DOC_ID}")
-
-        quip_client = SimpleQuipClient(QUIP_API_TOKEN)
+    parts.append("-------------------\n")
+    parts.append("Have a great day! 🌟")
+
+    return ''.join(parts).strip()
+
+def render_week(sections):
+    # The daily reminder only depends on the weekday, so one render per day
+    # covers every send time
+    from render_cache import DAYS, render_key
+    logger.info("Rendering messages for the week")
+    return {render_key(day, ALL_SLOTS): format_message(sections, day) for day in DAYS}
+
+def is_debug_dump():
+    return os.environ.get('DEBUG_DUMP', 'false').lower() == 'true'
+
+def render_message(run, current_day):
+    # Fetch -> extract -> format for the current day
+    from daily_sections import load_sections
+    from quip_cache import QuipThreadCache, get_revision
+    from quip_client import SimpleQuipClient
+    from render_cache import RenderCache, render_key
+    from sections_snapshot import pack_sections, unpack_sections
+
+    logger.debug("CHIME_WEBHOOK_URL length: %d", len(CHIME_WEBHOOK_URL))
+    logger.debug("QUIP_API_TOKEN length: %d", len(QUIP_API_TOKEN))
+    logger.info("QUIP_DOC_ID: %s", QUIP_DOC_ID)
+    run.set(doc_id=QUIP_DOC_ID)
+
+    quip_cache = QuipThreadCache()
+    quip_client = SimpleQuipClient(QUIP_API_TOKEN, cache=quip_cache)
+    render_cache = RenderCache()
+
+    # Each stage runs at most once: fetch -> extract -> format
+    with run.stage('fetch'):
         thread = quip_client.get_thread(QUIP_DOC_ID)
         content = thread['html']
-        
-        sections = extract_content(content)
-        
-        message = format_message(sections, current_day)
-        
-        print("Sending message to Chime...")
-        payload = {
-            "Content": message
-        }
-
-        thread = quip_client.get_thread(QUIP_DOC_ID)
-        content = thread['html']
-        print("\nHTML Content from Quip:")
-        print("=" * 50)
-        print(content[:1000])  # Print first 1000 characters
-        print("=" * 50)
-
-        print(f"Sending payload: {payload}")
-        response = requests.post(CHIME_WEBHOOK_URL, json=payload)
-        print(f"Chime API Response Status: {response.status_code}")
-        print(f"Chime API Response Content: {response.text}")
-        
-        if response.status_code == 200:
-            print(f"{pacific_now}: Reminder sent successfully")
-        else:
-            print(f"{pacific_now}: Failed to send reminder. Status code: {response.status_code}")
-            
+    run.add_bytes('html', len(content))
+
+    if is_debug_dump():
+        # Reuse the payload we already fetched instead of asking Quip again
+        logger.info("HTML Content from Quip:\n%s\n%s\n%s", "=" * 50, content[:1000], "=" * 50)
+
+    # The whole week is rendered once per document revision and sections
+    # config; while neither changes a send is just a lookup
+    registry = load_sections()
+    revision = get_revision(thread)
+    if revision is not None:
+        revision = f"{revision}+{registry.digest}"
+    renders = render_cache.get_week(QUIP_DOC_ID, revision)
+    run.set(revision=revision, render_cache_hit=renders is not None)
+    if renders is None:
+        # The streaming backend parses and extracts in one pass
+        with run.stage('extract'):
+            # Reuse the extracted sections when the document revision hasn't
+            # changed; they are stored as a compact snapshot
+            sections = unpack_sections(quip_cache.get_snapshot(QUIP_DOC_ID, 'sections', revision))
+            if sections is None and quip_client.incremental:
+                # Only sections edited since the last revision are parsed
+                results = quip_client.extract_sections(QUIP_DOC_ID, thread, 'section_list', section_list_items)
+                items = next((result for result in results if result is not None), [])
+                sections = extract_content(content, items=items)
+                quip_cache.put_snapshot(QUIP_DOC_ID, 'sections', revision, pack_sections(sections))
+            elif sections is None:
+                sections = extract_content(content)
+                quip_cache.put_snapshot(QUIP_DOC_ID, 'sections', revision, pack_sections(sections))
+            else:
+                logger.info("Document unchanged since last run, using the sections snapshot")
+
+        with run.stage('format'):
+            renders = render_week(sections)
+            render_cache.put_week(QUIP_DOC_ID, revision, renders)
+    else:
+        logger.info("Using pre-rendered messages for revision %s", revision)
+
+    message = renders[render_key(current_day, ALL_SLOTS)]
+    logger.debug("Formatted message:\n%s", message)
+    run.add_bytes('message', len(message.encode('utf-8')))
+    quip_cache.save_stats()
+    return message
+
+def send_reminder(context=None):
+    run = RunRecord(JOB_ID)
+    try:
+        # Every stage uses this one reading of the clock
+        context = context or run_context()
+        # Due check, outbox, delivery and ledger are shared with the other
+        # script (see outbox.send_due)
+        from outbox import send_due
+        send_due(run, context, JOB_ID, CHIME_WEBHOOK_URL,
+                 lambda: render_message(run, context.day), REQUIRED_ENV)
     except Exception as e:
-        print(f"{pacific_now}: Error occurred: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-
-class SimpleQuipClient:
-    def __init__(self, access_token):
-        self.access_token = access_token
-        self.base_url = "https://platform.quip-amazon.com/1"
-
-    def get_thread(self, thread_id):
-        url = f"{self.base_url}/threads/{thread_id}"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Accept": "application/json"
-        }
-        print(f"Fetching Quip document with URL: {url}")
-        response = requests.get(url, headers=headers)
-        print(f"Quip API Response Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            json_response = response.json()
-            print(f"JSON response keys: {json_response.keys()}")
-            if 'html' not in json_response:
-                print("HTML not in JSON response, trying to get it from 'thread'")
-                json_response['html'] = json_response['thread'].get('html', '')
-            print(f"HTML content length: {len(json_response['html'])}")
-            return json_response
-        else:
-            print(f"Error response content: {response.text}")
-            response.raise_for_status()
+        logger.exception("Error occurred")
+        run.set(error=str(e))
+        run.emit('error')
 
 if __name__ == "__main__":
-    send_reminder()
+    configure_logging()
+    if len(sys.argv) > 1:
+        # --dry-run / --replay / --record (see replay.py)
+        from replay import run_cli
+        sys.exit(run_cli(sys.modules[__name__], sys.argv[1:]))
+    with profiled():
+        send_reminder()
@@ -1,351 +1,379 @@
-import requests
+import logging
 import os
-from bs4 import BeautifulSoup
-from datetime import datetime, time, timedelta
-import pytz
-import re
+import sys
 
-CHIME_WEBHOOK_URL_1 = os.environ['CHIME_WEBHOOK_URL_1']
-QUIP_API_TOKEN = os.environ['QUIP_API_TOKEN']
-QUIP_DOCUMENT_ID_1 = os.environ['QUIP_DOCUMENT_ID_1']
+from reminder_log import RunRecord, configure_logging, profiled
+from run_context import RunContext, utc_now
 
-def get_last_run_time():
-    try:
-        with open('last_run.txt', 'r') as f:
-            return datetime.fromisoformat(f.read().strip())
-    except:
-        return None
-
-def save_last_run_time(dt):
-    with open('last_run.txt', 'w') as f:
-        f.write(dt.isoformat())
-
-def is_correct_time():
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    current_time = datetime.now(pacific_tz)
-    current_hour = current_time.hour
-    
-    send_times = [
-        (5, 0),   # 5:00 AM for Morning Sweep
-        (11, 0),  # 11:00 AM for Afternoon Sweep
-        (17, 0)   # 5:00 PM for Evening Sweep
-    ]
-    
-    print(f"Current Pacific time: {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    
-    last_run = get_last_run_time()
-    
-    # Check if current time is within one hour after any of the send times
-    for send_hour, send_minute in send_times:
-        target_time = current_time.replace(hour=send_hour, minute=send_minute, second=0, microsecond=0)
-        time_diff = (current_time - target_time).total_seconds() / 3600  # Difference in hours
-        
-        if 0 <= time_diff < 1:  # Within one hour after the target time
-            if last_run is not None:
-                last_run = last_run.astimezone(pacific_tz)
-                if (last_run.date() == current_time.date() and 
-                    last_run.hour == send_hour):
-                    print(f"Message already sent for {send_hour}:00. Skipping.")
-                    return False
-            
-            save_last_run_time(current_time)
-            return True
-    
-    if os.environ.get('FORCE_SEND', 'false').lower() == 'true':
-        save_last_run_time(current_time)
-        return True
-    
-    print(f"Current time {current_time.strftime('%H:%M')} is not within a scheduled reminder window. Skipping.")
-    return False
-    
-def get_current_day():
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    return datetime.now(pacific_tz).strftime('%A')
+# Only stdlib modules are imported up front; bs4, the state store and the
+# HTTP modules are loaded once a send is actually due (see chime_reminder.py)
 
-def extract_content(html_content):
-    print("\n=== Starting content extraction ===")
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
+logger = logging.getLogger(__name__)
+
+CHIME_WEBHOOK_URL_1 = os.environ.get('CHIME_WEBHOOK_URL_1', '')
+QUIP_API_TOKEN = os.environ.get('QUIP_API_TOKEN', '')
+QUIP_DOCUMENT_ID_1 = os.environ.get('QUIP_DOCUMENT_ID_1', '')
+REQUIRED_ENV = ('CHIME_WEBHOOK_URL_1', 'QUIP_API_TOKEN', 'QUIP_DOCUMENT_ID_1')
+
+# Key of this reminder in the sent-slot ledger
+JOB_ID = 'follow-up-roster'
+
+PACIFIC_TZ = 'America/Los_Angeles'
+
+SEND_TIMES = [
+    (5, 0),   # 5:00 AM for Morning Sweep
+    (11, 0),  # 11:00 AM for Afternoon Sweep
+    (17, 0)   # 5:00 PM for Evening Sweep
+]
+
+def run_context(now=None):
+    # Time, day, sweep and send slot of a run, computed once; now defaults
+    # to the system clock
+    return RunContext(now or utc_now(), PACIFIC_TZ, SEND_TIMES, sweep_of=get_sweep_period)
+
+def get_sweep_period(hour):
+    if 5 <= hour < 10:
+        return 'morning'
+    elif 10 <= hour < 15:
+        return 'afternoon'
+    # Evening includes night hours
+    return 'evening'
+
+def table_cells(table):
+    # Cell text of every row, and the positions of each row's <th> cells
+    # (the distribution only counts <td> cells)
+    grid = []
+    header_cells = []
+    for row in table.find_all('tr'):
+        cells = row.find_all(['th', 'td'])
+        grid.append([cell.get_text(strip=True) for cell in cells])
+        header_cells.append([position for position, cell in enumerate(cells) if cell.name == 'th'])
+    return grid, header_cells
+
+def table_grid(table):
+    return table_cells(table)[0]
+
+def roster_events(soup, layout=None):
+    # One forward walk over the document (or one top-level section of it),
+    # listing the sweep headings and tables in order. Only tables that can be
+    # read are turned into text grids: every table up to the roster (the
+    # first one with sweep rows), the first table after a heading and every
+    # task table (one whose header row names the layout's task columns); the
+    # rest are None.
+    from bs4 import NavigableString
+    from roster_layout import load_layout
+    layout = layout or load_layout()
+    events = []
+    seen_headers = set()
+    needed = True
+    roster_found = False
+
+    for element in soup.descendants:
+        if isinstance(element, NavigableString):
+            sweep = layout.sweep_in(element)
+            # Sweep labels inside a table are roster rows, not headings
+            if sweep is not None and sweep not in seen_headers and element.find_parent('table') is None:
+                seen_headers.add(sweep)
+                events.append(['header', sweep])
+                needed = True
+        elif element.name == 'table':
+            first_row = element.find('tr')
+            if first_row is not None and layout.task_columns(
+                    [cell.get_text(strip=True) for cell in first_row.find_all(['th', 'td'])]):
+                events.append(['tasks', table_grid(element)])
+                continue
+            grid, header_cells = table_cells(element) if needed or not roster_found else (None, None)
+            if grid is not None and not roster_found:
+                roster_found = layout.is_roster(grid)
+            events.append(['table', grid, header_cells])
+            needed = False
+
+    return events
+
+def index_from_events(section_events, layout=None, tasks=None):
+    # Headings are resolved in document order, so each table knows which
+    # headings precede it. The roster table gives the specialists and the
+    # day columns; the first table after a sweep's heading gives its
+    # distribution. Task tables update the TaskIndex (a fresh one unless
+    # the previous revision's is passed in), whose pending counts replace
+    # both. The result is plain JSON so it can be cached for as long as the
+    # document revision and the layout are unchanged.
+    from roster_layout import load_layout
+    layout = layout or load_layout()
+    index = {'table_count': 0, 'specialists': {}, 'distribution': {}}
+    seen_headers = set()
+    roster = None
+    sweep_tables = {}
+    task_grids = []
+
+    for events in section_events:
+        for event in events:
+            kind, value = event[0], event[1]
+            if kind == 'header':
+                seen_headers.add(value)
+                continue
+            index['table_count'] += 1
+            if kind == 'tasks':
+                task_grids.append(value)
+                continue
+            if roster is None and value is not None and layout.is_roster(value):
+                roster = value
+            for sweep in seen_headers:
+                if sweep not in sweep_tables:
+                    sweep_tables[sweep] = event
+
+    columns = None
+    if roster is not None:
+        columns, index['specialists'] = layout.read_roster(roster)
+    for sweep, (_, grid, header_cells) in sweep_tables.items():
+        index['distribution'][sweep] = layout.count_roles(grid or [], columns, header_cells)
+
+    if task_grids:
+        from roster_tasks import TaskIndex
+        task_rows = [row for grid in task_grids for row in layout.task_rows(grid)]
+        tasks = tasks if tasks is not None else TaskIndex()
+        changed = tasks.update(task_rows, layout)
+        logger.info("Task table: %d rows, %d distinct rows changed", len(task_rows), changed)
+        index['tasks'] = tasks.counts
+
+    return index
+
+def build_roster_index(soup, layout=None, tasks=None):
+    return index_from_events([roster_events(soup, layout)], layout, tasks)
+
+def section_roster_events(section_html):
+    # Per-section extractor for incremental mode
+    from bs4 import BeautifulSoup
+    return roster_events(BeautifulSoup(section_html, 'html.parser'))
+
+def extract_content(html_content, context=None, index=None):
+    logger.debug("=== Starting content extraction ===")
     
+    if context is None:
+        context = run_context()
+
+    if index is None:
+        try:
+            from bs4 import BeautifulSoup
+            index = build_roster_index(BeautifulSoup(html_content, 'html.parser'))
+        except Exception:
+            logger.exception("Error during extraction")
+
+    return extract_roster_data(index, context.day, context.sweep)
+
+def extract_roster_data(index, current_day, sweep_period):
     data = {
         'title': 'Follow Up reminders',
         'tasks_on_call': {
             'specialists': '',
-            'pending': '25',  # Updated to match the actual pending count
+            'pending': '',
             'distribution': {},
             'priority': 'By Timezone EST'
         }
     }
+    from roster_layout import load_layout
+    layout = load_layout()
+    data['tasks_on_call']['pending'] = layout.pending_fallback
+    if index is None:
+        return data
 
     try:
-        # Extract on-call specialists from the table
-        data['tasks_on_call']['specialists'] = extract_specialists_from_table(soup)
+        # Extract on-call specialists from the roster table
+        data['tasks_on_call']['specialists'] = extract_specialists(index, current_day, sweep_period)
         
-        # Extract distribution from the schedule table
-        data['tasks_on_call']['distribution'] = extract_distribution_from_table(soup)
+        if 'tasks' in index:
+            # Pending tasks of this sweep and day, from the task table or export
+            from roster_tasks import task_counts
+            pending, distribution = task_counts(index['tasks'], sweep_period, current_day, layout.roles)
+            data['tasks_on_call']['pending'] = str(pending)
+            data['tasks_on_call']['distribution'] = distribution
+        else:
+            # Extract distribution from the sweep's schedule table
+            data['tasks_on_call']['distribution'] = extract_distribution(index, current_day, sweep_period)
 
-    except Exception as e:
-        print(f"Error during extraction: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error during extraction")
 
     return data
 
-def extract_specialists_from_table(soup):
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    current_time = datetime.now(pacific_tz)
-    current_hour = current_time.hour
-    current_day = current_time.strftime('%A')
-    
-    # Map days to column indices
-    day_columns = {
-        'Sunday': 1,
-        'Monday': 2,
-        'Tuesday': 3,
-        'Wednesday': 4,
-        'Thursday': 5,
-        'Friday': 6,
-        'Saturday': 7
-    }
-    
-    # Map time periods to row ranges
-    sweep_ranges = {
-        'morning': (3, 13),    # Morning Sweep rows
-        'afternoon': (16, 26), # Afternoon Sweep rows
-        'evening': (29, 34)    # Evening Sweep rows
-    }
-    
-    # Determine which sweep period based on current hour
-    if 5 <= current_hour < 10:
-        sweep_period = 'morning'
-    elif 10 <= current_hour < 15:
-        sweep_period = 'afternoon'
-    else:
-        sweep_period = 'evening'
-        
-    print(f"Current hour: {current_hour}")
-    print(f"Current day: {current_day}")
-    print(f"Sweep period: {sweep_period}")
+def extract_specialists(index, current_day, sweep_period):
+    logger.debug("Current day: %s", current_day)
+    logger.debug("Sweep period: %s", sweep_period)
     
-    # Get the column index for the current day
-    day_index = day_columns.get(current_day)
-    if day_index is None:
-        print(f"Invalid day: {current_day}")
+    sweep = index['specialists'].get(sweep_period)
+    if sweep is None:
+        logger.warning("No %s sweep rows found in the roster table", sweep_period)
         return "No specialists found"
-        
-    print(f"Using column index {day_index} for {current_day}")
-    
-    # Find the first table
-    tables = soup.find_all('table')
-    if not tables:
-        return "No specialists found"
-        
-    target_table = tables[0]
-    rows = target_table.find_all('tr')
-    
-    if len(rows) < sweep_ranges[sweep_period][1]:
-        print(f"Table doesn't have enough rows for {sweep_period} sweep")
+    if current_day not in sweep:
+        logger.warning("Invalid day: %s", current_day)
         return "No specialists found"
     
-    specialists = []
-    
-    # Get row range for current sweep period
-    start_row, end_row = sweep_ranges[sweep_period]
-    print(f"\nProcessing rows {start_row} to {end_row} for {sweep_period} sweep:")
-    
-    # Process rows for the current sweep period
-    for row_idx in range(start_row, end_row + 1):
-        if row_idx >= len(rows):
-            break
-            
-        cells = rows[row_idx].find_all(['th', 'td'])
-        if len(cells) > day_index:
-            cell = cells[day_index]
-            cell_text = cell.get_text(strip=True)
-            print(f"Row {row_idx} content: '{cell_text}'")
-            
-            if cell_text and cell_text != '​':  # Skip empty cells
-                # Check for CAPTAIN tag
-                if '[CAPTAIN]' in cell_text.upper():
-                    specialists.insert(0, cell_text)
-                    print(f"Added captain: {cell_text}")
-                else:
-                    specialists.append(cell_text)
-                    print(f"Added specialist: {cell_text}")
-    
+    specialists = sweep[current_day]
     if not specialists:
         return "No specialists found"
         
-    print(f"\nFinal list of specialists: {specialists}")
-    return specialists
-    
-def extract_distribution_from_table(soup):
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    current_time = datetime.now(pacific_tz)
-    current_hour = current_time.hour
+    logger.debug("Final list of specialists: %s", specialists)
+    return list(specialists)
     
-    # Determine which sweep section based on time ranges
-    if 5 <= current_hour < 10:
-        section_start = "Morning Sweep"
-    elif 10 <= current_hour < 15:
-        section_start = "Afternoon Sweep"
-    elif current_hour >= 15 or current_hour < 5:  # Evening includes night hours
-        section_start = "Evening Sweep"
-    
-    # Find all tables in the document
-    tables = soup.find_all('table')
-    target_table = None
-    
-    # Find the correct table by looking for the section header
-    for table in tables:
-        prev_element = table.find_previous(string=re.compile(section_start, re.IGNORECASE))
-        if prev_element:
-            target_table = table
-            break
-    
-    if not target_table:
+def extract_distribution(index, current_day, sweep_period):
+    # Counted from the first table after the current sweep's heading
+    counts = index['distribution'].get(sweep_period)
+    if counts is None:
         return {}
     
-    distribution = {'Captain': 0, 'Regular': 0}
-    current_day = current_time.strftime('%A')
-    
-    # Map days to column indices
-    day_columns = {
-        'Sunday': 1,
-        'Monday': 2,
-        'Tuesday': 3,
-        'Wednesday': 4,
-        'Thursday': 5,
-        'Friday': 6,
-        'Saturday': 7
-    }
-    
-    day_index = day_columns.get(current_day)
-    if day_index is None:
-        return distribution
-    
-    # Process rows in the table
-    rows = target_table.find_all('tr')
-    for row in rows[1:]:  # Skip header row
-        cells = row.find_all('td')
-        if len(cells) > day_index:
-            cell_content = cells[day_index].get_text(strip=True)
-            if cell_content:
-                if '(CAPTAIN)' in cell_content.upper():
-                    distribution['Captain'] += 1
-                else:
-                    distribution['Regular'] += 1
-
-    print(f"Found {len(tables)} tables in the document")
+    if current_day not in counts:
+        from roster_layout import load_layout
+        return {role: 0 for role in load_layout().roles}
+    distribution = dict(counts[current_day])
+
+    logger.debug("Found %d tables in the document", index['table_count'])
     
-    print(f"Distribution count: {distribution}")
+    logger.debug("Distribution count: %s", distribution)
     return distribution
 
 def format_message(data):
-    message = "🔔 **Follow Up Reminders**\n\n"
-    message += "• Tasks on-call\n\n"
+    tasks = data['tasks_on_call']
+    parts = ["🔔 **Follow Up Reminders**\n\n", "• Tasks on-call\n\n"]
     
-    if data['tasks_on_call']['specialists']:
-        message += "• On-call Specialists:\n"
-        if isinstance(data['tasks_on_call']['specialists'], list):
-            for specialist in data['tasks_on_call']['specialists']:
-                message += f"  ◦ {specialist}\n"
+    if tasks['specialists']:
+        parts.append("• On-call Specialists:\n")
+        if isinstance(tasks['specialists'], list):
+            parts.extend(f"  ◦ {specialist}\n" for specialist in tasks['specialists'])
         else:
-            message += f"  ◦ {data['tasks_on_call']['specialists']}\n"
-        message += "\n"
+            parts.append(f"  ◦ {tasks['specialists']}\n")
+        parts.append("\n")
     
-    message += f"• Tasks pending: {data['tasks_on_call']['pending']}\n\n"
+    parts.append(f"• Tasks pending: {tasks['pending']}\n\n")
     
-    if data['tasks_on_call']['distribution']:
-        message += "• Distribution:\n"
-        for role, count in data['tasks_on_call']['distribution'].items():
-            message += f"  {role}: {count}\n"
-        message += "\n"
+    if tasks['distribution']:
+        parts.append("• Distribution:\n")
+        parts.extend(f"  {role}: {count}\n" for role, count in tasks['distribution'].items())
+        parts.append("\n")
     
-    message += f"• Priority: {data['tasks_on_call']['priority']}\n\n"
+    parts.append(f"• Priority: {tasks['priority']}\n\n")
     
-    message += "• Please follow the Tasks schedule wiki for guidance: https://w.amazon.com/bin/view/LMIRCRI/Roster\n"
-    message += "• Make sure you review the Taskee Dashboard (https://tiny.amazon.com/cuqmzf54/taskamazdevrooma917task)\n"
+    parts.append("• Please follow the Tasks schedule wiki for guidance: https://w.amazon.com/bin/view/LMIRCRI/Roster\n")
+    parts.append("• Make sure you review the Taskee Dashboard (https://tiny.amazon.com/cuqmzf54/taskamazdevrooma917task)\n")
 
-    message += "\n-------------------\n"
-    message += "Have a great shift! 🌟"
+    parts.append("\n-------------------\n")
+    parts.append("Have a great shift! 🌟")
 
-    return message.strip()
+    return ''.join(parts).strip()
+
+def render_week(roster_index):
+    # One message per (day, sweep); the roster index is shared by all of them
+    from render_cache import DAYS, render_key
+    from roster_layout import load_layout
+    logger.info("Rendering messages for the week")
+    return {
+        render_key(day, sweep_period): format_message(extract_roster_data(roster_index, day, sweep_period))
+        for day in DAYS
+        for sweep_period in load_layout().sweeps
+    }
     
-def send_reminder():
-    try:
-        # Get current time in Pacific timezone
-        pacific_tz = pytz.timezone('America/Los_Angeles')
-        pacific_now = datetime.now(pacific_tz)
-        
-        # Only proceed if it's the correct time or FORCE_SEND is True
-        if not is_correct_time():
-            print(f"Current time {pacific_now.strftime('%H:%M')} is not a scheduled reminder time. Skipping.")
-            return
-        
-        print(f"\n=== Starting reminder process at {pacific_now} ===")
-        
-        current_day = get_current_day()
-        print(f"Current day: {current_day}")
-        
-        print(f"CHIME_WEBHOOK_URL_1 length: {len(CHIME_WEBHOOK_URL_1)}")
-        print(f"QUIP_API_TOKEN length: {len(QUIP_API_TOKEN)}")
-        print(f"QUIP_DOCUMENT_ID_1: {QUIP_DOCUMENT_ID_1}")
+def render_message(run, current_day, sweep_period):
+    # Fetch -> parse -> extract -> format for the current day and sweep
+    from bs4 import BeautifulSoup
+    from quip_cache import QuipThreadCache, get_revision
+    from quip_client import SimpleQuipClient
+    from render_cache import RenderCache, render_key
+    from roster_layout import load_layout
+    from roster_tasks import TaskIndex, export_digest, export_path, read_export
 
-        quip_client = SimpleQuipClient(QUIP_API_TOKEN)
+    logger.debug("CHIME_WEBHOOK_URL_1 length: %d", len(CHIME_WEBHOOK_URL_1))
+    logger.debug("QUIP_API_TOKEN length: %d", len(QUIP_API_TOKEN))
+    logger.info("QUIP_DOCUMENT_ID_1: %s", QUIP_DOCUMENT_ID_1)
+    run.set(doc_id=QUIP_DOCUMENT_ID_1)
+
+    layout = load_layout()
+    quip_cache = QuipThreadCache()
+    quip_client = SimpleQuipClient(QUIP_API_TOKEN, cache=quip_cache)
+    render_cache = RenderCache()
+
+    with run.stage('fetch'):
         thread = quip_client.get_thread(QUIP_DOCUMENT_ID_1)
         content = thread['html']
-        
-        sections = extract_content(content)
-        
-        message = format_message(sections)  # Remove current_day parameter
-        
-        print("Sending message to Chime...")
-        payload = {
-            "Content": message
-        }
-
-        print(f"Sending payload: {payload}")
-        response = requests.post(CHIME_WEBHOOK_URL_1, json=payload)
-        print(f"Chime API Response Status: {response.status_code}")
-        print(f"Chime API Response Content: {response.text}")
-        
-        if response.status_code == 200:
-            print(f"{pacific_now}: Reminder sent successfully")
+    run.add_bytes('html', len(content))
+    
+    # Every (day, sweep) message is rendered once per document revision and
+    # layout (and task export, if any); while none of them changes a send is
+    # just a lookup
+    export = export_path()
+    revision = get_revision(thread)
+    if revision is not None:
+        revision = f"{revision}+{layout.digest}"
+        if export:
+            revision = f"{revision}+{export_digest(export)}"
+    renders = render_cache.get_week(QUIP_DOCUMENT_ID_1, revision)
+    run.set(revision=revision, render_cache_hit=renders is not None)
+    if renders is None:
+        # The roster index only depends on the document and the layout, so
+        # it is reused for as long as the revision is unchanged
+        index_name = f'roster_index:{layout.digest}'
+        tasks_name = f'roster_tasks:{layout.digest}'
+        roster_index = quip_cache.get_extract(QUIP_DOCUMENT_ID_1, index_name)
+        # Task counts carry over from the previous revision, and only the
+        # task rows that changed since are counted again
+        tasks = None
+        if roster_index is None:
+            tasks = TaskIndex(quip_cache.get_latest_snapshot(QUIP_DOCUMENT_ID_1, tasks_name))
+        if roster_index is None and quip_client.incremental:
+            # Only sections edited since the last revision are parsed
+            with run.stage('extract'):
+                roster_index = index_from_events(quip_client.extract_sections(
+                    QUIP_DOCUMENT_ID_1, thread, f'roster_events:{layout.digest}', section_roster_events),
+                    layout, tasks)
+            quip_cache.put_extract(QUIP_DOCUMENT_ID_1, index_name, roster_index)
+        elif roster_index is None:
+            with run.stage('parse'):
+                soup = BeautifulSoup(content, 'html.parser')
+            with run.stage('extract'):
+                roster_index = build_roster_index(soup, layout, tasks)
+            quip_cache.put_extract(QUIP_DOCUMENT_ID_1, index_name, roster_index)
         else:
-            print(f"{pacific_now}: Failed to send reminder. Status code: {response.status_code}")
-            
+            logger.info("Document unchanged since last run, using cached roster index")
+        if tasks is not None and 'tasks' in roster_index:
+            quip_cache.put_snapshot(QUIP_DOCUMENT_ID_1, tasks_name, revision, tasks.to_json())
+        if export:
+            # A local task export takes the place of the doc's task tables
+            with run.stage('tasks'):
+                export_name = f'roster_tasks_export:{layout.digest}'
+                export_tasks = TaskIndex(quip_cache.get_latest_snapshot(QUIP_DOCUMENT_ID_1, export_name))
+                changed = export_tasks.update(read_export(export, layout), layout)
+                logger.info("Task export %s: %d distinct rows changed", export, changed)
+                quip_cache.put_snapshot(QUIP_DOCUMENT_ID_1, export_name, revision, export_tasks.to_json())
+            roster_index = dict(roster_index, tasks=export_tasks.counts)
+        with run.stage('format'):
+            renders = render_week(roster_index)
+            render_cache.put_week(QUIP_DOCUMENT_ID_1, revision, renders)
+    else:
+        logger.info("Using pre-rendered messages for revision %s", revision)
+
+    message = renders[render_key(current_day, sweep_period)]
+    run.add_bytes('message', len(message.encode('utf-8')))
+    quip_cache.save_stats()
+    return message
+
+def send_reminder(context=None):
+    run = RunRecord(JOB_ID)
+    try:
+        # Every stage uses this one reading of the clock
+        context = context or run_context()
+        # Due check, outbox, delivery and ledger are shared with the other
+        # script (see outbox.send_due)
+        from outbox import send_due
+        send_due(run, context, JOB_ID, CHIME_WEBHOOK_URL_1,
+                 lambda: render_message(run, context.day, context.sweep), REQUIRED_ENV)
     except Exception as e:
-        print(f"{pacific_now}: Error occurred: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-
-class SimpleQuipClient:
-    def __init__(self, access_token):
-        self.access_token = access_token
-        self.base_url = "https://platform.quip-amazon.com/1"
-
-    def get_thread(self, thread_id):
-        url = f"{self.base_url}/threads/{thread_id}"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Accept": "application/json"
-        }
-        print(f"Fetching Quip document with URL: {url}")
-        response = requests.get(url, headers=headers)
-        print(f"Quip API Response Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            json_response = response.json()
-            print(f"JSON response keys: {json_response.keys()}")
-            if 'html' not in json_response:
-                print("HTML not in JSON response, trying to get it from 'thread'")
-                json_response['html'] = json_response['thread'].get('html', '')
-            print(f"HTML content length: {len(json_response['html'])}")
-            return json_response
-        else:
-            print(f"Error response content: {response.text}")
-            response.raise_for_status()
+        logger.exception("Error occurred")
+        run.set(error=str(e))
+        run.emit('error')
 
 if __name__ == "__main__":
-    send_reminder()
+    configure_logging()
+    if len(sys.argv) > 1:
+        # --dry-run / --replay / --record (see replay.py)
+        from replay import run_cli
+        sys.exit(run_cli(sys.modules[__name__], sys.argv[1:]))
+    with profiled():
+        send_reminder()
@@ -0,0 +1,177 @@
+import os
+import re
+from html.parser import HTMLParser
+
+# Parser backends for pulling the reminder list out of a Quip document.
+# Every backend returns the same thing: the text of each <li> under the first
+# <ul> of the first div[data-section-style="5"], in document order, with the
+# same whitespace handling as BeautifulSoup's get_text(strip=True).
+#
+#   html.parser - BeautifulSoup with the pure-Python parser (the original)
+#   lxml        - lxml.html, when installed
+#   selectolax  - selectolax (lexbor), when installed
+#   stream      - stdlib HTMLParser fed in chunks; stops as soon as the
+#                 target <ul> closes, so history after it is never parsed
+
+SECTION_STYLE = '5'
+SECTION_DIV_RE = re.compile(r'<div\b[^>]*\sdata-section-style=["\']?%s["\'\s/>]' % SECTION_STYLE, re.IGNORECASE)
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_BACKEND = 'stream'
+
+
+def _strip_join(strings):
+    return ''.join(s.strip() for s in strings)
+
+
+def _bs4_items(html_content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+    div = soup.find('div', attrs={'data-section-style': SECTION_STYLE})
+    main_ul = div.find('ul') if div else None
+    if not main_ul:
+        return []
+    return [item.get_text(strip=True) for item in main_ul.find_all('li')]
+
+
+def _lxml_items(html_content):
+    import lxml.html
+    if not html_content.strip():
+        return []
+    doc = lxml.html.document_fromstring(html_content)
+    divs = doc.xpath('//div[@data-section-style=$style]', style=SECTION_STYLE)
+    uls = divs[0].xpath('.//ul') if divs else []
+    if not uls:
+        return []
+    return [_strip_join(item.itertext()) for item in uls[0].iter('li')]
+
+
+def _selectolax_parser():
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser
+    except ImportError:
+        from selectolax.parser import HTMLParser as ModestHTMLParser
+        return ModestHTMLParser
+
+
+def _selectolax_items(html_content):
+    tree = _selectolax_parser()(html_content)
+    div = tree.css_first(f'div[data-section-style="{SECTION_STYLE}"]')
+    main_ul = div.css_first('ul') if div else None
+    if not main_ul:
+        return []
+    return [item.text(deep=True, separator='', strip=True) for item in main_ul.css('li')]
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _SectionListParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.state = 'find_div'  # find_div -> find_ul -> items
+        self.div_depth = 0
+        self.ul_depth = 0
+        self.items = []       # text pieces per <li>, in start-tag order
+        self.open_items = []  # indexes into self.items of the open <li>s
+        # BeautifulSoup merges adjacent text into one string before
+        # stripping; HTMLParser may split it at chunk boundaries
+        self.in_text = False
+
+    def handle_starttag(self, tag, attrs):
+        self.in_text = False
+        if self.state == 'find_div':
+            if tag == 'div' and dict(attrs).get('data-section-style') == SECTION_STYLE:
+                self.state = 'find_ul'
+                self.div_depth = 1
+        elif self.state == 'find_ul':
+            if tag == 'div':
+                self.div_depth += 1
+            elif tag == 'ul':
+                self.state = 'items'
+                self.ul_depth = 1
+        elif tag == 'ul':
+            self.ul_depth += 1
+        elif tag == 'li':
+            self.open_items.append(len(self.items))
+            self.items.append([])
+
+    def handle_endtag(self, tag):
+        self.in_text = False
+        if self.state == 'find_ul' and tag == 'div':
+            self.div_depth -= 1
+            if self.div_depth == 0:
+                raise _StopParsing()
+        elif self.state == 'items':
+            if tag == 'li' and self.open_items:
+                self.open_items.pop()
+            elif tag == 'ul':
+                self.ul_depth -= 1
+                if self.ul_depth == 0:
+                    raise _StopParsing()
+
+    def handle_data(self, data):
+        for position in self.open_items:
+            pieces = self.items[position]
+            if self.in_text and pieces:
+                pieces[-1] += data
+            else:
+                pieces.append(data)
+        self.in_text = True
+
+    def handle_comment(self, data):
+        self.in_text = False
+
+
+def _stream_items(html_content):
+    parser = _SectionListParser()
+    try:
+        for start in range(0, len(html_content), STREAM_CHUNK_SIZE):
+            parser.feed(html_content[start:start + STREAM_CHUNK_SIZE])
+        parser.close()
+    except _StopParsing:
+        pass
+    return [_strip_join(pieces) for pieces in parser.items]
+
+
+BACKENDS = {
+    'html.parser': _bs4_items,
+    'lxml': _lxml_items,
+    'selectolax': _selectolax_items,
+    'stream': _stream_items,
+}
+
+# Module each optional backend needs
+_REQUIREMENTS = {
+    'html.parser': 'bs4',
+    'lxml': 'lxml',
+    'selectolax': 'selectolax',
+}
+
+
+def available_backends():
+    import importlib.util
+    names = []
+    for name in BACKENDS:
+        module = _REQUIREMENTS.get(name)
+        if module is None or importlib.util.find_spec(module) is not None:
+            names.append(name)
+    return names
+
+
+def default_backend():
+    return os.environ.get('HTML_PARSER_BACKEND', DEFAULT_BACKEND)
+
+
+def has_section_list(html_content):
+    # Cheap pre-check for the section div, used to skip the incremental
+    # parse of top-level sections that can't hold the list
+    return SECTION_DIV_RE.search(html_content) is not None
+
+
+def section_items(html_content, backend=None):
+    name = backend or default_backend()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {name}")
+    return BACKENDS[name](html_content)
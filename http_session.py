@@ -0,0 +1,166 @@
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Shared HTTP transport for the Quip and Chime calls: one keep-alive
+# connection pool per host, connect/read timeouts on every request, and
+# retries with exponential backoff + full jitter that honour Retry-After.
+# GETs are retried on 429/5xx and any connection error. A POST may already
+# have been delivered when it gets a 5xx or loses its connection, so it is
+# only retried on 429 and on failures to connect. Every request (including
+# retries) is timed.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 429 means the request was turned away before it was acted on
+POST_RETRY_STATUSES = {429}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def not_sent(error):
+    # True if the request failed while connecting, before any of it was sent
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpTransport:
+    def __init__(self, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff_base=0.5, backoff_max=30.0, pool_maxsize=10):
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else _env_float('HTTP_CONNECT_TIMEOUT', 5.0),
+            read_timeout if read_timeout is not None else _env_float('HTTP_READ_TIMEOUT', 30.0),
+        )
+        self.max_retries = max_retries if max_retries is not None else int(_env_float('HTTP_MAX_RETRIES', 3))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = time.sleep
+
+        self.session = requests.Session()
+        # Retries are handled in request() so they can be timed and jittered
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.metrics = []
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, method, url, status, seconds, attempt):
+        self.metrics.append({
+            'method': method,
+            'host': urlparse(url).netloc,
+            'status': status,
+            'seconds': seconds,
+            'attempt': attempt,
+        })
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(method, url, type(e).__name__, time.perf_counter() - started, attempt)
+                retryable = method in IDEMPOTENT_METHODS or not_sent(e)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning("%s %s failed (%s), retrying in %.2fs",
+                               method, urlparse(url).netloc, type(e).__name__, delay)
+            else:
+                self._record(method, url, response.status_code, time.perf_counter() - started, attempt)
+                statuses = RETRY_STATUSES if method in IDEMPOTENT_METHODS else POST_RETRY_STATUSES
+                if response.status_code not in statuses or attempt >= self.max_retries:
+                    response.retries = attempt
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None:
+                    delay = min(self.backoff_max, retry_after)
+                else:
+                    delay = self.backoff_delay(attempt)
+                logger.warning("%s %s returned %s, retrying in %.2fs",
+                               method, urlparse(url).netloc, response.status_code, delay)
+                response.close()
+            self.sleep(delay)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def latency_summary(self):
+        summary = {}
+        for metric in self.metrics:
+            host = summary.setdefault(metric['host'],
+                                      {'requests': 0, 'retries': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            host['requests'] += 1
+            host['retries'] += 1 if metric['attempt'] else 0
+            host['total_seconds'] += metric['seconds']
+            host['max_seconds'] = max(host['max_seconds'], metric['seconds'])
+        for host in summary.values():
+            host['avg_seconds'] = host['total_seconds'] / host['requests']
+        return summary
+
+    def log_metrics(self):
+        # Logs and clears the metrics, so a long-lived process doesn't keep
+        # one per request
+        for host, stats in self.latency_summary().items():
+            logger.info("HTTP %s: %d requests, %d retries, avg %.1f ms, max %.1f ms", host,
+                        stats['requests'], stats['retries'], stats['avg_seconds'] * 1000, stats['max_seconds'] * 1000)
+        self.metrics = []
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport()
+    return _transport
+
+
+def set_transport(transport):
+    # Replaces the shared transport, e.g. with a recording or replaying one
+    global _transport
+    _transport = transport
@@ -0,0 +1,352 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Durable outbox for rendered messages. A message is written here as
+# pending before anything is posted, and only marked done once Chime
+# answers 2xx; a failed or interrupted delivery stays pending and is
+# retried on the next tick. Rows are keyed by an idempotency key per
+# (job, slot) - a slot already carries the date - and webhook, so
+# re-rendering the same slot never queues it twice. Delivery takes a lease
+# on each row, so overlapping runs don't post the same row, and a run that
+# dies mid-post leaves its rows to be picked up once the lease runs out.
+#
+#   OUTBOX_PATH           defaults to .reminder_state/outbox.db
+#   OUTBOX_MAX_AGE_HOURS  pending rows older than this expire instead of
+#                         being sent late (6 by default)
+#
+# send_due() is the send path the reminder scripts share: due check,
+# render into the outbox, deliver, then record the slot in the ledger.
+#
+#   python outbox.py list [--status pending]
+#   python outbox.py retry                  # deliver everything pending now
+#   python outbox.py replay KEY             # send a delivered slot again
+
+DEFAULT_OUTBOX_PATH = os.path.join('.reminder_state', 'outbox.db')
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_AGE_HOURS = 6.0
+
+PENDING = 'pending'
+SENDING = 'sending'
+DONE = 'done'
+EXPIRED = 'expired'
+
+COLUMNS = ('id', 'idempotency_key', 'job_id', 'slot', 'webhook', 'message',
+           'status', 'attempts', 'last_error', 'created_at', 'updated_at')
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(job_id, slot):
+    return f"{job_id}|{slot}"
+
+
+def outbox_path(path=None):
+    return path or os.environ.get('OUTBOX_PATH', DEFAULT_OUTBOX_PATH)
+
+
+class Outbox:
+    def __init__(self, path=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_age_hours=None, clock=time.time):
+        self.path = outbox_path(path)
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lease_seconds = lease_seconds
+        if max_age_hours is None:
+            max_age_hours = float(os.environ.get('OUTBOX_MAX_AGE_HOURS', DEFAULT_MAX_AGE_HOURS))
+        self.max_age = max_age_hours * 3600
+        self.clock = clock
+        # The runner delivers from a worker thread; the lock serialises use
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' id INTEGER PRIMARY KEY,'
+            ' idempotency_key TEXT NOT NULL,'
+            ' job_id TEXT NOT NULL,'
+            ' slot TEXT NOT NULL,'
+            ' webhook TEXT NOT NULL,'
+            ' message TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' last_error TEXT,'
+            ' lease_until REAL NOT NULL DEFAULT 0,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' UNIQUE (idempotency_key, webhook))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, job_id)')
+
+    def _rows(self, cursor):
+        return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+    def add(self, entries):
+        # entries: (job_id, slot, webhook, message); rows already queued for
+        # the same key and webhook are left alone. Returns the number added.
+        now = self.clock()
+        rows = [(idempotency_key(job_id, slot), job_id, slot, webhook, message, PENDING, now, now)
+                for job_id, slot, webhook, message in entries]
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO outbox (idempotency_key, job_id, slot, webhook, message,'
+                    ' status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            return self.conn.total_changes - before
+
+    def has(self, job_id, slot):
+        with self.lock:
+            row = self.conn.execute('SELECT 1 FROM outbox WHERE idempotency_key = ? LIMIT 1',
+                                    (idempotency_key(job_id, slot),)).fetchone()
+        return row is not None
+
+    def is_done(self, job_id, slot):
+        with self.lock:
+            statuses = {row[0] for row in self.conn.execute(
+                'SELECT status FROM outbox WHERE idempotency_key = ?', (idempotency_key(job_id, slot),))}
+        return statuses == {DONE}
+
+    def _deliverable(self, job_ids, now):
+        # Pending rows, plus rows whose delivery lease has run out
+        where = ' WHERE (status = ? OR (status = ? AND lease_until < ?))'
+        params = [PENDING, SENDING, now]
+        if job_ids is not None:
+            where += f" AND job_id IN ({','.join('?' * len(job_ids))})"
+            params += list(job_ids)
+        return where, params
+
+    def has_pending(self, job_ids=None):
+        where, params = self._deliverable(job_ids, self.clock())
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM outbox' + where + ' LIMIT 1', params).fetchone() is not None
+
+    def claim_pending(self, job_ids=None):
+        # Lease every deliverable row; rows past max_age expire instead
+        now = self.clock()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                where, params = self._deliverable(job_ids, now)
+                rows = self._rows(self.conn.execute(
+                    'SELECT ' + ', '.join(COLUMNS) + ' FROM outbox' + where + ' ORDER BY id', params))
+                stale = [row for row in rows if now - row['created_at'] > self.max_age]
+                rows = [row for row in rows if now - row['created_at'] <= self.max_age]
+                self.conn.executemany(
+                    'UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?',
+                    [(EXPIRED, now, row['id']) for row in stale])
+                self.conn.executemany(
+                    'UPDATE outbox SET status = ?, lease_until = ?, attempts = attempts + 1,'
+                    ' updated_at = ? WHERE id = ?',
+                    [(SENDING, now + self.lease_seconds, now, row['id']) for row in rows])
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        for row in stale:
+            logger.warning("[%s] Expired undelivered message for %s", row['job_id'], row['slot'])
+        return rows
+
+    def complete(self, results):
+        # results: (row id, ok, error); failures go back to pending
+        now = self.clock()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'UPDATE outbox SET status = ?, last_error = ?, lease_until = 0, updated_at = ? WHERE id = ?',
+                    [(DONE if ok else PENDING, error, now, row_id) for row_id, ok, error in results])
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def requeue(self, key):
+        with self.lock:
+            cursor = self.conn.execute(
+                'UPDATE outbox SET status = ?, created_at = ?, lease_until = 0, updated_at = ?'
+                ' WHERE idempotency_key = ?', (PENDING, self.clock(), self.clock(), key))
+        return cursor.rowcount
+
+    def entries(self, status=None, job_id=None, limit=100):
+        query = 'SELECT ' + ', '.join(COLUMNS) + ' FROM outbox WHERE 1 = 1'
+        params = []
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        if job_id:
+            query += ' AND job_id = ?'
+            params.append(job_id)
+        query += f' ORDER BY id DESC LIMIT {int(limit)}'
+        with self.lock:
+            return self._rows(self.conn.execute(query, params))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_outbox(path=None):
+    return Outbox(path)
+
+
+def has_pending(job_ids=None, path=None):
+    # Cheap check for the skip path: no outbox file means nothing to retry
+    path = outbox_path(path)
+    if not os.path.exists(path):
+        return False
+    with Outbox(path) as outbox:
+        return outbox.has_pending(job_ids)
+
+
+def deliver_pending(outbox, delivery_queue, job_ids=None):
+    # Post every pending row through the delivery queue and record the
+    # result; returns (row, ok) pairs
+    rows = outbox.claim_pending(job_ids)
+    if not rows:
+        return []
+    deliveries = [delivery_queue.enqueue(row['webhook'], row['message'], row['job_id']) for row in rows]
+    delivery_queue.flush()
+    outbox.complete([
+        (row['id'], delivery.ok, None if delivery.ok else (delivery.error or f"status {delivery.status_code}"))
+        for row, delivery in zip(rows, deliveries)])
+    return [(row, delivery.ok) for row, delivery in zip(rows, deliveries)]
+
+
+def record_sent(outbox, state_store, delivered, sent_at=None):
+    # Mark a (job, slot) as sent in the ledger once all its webhooks are done
+    sent = []
+    for row, _ in delivered:
+        key = (row['job_id'], row['slot'])
+        if key not in sent and outbox.is_done(*key):
+            state_store.mark_sent(row['job_id'], row['slot'], sent_at)
+            sent.append(key)
+    return sent
+
+
+def due_slot(context, job_id):
+    # The slot to send now (FORCE_SEND=true makes one up), or None if it
+    # isn't a send time or the slot was already sent
+    logger.info("Current Pacific time: %s", context.now.strftime('%Y-%m-%d %H:%M:%S %Z'))
+    slot = context.slot
+    if slot is not None:
+        from state_store import open_state_store
+        # The ledger only records a slot once Chime has accepted it, so a
+        # failed send is tried again on the next run
+        with open_state_store() as state_store:
+            if state_store.was_sent(job_id, slot):
+                logger.info("Message already sent for %s:00. Skipping.", context.send_time[0])
+                return None
+        return slot
+    if os.environ.get('FORCE_SEND', 'false').lower() == 'true':
+        return context.forced_slot
+    logger.info("Current time %s is not within a scheduled reminder window. Skipping.", context.now.strftime('%H:%M'))
+    return None
+
+
+def send_due(run, context, job_id, webhook, render, required_env=()):
+    # Sends the job's message if a slot is due or an earlier one is still
+    # pending. render() is only called for a slot that isn't queued yet;
+    # the message is stored as pending before it is posted, and the slot
+    # is only marked sent once Chime has accepted it.
+    slot = due_slot(context, job_id)
+    if slot is None:
+        if not has_pending([job_id]):
+            run.emit('skipped')
+            return
+        logger.info("Retrying undelivered messages from an earlier run")
+
+    # Checked here rather than at import so the runner can import the scripts
+    missing = [name for name in required_env if not os.environ.get(name)]
+    if missing:
+        sys.exit(f"Missing required environment variables: {', '.join(missing)}")
+
+    # A send is due, so load the HTTP and state modules now
+    from chime_delivery import DeliveryQueue
+    from http_session import get_transport
+    from state_store import open_state_store
+
+    logger.info("=== Starting reminder process at %s ===", context.now)
+    logger.info("Current day: %s", context.day)
+    run.set(day=context.day, slot=slot)
+    if context.sweep is not None:
+        run.set(sweep=context.sweep)
+
+    with open_outbox() as outbox:
+        if slot is not None and not outbox.has(job_id, slot):
+            outbox.add([(job_id, slot, webhook, render())])
+
+        with run.stage('post'):
+            logger.info("Sending message to Chime...")
+            delivery_queue = DeliveryQueue()
+            delivered = deliver_pending(outbox, delivery_queue, [job_id])
+
+        with open_state_store() as state_store:
+            record_sent(outbox, state_store, delivered, context.now)
+
+    deliveries = delivery_queue.delivered
+    run.set(status_codes=[code for delivery in deliveries for code in delivery.status_codes],
+            chunks=sum(delivery.chunks for delivery in deliveries),
+            retries=sum(delivery.retries for delivery in deliveries))
+    if not delivered:
+        logger.info("Nothing to deliver; another run holds the pending messages")
+        run.emit('skipped')
+    elif all(ok for _, ok in delivered):
+        logger.info("%s: Reminder sent successfully", context.now)
+        run.emit('sent')
+    else:
+        logger.error("%s: Failed to send reminder, it stays in the outbox for the next run", context.now)
+        run.set(error='; '.join(delivery.error or f"status {delivery.status_code}"
+                                 for delivery in deliveries if not delivery.ok))
+        run.emit('failed')
+
+    delivery_queue.log_report()
+    get_transport().log_metrics()
+
+
+def main(argv=None):
+    # Imported here so the scripts' skip path doesn't pay for it
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect and replay the message outbox')
+    parser.add_argument('--path', default=None, help='outbox path (default from OUTBOX_PATH)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    listing = subparsers.add_parser('list', help='show recent outbox rows')
+    listing.add_argument('--status', choices=[PENDING, SENDING, DONE, EXPIRED])
+    listing.add_argument('--job')
+    listing.add_argument('--limit', type=int, default=50)
+    subparsers.add_parser('retry', help='deliver all pending rows now')
+    replay = subparsers.add_parser('replay', help='queue a slot again and deliver it')
+    replay.add_argument('key', help='idempotency key, "<job id>|<slot>"')
+    args = parser.parse_args(argv)
+
+    with Outbox(args.path) as outbox:
+        if args.command == 'list':
+            for row in outbox.entries(args.status, args.job, args.limit):
+                print(f"{row['id']:>6} {row['status']:<8} {row['attempts']:>3} {row['idempotency_key']}"
+                      f"  {len(row['message'])} chars{'  ' + row['last_error'] if row['last_error'] else ''}")
+            return 0
+        if args.command == 'replay' and not outbox.requeue(args.key):
+            print(f"No outbox rows for {args.key}")
+            return 1
+        from chime_delivery import DeliveryQueue
+        job_ids = [args.key.split('|', 1)[0]] if args.command == 'replay' else None
+        delivered = deliver_pending(outbox, DeliveryQueue(), job_ids)
+        for row, ok in delivered:
+            print(f"{row['idempotency_key']}: {'delivered' if ok else 'failed'}")
+        return 0 if all(ok for _, ok in delivered) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
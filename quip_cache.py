@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+# On-disk cache of Quip thread responses. Each thread has a <thread>.json
+# entry with the response minus its 'html', the revision markers Quip gave
+# us (ETag / Last-Modified headers and thread.updated_usec) and any results
+# the scripts derived from that revision, so an unchanged document costs
+# neither a download nor a BeautifulSoup parse. The HTML itself is kept in
+# <thread>.html and only read back to answer a 304, so storing an extract
+# rewrites a few KB instead of the whole document, and a revision that was
+# already cached isn't written again. Snapshots of derived results live in
+# their own <thread>.<name>.snapshot.json files.
+
+STATS_FILE = 'stats.json'
+
+logger = logging.getLogger(__name__)
+
+
+def get_revision(json_response):
+    thread = json_response.get('thread') or {}
+    return thread.get('updated_usec')
+
+
+class QuipThreadCache:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.environ.get('QUIP_CACHE_DIR', '.quip_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Counters for this process; persisted cumulatively by save_stats()
+        self.stats = {
+            'hits': 0,           # revision unchanged, cached html/extracts reused
+            'misses': 0,         # new or changed revision, full download + parse
+            'not_modified': 0,   # hits answered with a 304 (download skipped)
+            'parse_skipped': 0,  # extracts served from the cache
+            'sections_reused': 0,     # incremental mode: unchanged sections
+            'sections_extracted': 0,  # incremental mode: new or edited sections
+            'bytes_fetched': 0,
+            'bytes_saved': 0,
+            'fetch_seconds': 0.0,
+        }
+
+    def _path(self, thread_id):
+        safe_id = ''.join(c for c in str(thread_id) if c.isalnum() or c in '-_')
+        return os.path.join(self.cache_dir, f"{safe_id}.json")
+
+    def _html_path(self, thread_id):
+        return self._path(thread_id)[:-len('.json')] + '.html'
+
+    def _write_text(self, path, text):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _write_json(self, path, data):
+        # json.dumps uses the C encoder; json.dump streams in Python
+        self._write_text(path, json.dumps(data))
+
+    def _read_html(self, thread_id):
+        try:
+            with open(self._html_path(thread_id), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def load(self, thread_id):
+        try:
+            with open(self._path(thread_id), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, entry):
+        headers = {}
+        # Without the HTML on disk a 304 couldn't be answered
+        if entry and os.path.exists(self._html_path(entry['thread_id'])):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record_not_modified(self, thread_id, entry, elapsed=0.0):
+        html = self._read_html(thread_id) or ''
+        self.stats['hits'] += 1
+        self.stats['not_modified'] += 1
+        self.stats['bytes_saved'] += len(html)
+        self.stats['fetch_seconds'] += elapsed
+        logger.info("Quip cache hit for %s (304 Not Modified)", thread_id)
+        return dict(entry['response'], html=html)
+
+    def store(self, thread_id, json_response, etag=None, last_modified=None, elapsed=0.0):
+        previous = self.load(thread_id)
+        revision = get_revision(json_response)
+        html_len = len(json_response.get('html', ''))
+        self.stats['bytes_fetched'] += html_len
+        self.stats['fetch_seconds'] += elapsed
+
+        unchanged = (previous is not None and revision is not None and
+                     previous.get('revision') == revision)
+        # Entries written before the HTML had a file of its own lack one
+        has_html = os.path.exists(self._html_path(thread_id))
+        if unchanged:
+            self.stats['hits'] += 1
+            logger.info("Quip cache hit for %s (updated_usec %s unchanged)", thread_id, revision)
+            # Bulk responses carry no validators; keep the ones we have
+            etag = etag or previous.get('etag')
+            last_modified = last_modified or previous.get('last_modified')
+            if has_html and (previous.get('etag'), previous.get('last_modified')) == (etag, last_modified):
+                return previous
+        else:
+            self.stats['misses'] += 1
+            logger.info("Quip cache miss for %s (revision %s)", thread_id, revision)
+        if not unchanged or not has_html:
+            self._write_text(self._html_path(thread_id), json_response.get('html', ''))
+
+        entry = {
+            'thread_id': thread_id,
+            'revision': revision,
+            'etag': etag,
+            'last_modified': last_modified,
+            'validated_at': time.time(),
+            'response': {key: value for key, value in json_response.items() if key != 'html'},
+            # Derived results are only valid for the revision they came from
+            'extracts': previous.get('extracts', {}) if unchanged else {},
+            # ...except per-section ones, which are keyed by section hash
+            'sections': previous.get('sections', {}) if previous else {},
+        }
+        self._write_json(self._path(thread_id), entry)
+        return entry
+
+    def get_extract(self, thread_id, name):
+        entry = self.load(thread_id)
+        if entry is None or name not in entry.get('extracts', {}):
+            return None
+        self.stats['parse_skipped'] += 1
+        return entry['extracts'][name]
+
+    def put_extract(self, thread_id, name, value):
+        entry = self.load(thread_id)
+        if entry is None:
+            return
+        entry.setdefault('extracts', {})[name] = value
+        self._write_json(self._path(thread_id), entry)
+
+    def _snapshot_path(self, thread_id, name):
+        return self._path(thread_id)[:-len('.json')] + f".{name}.snapshot.json"
+
+    def _read_snapshot(self, thread_id, name):
+        try:
+            with open(self._snapshot_path(thread_id, name), 'r', encoding='utf-8') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def get_snapshot(self, thread_id, name, revision):
+        # A small file of its own, so a warm start doesn't load the cached
+        # HTML just to get at the extracted result
+        if revision is None:
+            return None
+        data = self._read_snapshot(thread_id, name)
+        if data is None or data.get('revision') != revision:
+            return None
+        self.stats['parse_skipped'] += 1
+        return data['snapshot']
+
+    def get_latest_snapshot(self, thread_id, name):
+        # The snapshot of whichever revision stored it last, for state that
+        # is carried from one revision to the next
+        data = self._read_snapshot(thread_id, name)
+        return data['snapshot'] if data else None
+
+    def put_snapshot(self, thread_id, name, revision, snapshot):
+        if revision is None:
+            return
+        self._write_json(self._snapshot_path(thread_id, name), {'revision': revision, 'snapshot': snapshot})
+
+    def get_section_results(self, thread_id, name):
+        entry = self.load(thread_id)
+        if entry is None:
+            return {}
+        return entry.get('sections', {}).get(name, {})
+
+    def put_section_results(self, thread_id, name, results, reused=0):
+        self.stats['sections_reused'] += reused
+        self.stats['sections_extracted'] += len(results) - reused
+        entry = self.load(thread_id)
+        if entry is None:
+            return
+        entry.setdefault('sections', {})[name] = results
+        self._write_json(self._path(thread_id), entry)
+
+    def save_stats(self):
+        path = os.path.join(self.cache_dir, STATS_FILE)
+        try:
+            with open(path, 'r') as f:
+                totals = json.load(f)
+        except (OSError, ValueError):
+            totals = {}
+        for key, value in self.stats.items():
+            totals[key] = totals.get(key, 0) + value
+        self._write_json(path, totals)
+        logger.info("Quip cache stats (this run): %s", self.stats)
+        logger.info("Quip cache stats (cumulative): %s", totals)
+        return totals
@@ -0,0 +1,133 @@
+import logging
+import os
+import time
+from urllib.parse import quote
+
+from http_session import get_transport
+from quip_sections import section_hash, split_sections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://platform.quip-amazon.com/1"
+# Ids per /threads/?ids= request; QUIP_BATCH_SIZE overrides it
+DEFAULT_BATCH_SIZE = 50
+
+
+class SimpleQuipClient:
+    def __init__(self, access_token, cache=None, transport=None, base_url=None, incremental=None):
+        self.access_token = access_token
+        self.base_url = base_url or os.environ.get('QUIP_BASE_URL', DEFAULT_BASE_URL)
+        self.cache = cache
+        self.transport = transport or get_transport()
+        if incremental is None:
+            incremental = os.environ.get('QUIP_INCREMENTAL', 'false').lower() == 'true'
+        self.incremental = incremental
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.access_token}",
+            "Accept": "application/json"
+        }
+
+    def _with_html(self, json_response):
+        logger.debug("JSON response keys: %s", list(json_response.keys()))
+        if 'html' not in json_response:
+            logger.debug("HTML not in JSON response, trying to get it from 'thread'")
+            json_response['html'] = json_response['thread'].get('html', '')
+        return json_response
+
+    def get_thread(self, thread_id):
+        url = f"{self.base_url}/threads/{thread_id}"
+        headers = self._headers()
+        cached = self.cache.load(thread_id) if self.cache else None
+        if cached:
+            headers.update(self.cache.conditional_headers(cached))
+
+        logger.info("Fetching Quip document with URL: %s", url)
+        started = time.perf_counter()
+        response = self.transport.get(url, headers=headers)
+        elapsed = time.perf_counter() - started
+        logger.info("Quip API Response Status: %s", response.status_code)
+
+        if response.status_code == 304 and cached:
+            return self.cache.record_not_modified(thread_id, cached, elapsed)
+
+        if response.status_code == 200:
+            json_response = self._with_html(response.json())
+            logger.info("HTML content length: %d", len(json_response['html']))
+            if self.cache:
+                self.cache.store(thread_id, json_response,
+                                 etag=response.headers.get('ETag'),
+                                 last_modified=response.headers.get('Last-Modified'),
+                                 elapsed=elapsed)
+            return json_response
+        else:
+            logger.error("Error response content: %s", response.text)
+            response.raise_for_status()
+
+    def get_threads(self, thread_ids, batch_size=None):
+        # Several threads per round trip through /threads/?ids=a,b,c, in
+        # chunks of batch_size. Returns ({id: response shaped like
+        # get_thread's}, {id: reason}) for the ids that came back and the
+        # ones that didn't. Bulk responses carry no ETag, so every thread
+        # is downloaded in full.
+        batch_size = batch_size or int(os.environ.get('QUIP_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        ids = list(dict.fromkeys(thread_ids))
+        threads = {}
+        failed = {}
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            url = f"{self.base_url}/threads/?ids={quote(','.join(chunk), safe=',')}"
+            logger.info("Fetching %d Quip documents in one request", len(chunk))
+            started = time.perf_counter()
+            try:
+                response = self.transport.get(url, headers=self._headers())
+            except Exception as e:
+                logger.error("Bulk Quip fetch failed: %s", e)
+                failed.update((thread_id, str(e)) for thread_id in chunk)
+                continue
+            elapsed = time.perf_counter() - started
+            logger.info("Quip API Response Status: %s", response.status_code)
+            if response.status_code != 200:
+                logger.error("Error response content: %s", response.text)
+                failed.update((thread_id, f"status {response.status_code}") for thread_id in chunk)
+                continue
+            body = response.json()
+            for thread_id in chunk:
+                json_response = body.get(thread_id)
+                if not isinstance(json_response, dict) or 'thread' not in json_response:
+                    error = json_response.get('error') if isinstance(json_response, dict) else None
+                    failed[thread_id] = error or 'not returned'
+                    continue
+                json_response = self._with_html(json_response)
+                if self.cache:
+                    self.cache.store(thread_id, json_response, elapsed=elapsed / len(chunk))
+                threads[thread_id] = json_response
+        if failed:
+            logger.warning("Bulk fetch: %d of %d threads failed: %s", len(failed), len(ids), failed)
+        return threads, failed
+
+    def extract_sections(self, thread_id, thread, name, extract_section):
+        # Incremental extraction: run extract_section on each top-level
+        # section of the thread, reusing the stored result of every section
+        # whose hash was seen in the previous revision, so the cost follows
+        # the size of the edit. Returns the per-section results in order.
+        previous = self.cache.get_section_results(thread_id, name) if self.cache else {}
+        results = []
+        current = {}
+        reused = 0
+        for section in split_sections(thread['html']):
+            digest = section_hash(section)
+            if digest in current:
+                result = current[digest]
+            elif digest in previous:
+                result = previous[digest]
+                reused += 1
+            else:
+                result = extract_section(section)
+            current[digest] = result
+            results.append(result)
+        logger.info("Re-extracted %d of %d sections of %s", len(current) - reused, len(current), thread_id)
+        if self.cache:
+            self.cache.put_section_results(thread_id, name, current, reused)
+        return results
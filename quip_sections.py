@@ -0,0 +1,64 @@
+import hashlib
+import re
+from functools import lru_cache
+
+# Splits Quip thread HTML into its top-level sections (each heading,
+# paragraph, list or table block is one top-level element with its own id)
+# so that results derived from a section can be reused while its content
+# hash is unchanged. Splitting is a regex scan over the tags; nothing is
+# parsed. Concatenating the sections gives back the original HTML exactly.
+
+TAG_RE = re.compile(
+    r'<!--.*?-->|<(/?)([a-zA-Z][a-zA-Z0-9-]*)((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>',
+    re.DOTALL)
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+             'link', 'meta', 'param', 'source', 'track', 'wbr'}
+RAW_TEXT_TAGS = {'script', 'style'}
+
+
+@lru_cache(maxsize=None)
+def _same_tag_re(tag):
+    if tag in RAW_TEXT_TAGS:
+        return re.compile(rf'(/){tag}\s*>', re.IGNORECASE)
+    return re.compile(rf'<!--.*?-->|<(/?){tag}(?=[\s/>])[^>]*>', re.IGNORECASE | re.DOTALL)
+
+
+def _element_end(html_content, tag, position):
+    # Only tags with the same name decide where a top-level element ends,
+    # so the search runs in the regex engine rather than tag by tag
+    depth = 1
+    for match in _same_tag_re(tag).finditer(html_content, position):
+        closing = match.group(1)
+        if closing is None:  # comment
+            continue
+        depth += -1 if closing else 1
+        if depth == 0:
+            return match.end()
+    # Unclosed element: it runs to the end of the document
+    return len(html_content)
+
+
+def split_sections(html_content):
+    sections = []
+    start = position = 0
+    while True:
+        match = TAG_RE.search(html_content, position)
+        if match is None:
+            break
+        closing, tag, attrs = match.groups()
+        position = match.end()
+        # Comments and stray end tags stay with the next section
+        if tag is None or closing:
+            continue
+        tag = tag.lower()
+        if tag not in VOID_TAGS and not attrs.rstrip().endswith('/'):
+            position = _element_end(html_content, tag, position)
+        sections.append(html_content[start:position])
+        start = position
+    if start < len(html_content):
+        sections.append(html_content[start:])
+    return sections
+
+
+def section_hash(section_html):
+    return hashlib.blake2b(section_html.encode('utf-8'), digest_size=16).hexdigest()
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import perf_counter
+
+# Logging and per-run metrics shared by the scripts.
+#
+#   LOG_LEVEL        INFO by default; DEBUG turns on per-item tracing
+#                    (every list item, roster cell and the message body)
+#   RUN_RECORD_PATH  also append each run's JSON record to this file
+#   PROFILE          'cprofile' or 'tracemalloc' to profile the run;
+#                    PROFILE_OUTPUT names the cProfile stats file
+
+RUN_LOGGER = 'reminder.run'
+
+
+def configure_logging(level=None):
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        root.addHandler(handler)
+    root.setLevel(level.upper())
+
+
+class RunRecord:
+    # One structured record per run: stage timings, byte counts, outcome
+
+    def __init__(self, job_id):
+        self.record = {
+            'job': job_id,
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'outcome': None,
+            'stages_ms': {},
+            'bytes': {},
+        }
+        self.started = perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, perf_counter() - started)
+
+    def add_stage(self, name, seconds):
+        stages = self.record['stages_ms']
+        stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 3)
+
+    def add_bytes(self, name, count):
+        self.record['bytes'][name] = self.record['bytes'].get(name, 0) + count
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def emit(self, outcome=None):
+        if outcome is not None:
+            self.record['outcome'] = outcome
+        self.record['total_ms'] = round((perf_counter() - self.started) * 1000, 3)
+        line = json.dumps(self.record, sort_keys=True)
+        logging.getLogger(RUN_LOGGER).info(line)
+        path = os.environ.get('RUN_RECORD_PATH')
+        if path:
+            with open(path, 'a') as f:
+                f.write(line + '\n')
+        return self.record
+
+
+@contextmanager
+def profiled(mode=None):
+    mode = (mode or os.environ.get('PROFILE', '')).lower()
+    logger = logging.getLogger(__name__)
+    if mode == 'cprofile':
+        import cProfile
+        import io
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output = os.environ.get('PROFILE_OUTPUT', 'reminder.prof')
+            profiler.dump_stats(output)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(20)
+            logger.info("cProfile stats written to %s\n%s", output, summary.getvalue())
+    elif mode == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = '\n'.join(str(stat) for stat in snapshot.statistics('lineno')[:10])
+            logger.info("tracemalloc peak: %.1f KiB\n%s", peak / 1024, top)
+    else:
+        yield
@@ -0,0 +1,585 @@
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta, timezone
+from time import perf_counter
+from zoneinfo import ZoneInfo
+
+from chime_delivery import DeliveryQueue
+from http_session import HttpTransport
+from outbox import Outbox, deliver_pending, open_outbox, record_sent
+from quip_sections import section_hash
+from quip_cache import QuipThreadCache
+from quip_client import SimpleQuipClient
+from reminder_log import RunRecord, configure_logging, profiled
+from run_context import RunContext, send_time_on, utc_now
+from sharding import open_shards
+from state_store import open_state_store
+
+# Runs many Quip doc -> Chime room jobs from one process. Every tick, the
+# due jobs are collected, each distinct doc is fetched once (concurrently,
+# bounded by --concurrency), each (doc, extractor) pair is extracted once,
+# and every job's message is posted to all of its webhooks in parallel, so
+# a tick takes about as long as its slowest doc rather than the sum. Posts
+# go through one delivery queue, so jobs sending the same message to the
+# same room post it once. Rendered messages go through the durable outbox,
+# so a failed post is retried on the next tick, and a slot is recorded as
+# sent in the shared state store only once every webhook accepted it.
+#
+# Job list format (JSON), values starting with '$' are read from the env:
+#   {"jobs": [{"id": "daily", "doc_id": "$QUIP_DOC_ID",
+#              "extractor": "daily", "formatter": "daily",
+#              "webhooks": ["$CHIME_WEBHOOK_URL"],
+#              "schedule": {"times": ["10:00", "14:00"],
+#                           "timezone": "America/Los_Angeles",
+#                           "window_minutes": 15}}]}
+#
+# A job can also list audiences, each with its own webhooks and schedule
+# (anything left out comes from the job). Every audience becomes a job of
+# its own, "<id>@<name>", sending at its local times:
+#   "audiences": [{"name": "east", "webhooks": ["$CHIME_WEBHOOK_URL_EAST"],
+#                  "timezone": "America/New_York"}]
+# Schedules are evaluated once per distinct timezone and set of times, and
+# a message is rendered once per doc revision and render key (the local
+# day, plus the sweep for the roster), however many audiences share it.
+#
+# Parsing and extraction are pure Python and hold the GIL, so with
+# --parse-processes they run in a process pool instead of the thread
+# pool: the raw HTML goes to a worker and only the extracted sections or
+# roster index come back.
+#
+# With --worker-id, several runners share the job list: each sends only
+# the jobs the shard ring gives it, and claims every (job, slot) in the
+# shard ledger before rendering it (see sharding.py). Runners that share
+# no ledger, such as a CI matrix, take a static --shard i/N instead.
+
+DEFAULT_TIMEZONE = 'America/Los_Angeles'
+DEFAULT_WINDOW_MINUTES = 15
+# Renders kept per doc revision and formatter; enough for every day and
+# sweep of a week, and a bound on per-minute keys in a long-lived process
+RENDER_MEMO_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+
+def extract_daily(html):
+    from chime_reminder import extract_content
+    return extract_content(html)
+
+
+def extract_roster(html):
+    # The roster index is shared by every job on the doc; the day and sweep
+    # are picked at format time, from the tick's clock
+    from bs4 import BeautifulSoup
+    from chime_reminder_1 import build_roster_index
+    return build_roster_index(BeautifulSoup(html, 'html.parser'))
+
+
+def format_daily(sections, now):
+    from chime_reminder import format_message
+    return format_message(sections, now.strftime('%A'))
+
+
+def format_roster(index, now):
+    from chime_reminder_1 import extract_roster_data, format_message, get_sweep_period
+    return format_message(extract_roster_data(index, now.strftime('%A'), get_sweep_period(now.hour)))
+
+
+def render_key_daily(now):
+    return now.strftime('%A')
+
+
+def render_key_roster(now):
+    from chime_reminder_1 import get_sweep_period
+    return f"{now.strftime('%A')}|{get_sweep_period(now.hour)}"
+
+
+def render_key_minute(now):
+    # For formatters without a registered key: only audiences at the same
+    # local time share a render
+    return now.strftime('%Y-%m-%d %H:%M')
+
+
+EXTRACTORS = {
+    'daily': extract_daily,
+    'roster': extract_roster,
+}
+
+FORMATTERS = {
+    'daily': format_daily,
+    'roster': format_roster,
+}
+
+# What a formatter's output depends on, from the audience's local time
+RENDER_KEYS = {
+    'daily': render_key_daily,
+    'roster': render_key_roster,
+}
+
+
+def available_cores():
+    # Cores this process may run on, which can be fewer than the machine has
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def process_count(value):
+    # --parse-processes value: a number, or 'auto' for one per core
+    return available_cores() if value == 'auto' else int(value)
+
+
+def run_extractor(extractor, html):
+    # Entry point of the parse processes; takes the extractor by name so
+    # only strings are pickled on the way in
+    return resolve_callable(extractor, EXTRACTORS)(html)
+
+
+def resolve_value(value):
+    if isinstance(value, str) and value.startswith('$'):
+        return os.environ.get(value[1:], '')
+    return value
+
+
+def resolve_callable(name, registry):
+    # Either a registered name or a 'module:function' path
+    if name in registry:
+        return registry[name]
+    module_name, _, attr = name.partition(':')
+    if not attr:
+        raise ValueError(f"Unknown extractor/formatter: {name}")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class Job:
+    def __init__(self, job_id, doc_id, extractor, formatter, webhooks,
+                 send_times, timezone=DEFAULT_TIMEZONE, window_minutes=DEFAULT_WINDOW_MINUTES):
+        self.job_id = job_id
+        self.doc_id = doc_id
+        self.extractor = extractor
+        self.formatter = formatter
+        self.webhooks = webhooks
+        self.send_times = send_times
+        # Checked here, so a bad name fails when the job list is loaded
+        self.timezone = ZoneInfo(timezone)
+        self.tz_name = timezone
+        self.window = timedelta(minutes=window_minutes)
+        # Jobs with the same schedule_key always have the same send times
+        self.schedule_key = (timezone, tuple(sorted(send_times)))
+
+    @classmethod
+    def from_dict(cls, data):
+        schedule = data.get('schedule', {})
+        send_times = []
+        for value in schedule.get('times', []):
+            hour, minute = value.split(':')
+            send_times.append((int(hour), int(minute)))
+        return cls(
+            job_id=data['id'],
+            doc_id=resolve_value(data['doc_id']),
+            extractor=data.get('extractor', 'daily'),
+            formatter=data.get('formatter', data.get('extractor', 'daily')),
+            webhooks=[resolve_value(url) for url in data.get('webhooks', [])],
+            send_times=send_times,
+            timezone=schedule.get('timezone', DEFAULT_TIMEZONE),
+            window_minutes=schedule.get('window_minutes', DEFAULT_WINDOW_MINUTES),
+        )
+
+    @classmethod
+    def list_from_dict(cls, data):
+        # One job, or one per audience
+        if 'audiences' not in data:
+            return [cls.from_dict(data)]
+        jobs = []
+        for audience in data['audiences']:
+            schedule = dict(data.get('schedule', {}))
+            schedule.update({key: audience[key] for key in ('times', 'timezone', 'window_minutes')
+                             if key in audience})
+            jobs.append(cls.from_dict(dict(
+                data, id=f"{data['id']}@{audience['name']}", schedule=schedule,
+                webhooks=audience.get('webhooks', data.get('webhooks', [])))))
+        return jobs
+
+    def local_now(self, now):
+        return now.astimezone(self.timezone)
+
+    def context(self, now):
+        # The same day, window and slot logic as the scripts (run_context.py)
+        return RunContext(now, self.tz_name, self.send_times, self.window)
+
+    def slot_time(self, day, hour, minute):
+        return send_time_on(day, hour, minute, self.tz_name)
+
+    def next_slot_time(self, after):
+        # First send time strictly after 'after', DST-aware in the job's
+        # timezone. Compared in UTC: aware datetimes of the same zone would
+        # compare by wall clock, which repeats an hour in the autumn
+        after = after.astimezone(timezone.utc)
+        local_day = self.local_now(after).date()
+        for offset in range(8):
+            day = local_day + timedelta(days=offset)
+            for hour, minute in sorted(self.send_times):
+                slot_time = self.slot_time(day, hour, minute)
+                if slot_time > after:
+                    return slot_time
+        return None
+
+    def previous_slot_time(self, before):
+        # Latest send time at or before 'before'
+        before = before.astimezone(timezone.utc)
+        local_day = self.local_now(before).date()
+        for offset in range(8):
+            day = local_day - timedelta(days=offset)
+            for hour, minute in sorted(self.send_times, reverse=True):
+                slot_time = self.slot_time(day, hour, minute)
+                if slot_time <= before:
+                    return slot_time
+        return None
+
+    def slot_key(self, slot_time):
+        return self.local_now(slot_time).strftime('%Y-%m-%d %H:%M')
+
+    def due_slot(self, now):
+        # Slot key of the send time whose window contains now, if any
+        return self.context(now).slot
+
+
+def load_jobs(path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return [job for item in data.get('jobs', []) for job in Job.list_from_dict(item)]
+
+
+def next_fire_times(jobs, after):
+    # (job, next send time) for every job in one pass; the send time is
+    # worked out once per distinct schedule, however many audiences share it
+    computed = {}
+    fire_times = []
+    for job in jobs:
+        if job.schedule_key not in computed:
+            computed[job.schedule_key] = job.next_slot_time(after)
+        fire_times.append((job, computed[job.schedule_key]))
+    return fire_times
+
+
+def due_slots(jobs, now):
+    # (job, slot key or None) for every job, like next_fire_times
+    computed = {}
+    slots = []
+    for job in jobs:
+        key = (job.schedule_key, job.window)
+        if key not in computed:
+            computed[key] = job.due_slot(now)
+        slots.append((job, computed[key]))
+    return slots
+
+
+class FanOutRunner:
+    def __init__(self, jobs, quip_client, transport, state_store, concurrency=8, force=False, outbox=None,
+                 batch_fetch=False, parse_processes=0, shards=None):
+        self.jobs = jobs
+        self.quip_client = quip_client
+        self.transport = transport
+        self.state_store = state_store
+        self.outbox = outbox or Outbox(':memory:')
+        self.concurrency = concurrency
+        self.force = force
+        # Fetch the docs of a tick through one bulk request per chunk of ids
+        # instead of one request each (no 304s, but fewer round trips)
+        self.batch_fetch = batch_fetch
+        # Kept across ticks so the per-webhook rate limits carry over
+        self.delivery = DeliveryQueue(transport)
+        self.executor = ThreadPoolExecutor(max_workers=max(concurrency, 4) * 2)
+        # Extraction runs here when set, and in self.executor otherwise
+        self.parse_pool = ProcessPoolExecutor(max_workers=parse_processes) if parse_processes else None
+        # ShardLedger when this runner is one of several workers
+        self.shards = shards
+        # doc id -> (perf_counter at fetch, html); only reused for warm_max_age
+        # seconds, which is 0 unless a scheduler pre-warms the docs
+        self.warm_html = {}
+        self.warm_max_age = 0.0
+        # (doc id, extractor) -> (html digest, extracted), and (doc id,
+        # extractor, formatter) -> (html digest, {render key: message}); both
+        # are reused across ticks for as long as the doc's HTML is unchanged
+        self.extracted = {}
+        self.rendered = {}
+        self.render_stats = {'rendered': 0, 'shared': 0}
+
+    def due_jobs(self, now):
+        due = []
+        for job, slot in due_slots(self.jobs, now):
+            if slot is None and self.force:
+                slot = job.context(now).forced_slot
+            if slot is None:
+                continue
+            if not self.force and self.state_store.was_sent(job.job_id, slot):
+                logger.info("[%s] Already sent for %s. Skipping.", job.job_id, slot)
+                continue
+            if not self.force and self.outbox.has(job.job_id, slot):
+                # Rendered by an earlier tick; the outbox retries the post
+                continue
+            due.append((job, slot))
+        return due
+
+    async def _in_executor(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def _is_warm(self, doc_id):
+        warm = self.warm_html.get(doc_id)
+        return warm is not None and perf_counter() - warm[0] < self.warm_max_age
+
+    async def _fetch_batch(self, doc_ids, timings):
+        started = perf_counter()
+        threads, failed = await self._in_executor(self.quip_client.get_threads, doc_ids)
+        elapsed = perf_counter() - started
+        for doc_id, thread in threads.items():
+            timings[doc_id] = elapsed
+            self.warm_html[doc_id] = (perf_counter(), thread['html'])
+        return threads, failed
+
+    async def _fetch_from_batch(self, doc_id, batch_future, semaphore, timings):
+        threads, failed = await batch_future
+        if doc_id in threads:
+            return threads[doc_id]['html']
+        # Docs the bulk request didn't return are fetched on their own
+        logger.warning("Bulk fetch of %s failed (%s), fetching it alone", doc_id, failed.get(doc_id))
+        return await self._fetch(doc_id, semaphore, timings)
+
+    async def _fetch(self, doc_id, semaphore, timings):
+        if self._is_warm(doc_id):
+            timings[doc_id] = 0.0
+            return self.warm_html[doc_id][1]
+        async with semaphore:
+            started = perf_counter()
+            thread = await self._in_executor(self.quip_client.get_thread, doc_id)
+            timings[doc_id] = perf_counter() - started
+            self.warm_html[doc_id] = (perf_counter(), thread['html'])
+            return thread['html']
+
+    async def _extract(self, fetch_future, doc_id, extractor):
+        html = await fetch_future
+        digest = section_hash(html)
+        cached = self.extracted.get((doc_id, extractor))
+        if cached is not None and cached[0] == digest:
+            return cached
+        if self.parse_pool is not None:
+            loop = asyncio.get_running_loop()
+            extracted = await loop.run_in_executor(self.parse_pool, run_extractor, extractor, html)
+        else:
+            extracted = await self._in_executor(resolve_callable(extractor, EXTRACTORS), html)
+        self.extracted[(doc_id, extractor)] = (digest, extracted)
+        return digest, extracted
+
+    async def _render_job(self, job, extract_future, now):
+        digest, extracted = await extract_future
+        local_now = job.local_now(now)
+        key = RENDER_KEYS.get(job.formatter, render_key_minute)(local_now)
+        memo_key = (job.doc_id, job.extractor, job.formatter)
+        memo = self.rendered.get(memo_key)
+        if memo is None or memo[0] != digest:
+            memo = self.rendered[memo_key] = (digest, {})
+        if key in memo[1]:
+            self.render_stats['shared'] += 1
+        else:
+            memo[1][key] = resolve_callable(job.formatter, FORMATTERS)(extracted, local_now)
+            self.render_stats['rendered'] += 1
+            while len(memo[1]) > RENDER_MEMO_SIZE:
+                del memo[1][next(iter(memo[1]))]
+        return memo[1][key]
+
+    def owned_job_ids(self):
+        # None when unsharded, i.e. every job
+        if self.shards is None:
+            return None
+        return [job.job_id for job in self.jobs if self.shards.owns(job.job_id)]
+
+    def _claim(self, due):
+        # The (job, slot) pairs of this worker's shard that it could claim
+        if self.shards is None:
+            return due
+        self.shards.refresh()
+        claimed = []
+        for job, slot in due:
+            if not self.shards.owns(job.job_id):
+                continue
+            if not self.shards.claim(job.job_id, slot):
+                logger.info("[%s] %s is claimed by another worker. Skipping.", job.job_id, slot)
+                continue
+            claimed.append((job, slot))
+        return claimed
+
+    def refresh_shards(self):
+        # True if this worker's share of the jobs may have changed
+        return self.shards is not None and self.shards.refresh()
+
+    def close(self):
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+        self.executor.shutdown()
+
+    async def tick(self, now=None):
+        now = now or utc_now()
+        due = self.due_jobs(now)
+        if not due:
+            logger.info("No jobs due at %s", now.isoformat())
+            if self.shards is not None:
+                self.shards.refresh()
+            if self.outbox.has_pending(self.owned_job_ids()):
+                await self.deliver(now)
+            return {}
+        return await self.run_due(due, now)
+
+    async def deliver(self, now):
+        # Post everything pending in the outbox, including rows left over
+        # from earlier ticks, and record the slots that are now complete
+        delivered = await self._in_executor(deliver_pending, self.outbox, self.delivery, self.owned_job_ids())
+        record_sent(self.outbox, self.state_store, delivered, now)
+        return delivered
+
+    async def prewarm(self, doc_ids):
+        # Fetch docs ahead of their send time; _fetch reuses the HTML while
+        # it is younger than max_age
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timings = {}
+        doc_ids = list(dict.fromkeys(doc_ids))
+        fetches = self._start_fetches(doc_ids, semaphore, timings)
+        results = await asyncio.gather(*(fetches[doc_id] for doc_id in doc_ids), return_exceptions=True)
+        for doc_id, result in zip(doc_ids, results):
+            if isinstance(result, Exception):
+                logger.error("Pre-warm of %s failed: %s", doc_id, result)
+        return timings
+
+    def _start_fetches(self, doc_ids, semaphore, timings):
+        # doc id -> future of its HTML; with batch_fetch, the docs that
+        # aren't pre-warmed share bulk requests
+        cold = [doc_id for doc_id in doc_ids if not self._is_warm(doc_id)]
+        batch = None
+        if self.batch_fetch and len(cold) > 1:
+            batch = asyncio.ensure_future(self._fetch_batch(cold, timings))
+        batched = set(cold) if batch else set()
+        return {
+            doc_id: asyncio.ensure_future(
+                self._fetch_from_batch(doc_id, batch, semaphore, timings) if doc_id in batched
+                else self._fetch(doc_id, semaphore, timings))
+            for doc_id in doc_ids
+        }
+
+    async def run_due(self, due, now):
+        due = self._claim(due)
+        if not due:
+            if self.outbox.has_pending(self.owned_job_ids()):
+                await self.deliver(now)
+            return {}
+        run = RunRecord('tick')
+        started = perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        fetch_timings = {}
+        # One fetch per distinct doc and one extract per (doc, extractor),
+        # however many jobs share them
+        fetches = self._start_fetches(list(dict.fromkeys(job.doc_id for job, _ in due)),
+                                      semaphore, fetch_timings)
+        extracts = {}
+        for job, _ in due:
+            key = (job.doc_id, job.extractor)
+            if key not in extracts:
+                extracts[key] = asyncio.ensure_future(
+                    self._extract(fetches[job.doc_id], job.doc_id, job.extractor))
+
+        messages = await asyncio.gather(
+            *(self._render_job(job, extracts[(job.doc_id, job.extractor)], now) for job, _ in due),
+            return_exceptions=True)
+
+        # Everything rendered is stored as pending first, then all webhooks
+        # are flushed at once
+        self.outbox.add((job.job_id, slot, url, message)
+                        for (job, slot), message in zip(due, messages)
+                        if not isinstance(message, Exception)
+                        for url in job.webhooks)
+        post_started = perf_counter()
+        delivered = await self.deliver(now)
+        run.add_stage('post', perf_counter() - post_started)
+        run.set(deliveries=len(delivered))
+
+        outcome = {}
+        for (job, slot), message in zip(due, messages):
+            if isinstance(message, Exception):
+                logger.error("[%s] Error occurred: %s", job.job_id, message)
+                outcome[job.job_id] = False
+            else:
+                result = bool(job.webhooks) and self.outbox.is_done(job.job_id, slot)
+                outcome[job.job_id] = result
+                if result:
+                    logger.info("[%s] Reminder sent successfully for %s", job.job_id, slot)
+                    if self.shards is not None:
+                        self.shards.finish(job.job_id, slot)
+                else:
+                    logger.error("[%s] Failed to send reminder for %s", job.job_id, slot)
+
+        elapsed = perf_counter() - started
+        slowest = max(fetch_timings.values()) if fetch_timings else 0.0
+        logger.info("Tick: %d jobs, %d docs fetched, %.1f ms total, slowest fetch %.1f ms, "
+                    "sum of fetches %.1f ms", len(due), len(fetches), elapsed * 1000,
+                    slowest * 1000, sum(fetch_timings.values()) * 1000)
+        run.add_stage('fetch', sum(fetch_timings.values()))
+        run.set(jobs=len(due), docs_fetched=len(fetches), render_stats=dict(self.render_stats),
+                sent=sum(1 for ok in outcome.values() if ok),
+                slowest_fetch_ms=round(slowest * 1000, 3))
+        run.emit('sent' if all(outcome.values()) else 'failed')
+        return outcome
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send Quip-driven reminders for many jobs at once')
+    parser.add_argument('jobs', help='path to the JSON job list')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('RUNNER_CONCURRENCY', 8)))
+    parser.add_argument('--state', default=None, help='state store path (default from STATE_PATH)')
+    parser.add_argument('--force', action='store_true',
+                        default=os.environ.get('FORCE_SEND', 'false').lower() == 'true')
+    parser.add_argument('--batch-fetch', action='store_true',
+                        default=os.environ.get('QUIP_BATCH_FETCH', 'false').lower() == 'true',
+                        help='fetch the due docs with bulk /threads/?ids= requests')
+    parser.add_argument('--parse-processes', type=process_count,
+                        default=process_count(os.environ.get('PARSE_PROCESSES', '0')),
+                        help="extract in this many processes ('auto' for one per core, 0 for threads)")
+    parser.add_argument('--worker-id', default=os.environ.get('WORKER_ID'),
+                        help='run as this shard worker, sending only its share of the jobs')
+    parser.add_argument('--ledger', default=None, help='shard ledger path (default from SHARD_LEDGER_PATH)')
+    parser.add_argument('--shard', default=os.environ.get('SHARD'),
+                        help='send only static shard i/N of the jobs (no shared ledger needed)')
+    args = parser.parse_args(argv)
+    try:
+        shards = open_shards(args.worker_id, args.ledger, args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    transport = HttpTransport(pool_maxsize=max(args.concurrency, 10))
+    quip_cache = QuipThreadCache()
+    quip_client = SimpleQuipClient(os.environ.get('QUIP_API_TOKEN', ''), cache=quip_cache, transport=transport)
+    with open_state_store(args.state) as state_store, open_outbox() as outbox:
+        runner = FanOutRunner(load_jobs(args.jobs), quip_client, transport, state_store,
+                              concurrency=args.concurrency, force=args.force, outbox=outbox,
+                              batch_fetch=args.batch_fetch, parse_processes=args.parse_processes,
+                              shards=shards)
+        try:
+            outcome = asyncio.run(runner.tick())
+        finally:
+            runner.close()
+            if shards is not None:
+                shards.close()
+        runner.delivery.log_report()
+    quip_cache.save_stats()
+    transport.log_metrics()
+    return 0 if all(outcome.values()) else 1
+
+
+if __name__ == "__main__":
+    configure_logging()
+    with profiled():
+        status = main()
+    sys.exit(status)
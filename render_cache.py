@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+
+# Rendered Chime messages for a whole week, per document revision. When a
+# new revision is seen, the script renders every (day, slot) message at
+# once and stores them here; until the doc changes again a scheduled send
+# is a dictionary lookup plus the HTTP post. Entries live in a small
+# in-memory LRU in front of one JSON file per document.
+#
+#   python render_cache.py preview DOC_ID   # print the cached week
+
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+DEFAULT_MAX_ENTRIES = 32
+
+
+def render_key(day, slot):
+    return f"{day}|{slot}"
+
+
+class RenderCache:
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir or os.environ.get('RENDER_CACHE_DIR', '.render_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_entries = max_entries
+        self.memory = OrderedDict()  # (doc_id, revision) -> renders
+        self.stats = {'hits': 0, 'misses': 0, 'renders': 0}
+
+    def _path(self, doc_id):
+        safe_id = ''.join(c for c in str(doc_id) if c.isalnum() or c in '-_')
+        return os.path.join(self.cache_dir, f"{safe_id}.json")
+
+    def _remember(self, key, renders):
+        self.memory[key] = renders
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def load(self, doc_id):
+        try:
+            with open(self._path(doc_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_week(self, doc_id, revision):
+        key = (doc_id, revision)
+        if revision is not None and key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats['hits'] += 1
+            return self.memory[key]
+        entry = self.load(doc_id) if revision is not None else None
+        if entry is None or entry.get('revision') != revision:
+            self.stats['misses'] += 1
+            return None
+        self._remember(key, entry['renders'])
+        self.stats['hits'] += 1
+        return entry['renders']
+
+    def put_week(self, doc_id, revision, renders):
+        self.stats['renders'] += len(renders)
+        if revision is None:
+            return
+        self._remember((doc_id, revision), renders)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'doc_id': doc_id, 'revision': revision, 'renders': renders}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(doc_id))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def preview_week(cache, doc_id):
+    entry = cache.load(doc_id)
+    if entry is None:
+        print(f"No cached renders for {doc_id}")
+        return 1
+    print(f"Cached renders for {doc_id} (revision {entry['revision']})")
+    for key, message in sorted(entry['renders'].items(),
+                               key=lambda item: (DAYS.index(item[0].split('|')[0]), item[0])):
+        day, slot = key.split('|')
+        print(f"\n===== {day} / {slot} =====")
+        print(message)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect the rendered message cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    preview = subparsers.add_parser('preview', help='print every cached render for a document')
+    preview.add_argument('doc_id')
+    args = parser.parse_args(argv)
+    return preview_week(RenderCache(), args.doc_id)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+from reminder_log import configure_logging, profiled
+
+# Record/replay of the HTTP traffic under the scripts, so parser and
+# formatter changes can be checked offline. --record saves every Quip
+# response to DIR/responses.json, keyed by method and path. The values of
+# the script's secret environment variables (token, doc id, webhook URL)
+# are replaced by {NAME} placeholders and no request headers are kept.
+# --replay serves the Quip calls from those fixtures. --dry-run captures
+# the Chime posts and prints them instead of sending. A dry run keeps the
+# ledger, outbox and caches in a temporary directory, and --at sets the
+# time the run sees.
+#
+#   python chime_reminder_1.py --record fixtures/roster --dry-run
+#   python chime_reminder_1.py --dry-run --replay fixtures/roster --at "2024-01-08 05:10"
+#   python replay.py golden fixtures/roster chime_reminder_1 [--update]
+#
+# `golden` runs the script for every hour of a week against the fixtures
+# and compares what it would post with DIR/golden/<script>.json.
+
+RESPONSES_FILE = 'responses.json'
+GOLDEN_DIR = 'golden'
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+# A Sunday; golden runs cover this week unless told otherwise
+DEFAULT_GOLDEN_WEEK = '2024-01-07'
+
+logger = logging.getLogger(__name__)
+
+
+def placeholder(name):
+    return '{' + name + '}'
+
+
+def scrub(text, secrets):
+    # Longest first, so a secret containing another is replaced whole
+    for value, name in sorted(secrets.items(), key=lambda item: -len(item[0])):
+        text = text.replace(value, placeholder(name))
+    return text
+
+
+def fixture_key(method, url):
+    # Host-independent, so fixtures recorded against one base URL replay
+    # under any other
+    parts = urlparse(url)
+    return f"{method} {parts.path}{'?' + parts.query if parts.query else ''}"
+
+
+def load_fixtures(directory):
+    path = os.path.join(directory, RESPONSES_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class FixtureResponse:
+    def __init__(self, status_code, headers=None, text=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+        self.retries = 0
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} from recorded fixture", response=self)
+
+
+class RecordingTransport:
+    # Passes requests through and saves each GET response, scrubbed
+    def __init__(self, transport, directory, secrets):
+        self.transport = transport
+        self.directory = directory
+        self.secrets = {value: name for name, value in secrets.items() if value}
+        self.fixtures = load_fixtures(directory)
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, url, **kwargs):
+        # Always fetch the full body; a 304 would be useless to replay
+        headers = {key: value for key, value in kwargs.pop('headers', {}).items()
+                   if key not in CONDITIONAL_HEADERS}
+        response = self.transport.get(url, headers=headers, **kwargs)
+        self.fixtures[fixture_key('GET', scrub(url, self.secrets))] = {
+            'status': response.status_code,
+            'headers': {key: scrub(response.headers[key], self.secrets)
+                        for key in KEPT_HEADERS if key in response.headers},
+            'body': scrub(response.text, self.secrets),
+        }
+        path = os.path.join(self.directory, RESPONSES_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.fixtures, indent=1, sort_keys=True))
+        os.replace(path + '.tmp', path)
+        logger.info("Recorded %s", fixture_key('GET', scrub(url, self.secrets)))
+        return response
+
+    def post(self, url, **kwargs):
+        return self.transport.post(url, **kwargs)
+
+    def log_metrics(self):
+        self.transport.log_metrics()
+
+
+class DryRunTransport:
+    # Captures posts instead of sending them; GETs are served from the
+    # fixtures, or by the live transport when there are none
+    def __init__(self, transport=None, fixtures=None):
+        self.transport = transport
+        self.fixtures = fixtures
+        self.posts = []
+
+    def get(self, url, **kwargs):
+        if self.fixtures is None:
+            return self.transport.get(url, **kwargs)
+        fixture = self.fixtures.get(fixture_key('GET', url))
+        if fixture is None:
+            logger.error("No recorded response for GET %s", url)
+            return FixtureResponse(404, text='{"error": "not recorded"}')
+        return FixtureResponse(fixture['status'], fixture['headers'], fixture['body'])
+
+    def post(self, url, json=None, **kwargs):
+        self.posts.append((url, json))
+        return FixtureResponse(200, text='{"ok": true}')
+
+    def log_metrics(self):
+        if self.transport is not None:
+            self.transport.log_metrics()
+        logger.info("Dry run: captured %d posts", len(self.posts))
+
+
+def parse_at(value, tz_name):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M').replace(tzinfo=ZoneInfo(tz_name))
+
+
+@contextmanager
+def dry_run_environment(module, fixtures=None):
+    # Installs a capturing transport and a throwaway state directory (and,
+    # with fixtures, the placeholder settings they were scrubbed to); yields
+    # the transport so the caller can read the captured posts
+    import http_session
+    names = {'STATE_PATH': 'state.db', 'OUTBOX_PATH': 'outbox.db',
+             'QUIP_CACHE_DIR': 'quip_cache', 'RENDER_CACHE_DIR': 'render_cache'}
+    saved_env = dict(os.environ)
+    saved_attrs = {name: getattr(module, name) for name in module.REQUIRED_ENV}
+    previous = http_session._transport
+    with tempfile.TemporaryDirectory() as state_dir:
+        try:
+            os.environ.pop('STATE_BACKEND', None)
+            for name, path in names.items():
+                os.environ[name] = os.path.join(state_dir, path)
+            # Captured posts are instant, so don't throttle them
+            os.environ['CHIME_RATE_PER_SECOND'] = '1000'
+            if fixtures is not None:
+                for name in module.REQUIRED_ENV:
+                    os.environ[name] = placeholder(name)
+                    setattr(module, name, placeholder(name))
+            transport = DryRunTransport(None if fixtures is not None else http_session.get_transport(), fixtures)
+            http_session.set_transport(transport)
+            yield transport
+        finally:
+            http_session.set_transport(previous)
+            for name, value in saved_attrs.items():
+                setattr(module, name, value)
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+
+def print_posts(posts):
+    from chime_delivery import webhook_label
+    for url, payload in posts:
+        # Replayed runs post to the {NAME} placeholder, which is no secret
+        print(f"===== {url if url.startswith('{') else webhook_label(url)} =====")
+        print(payload.get('Content', '') if payload else '')
+
+
+def run_cli(module, argv):
+    # Command line of the reminder scripts
+    parser = argparse.ArgumentParser(description='Send the reminder, or rehearse it offline')
+    parser.add_argument('--dry-run', action='store_true', help='print the messages instead of posting them')
+    parser.add_argument('--replay', metavar='DIR', help='serve Quip responses from recorded fixtures')
+    parser.add_argument('--record', metavar='DIR', help='save the Quip responses as fixtures')
+    parser.add_argument('--at', help=f'pretend it is this time ("YYYY-MM-DD HH:MM", {module.PACIFIC_TZ})')
+    args = parser.parse_args(argv)
+    if args.replay and not args.dry_run:
+        parser.error('--replay only works with --dry-run')
+    if args.replay and args.record:
+        parser.error('--replay and --record are exclusive')
+    if args.at and not args.dry_run:
+        parser.error('--at only works with --dry-run')
+
+    if args.record:
+        import http_session
+        secrets = {name: os.environ.get(name, '') for name in module.REQUIRED_ENV}
+        http_session.set_transport(RecordingTransport(http_session.get_transport(), args.record, secrets))
+    if not args.dry_run:
+        with profiled():
+            module.send_reminder()
+        return 0
+
+    fixtures = load_fixtures(args.replay) if args.replay else None
+    if args.replay and not fixtures:
+        parser.error(f"No fixtures in {args.replay}")
+    at = parse_at(args.at, module.PACIFIC_TZ) if args.at else None
+    with dry_run_environment(module, fixtures) as transport:
+        with profiled():
+            module.send_reminder(module.run_context(at))
+    print_posts(transport.posts)
+    return 0
+
+
+def run_golden(directory, script, week_of=DEFAULT_GOLDEN_WEEK, update=False):
+    import importlib
+    module = importlib.import_module(script)
+    fixtures = load_fixtures(directory)
+    if not fixtures:
+        print(f"No fixtures in {directory}")
+        return 1
+    start = parse_at(f"{week_of} 00:00", module.PACIFIC_TZ)
+    os.environ.pop('FORCE_SEND', None)
+    # A due send prints its message; quiet runs are recorded as no posts
+    results = {}
+    for hour in range(7 * 24):
+        at = start + timedelta(hours=hour, minutes=10)
+        with dry_run_environment(module, fixtures) as transport:
+            module.send_reminder(module.run_context(at))
+        if transport.posts:
+            results[at.strftime('%A %H:%M')] = [payload.get('Content', '') for _, payload in transport.posts]
+
+    path = os.path.join(directory, GOLDEN_DIR, f"{script}.json")
+    if update:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1, ensure_ascii=False, sort_keys=True)
+        print(f"Wrote {len(results)} golden messages to {path}")
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+    except FileNotFoundError:
+        print(f"No golden file at {path}; run with --update first")
+        return 1
+    failed = sorted(set(expected) | set(results), key=lambda key: (key not in results, key))
+    failed = [key for key in failed if expected.get(key) != results.get(key)]
+    for key in failed:
+        print(f"===== {key}: differs =====")
+        print('\n'.join(expected.get(key, ['(nothing expected)'])))
+        print('----- got -----')
+        print('\n'.join(results.get(key, ['(nothing sent)'])))
+    print(f"{len(results)} runs with posts, {len(failed)} differing from {path}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded fixtures through the reminder scripts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    golden = subparsers.add_parser('golden', help="check a script's messages for a whole week")
+    golden.add_argument('directory')
+    golden.add_argument('script', help='chime_reminder or chime_reminder_1')
+    golden.add_argument('--week-of', default=DEFAULT_GOLDEN_WEEK, help='Sunday the week starts on')
+    golden.add_argument('--update', action='store_true', help='rewrite the golden file')
+    args = parser.parse_args(argv)
+    configure_logging('WARNING')
+    return run_golden(args.directory, args.script, args.week_of, args.update)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
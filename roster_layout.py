@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+# Layout of the follow-up roster doc, read from roster_layout.json (or the
+# file named by ROSTER_LAYOUT_PATH) instead of being hard-coded:
+#
+#   days                   day name -> extra header labels ("Mon", ...);
+#                          a row with at least day_header_min_labels of them
+#                          is a day header and gives the day columns
+#   sweeps                 sweep -> label text; a row carrying a label starts
+#                          that sweep's rows in the roster table, a heading
+#                          carrying one precedes its distribution table
+#   roles, default_role    role -> tags marking it in a cell
+#   empty_cells            cell text that counts as empty in the specialist
+#                          list; the distribution counts every non-blank
+#                          <td> cell, placeholders included, as it always has
+#   tasks                  task table columns (field -> header labels); a
+#                          table whose header row has a status column and a
+#                          sweep or day column is a task table. Rows whose
+#                          status is one of pending_statuses are pending;
+#                          pending_fallback is shown when there is no task
+#                          table or export (see roster_tasks.py)
+#
+# The sweep names are the ones get_sweep_period returns. The layout is
+# compiled once into a few lookups and regexes, so reading a table is a
+# single pass over its rows whatever its size.
+
+DEFAULT_LAYOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roster_layout.json')
+# Part of the layout digest, so indexes and renders cached by an older
+# version of the table reading are dropped; bump it when that changes
+READER_VERSION = 2
+# Fields of a task row, in the order task_rows returns them
+TASK_FIELDS = ('status', 'sweep', 'day', 'assignee')
+# A value that applies to every sweep or day
+ANY = '*'
+
+
+def _alternation(groups):
+    # One capture group per key; match.lastindex says which key matched
+    return re.compile('|'.join(
+        '(' + '|'.join(re.escape(label) for label in labels) + ')' for labels in groups), re.IGNORECASE)
+
+
+class RosterLayout:
+    def __init__(self, config):
+        for key in ('days', 'sweeps', 'roles', 'default_role'):
+            if key not in config:
+                raise ValueError(f"Roster layout is missing '{key}'")
+        self.digest = hashlib.blake2b(json.dumps([READER_VERSION, config], sort_keys=True).encode('utf-8'),
+                                      digest_size=6).hexdigest()
+        self.days = list(config['days'])
+        self.day_labels = {
+            label.strip().lower(): day
+            for day, labels in config['days'].items()
+            for label in [day] + list(labels)
+        }
+        self.min_day_labels = config.get('day_header_min_labels', 3)
+        self.sweeps = list(config['sweeps'])
+        self.sweep_re = _alternation(config['sweeps'].values())
+        self.roles = list(config['roles']) + [config['default_role']]
+        self.role_re = _alternation(config['roles'].values())
+        self.empty_cells = {''} | set(config.get('empty_cells', []))
+        tasks = config.get('tasks', {})
+        self.task_labels = {
+            label.strip().lower(): field
+            for field, labels in tasks.get('columns', {}).items()
+            for label in labels
+        }
+        self.pending_statuses = {status.lower() for status in tasks.get('pending_statuses', [])}
+        self.pending_fallback = tasks.get('pending_fallback', '')
+
+    def sweep_in(self, text):
+        match = self.sweep_re.search(text)
+        return self.sweeps[match.lastindex - 1] if match else None
+
+    def role_of(self, text):
+        match = self.role_re.search(text)
+        return self.roles[match.lastindex - 1] if match else self.roles[-1]
+
+    def day_columns(self, cells):
+        # {day: column} if the row is a day header, otherwise None
+        columns = {}
+        for position, text in enumerate(cells):
+            day = self.day_labels.get(text.lower())
+            if day is not None and day not in columns:
+                columns[day] = position
+        return columns if len(columns) >= self.min_day_labels else None
+
+    def _row_sweep(self, cells, columns):
+        # Sweep labels sit outside the day columns
+        positions = set(columns.values()) if columns else ()
+        for position, text in enumerate(cells):
+            if position not in positions and text:
+                sweep = self.sweep_in(text)
+                if sweep is not None:
+                    return sweep
+        return None
+
+    def sweep_named(self, text):
+        # A sweep given by name ("morning") or label ("Morning Sweep")
+        name = text.strip().lower()
+        return name if name in self.sweeps else self.sweep_in(text)
+
+    def task_columns(self, cells):
+        # {field: column} if the row is a task table header, otherwise None
+        columns = {}
+        for position, text in enumerate(cells):
+            field = self.task_labels.get(text.strip().lower())
+            if field is not None and field not in columns:
+                columns[field] = position
+        if 'status' in columns and ('sweep' in columns or 'day' in columns):
+            return columns
+        return None
+
+    def task_rows(self, grid):
+        # (status, sweep, day, assignee) of every row under the header
+        columns = self.task_columns(grid[0]) if grid else None
+        if columns is None:
+            return []
+        positions = [columns.get(field) for field in TASK_FIELDS]
+        return [tuple(cells[position] if position is not None and position < len(cells) else ''
+                      for position in positions)
+                for cells in grid[1:]]
+
+    def task_record(self, record):
+        # The same tuple for a row of a CSV or JSON export
+        fields = {}
+        for key, value in record.items():
+            field = self.task_labels.get(str(key).strip().lower())
+            if field is not None and field not in fields:
+                fields[field] = '' if value is None else str(value).strip()
+        return tuple(fields.get(field, '') for field in TASK_FIELDS)
+
+    def classify_task(self, row):
+        # (sweep, day, role, pending); a task without a known sweep or day
+        # counts for all of them
+        status, sweep, day, assignee = row
+        return (self.sweep_named(sweep) or ANY,
+                self.day_labels.get(day.strip().lower(), ANY),
+                self.role_of(assignee),
+                status.strip().lower() in self.pending_statuses)
+
+    def is_roster(self, grid):
+        return any(self._row_sweep(cells, None) for cells in grid)
+
+    def read_roster(self, grid):
+        # Specialists per sweep and day, tagged roles first; the day columns
+        # come from the last day header above each row
+        columns = None
+        sweep = None
+        specialists = {}
+        for cells in grid:
+            header = self.day_columns(cells)
+            if header is not None:
+                columns = header
+                continue
+            label = self._row_sweep(cells, columns)
+            if label is not None:
+                sweep = label
+                specialists.setdefault(sweep, {day: [] for day in self.days})
+                continue
+            if sweep is None or columns is None:
+                continue
+            for day, position in columns.items():
+                if position < len(cells) and cells[position] not in self.empty_cells:
+                    names = specialists[sweep][day]
+                    if self.role_of(cells[position]) != self.roles[-1]:
+                        names.insert(0, cells[position])
+                    else:
+                        names.append(cells[position])
+        return columns, specialists
+
+    def count_roles(self, grid, columns=None, header_cells=None):
+        # Role counts per day; the first row is the table's header, and a
+        # table without day labels of its own uses the given columns. Only
+        # <td> cells are counted (header_cells lists each row's <th>
+        # positions) and, unlike the specialist list, any non-blank cell
+        # counts, so the numbers match the fixed-column reader this replaced
+        counts = {day: {role: 0 for role in self.roles} for day in self.days}
+        for row_index, cells in enumerate(grid):
+            header = self.day_columns(cells)
+            if header is not None:
+                columns = header
+                continue
+            if row_index == 0 or columns is None:
+                continue
+            skipped = header_cells[row_index] if header_cells else None
+            if skipped:
+                cells = [text for position, text in enumerate(cells) if position not in skipped]
+            for day, position in columns.items():
+                if position < len(cells) and cells[position]:
+                    counts[day][self.role_of(cells[position])] += 1
+        return counts
+
+
+@lru_cache(maxsize=None)
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return RosterLayout(json.load(f))
+
+
+def load_layout(path=None):
+    return _load(path or os.environ.get('ROSTER_LAYOUT_PATH') or DEFAULT_LAYOUT_PATH)
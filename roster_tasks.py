@@ -0,0 +1,104 @@
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+
+from roster_layout import ANY
+
+# Live "Tasks pending" count and role distribution for the roster reminder,
+# from the task tables in the roster doc or from a CSV/JSON export named by
+# ROSTER_TASKS_PATH (columns as in roster_layout.json's "tasks").
+#
+# A TaskIndex keeps how many rows of each distinct (status, sweep, day,
+# assignee) it has seen, and pending-task counters per sweep and day:
+#
+#   {"version": 1,
+#    "rows": {"Open\x1fmorning\x1fMon\x1fBob": 3, ...},
+#    "counts": {"morning|Monday": {"pending": 3, "Captain": 0, "Regular": 3}, ...}}
+#
+# On a new revision only the rows that were added or removed are classified
+# and added to or taken off the counters, and a send looks up its sweep and
+# day in a handful of dict reads, however long the task table is.
+
+TASK_INDEX_VERSION = 1
+SEPARATOR = '\x1f'
+
+
+def counts_key(sweep, day):
+    return f"{sweep}|{day}"
+
+
+class TaskIndex:
+    def __init__(self, state=None):
+        if not state or state.get('version') != TASK_INDEX_VERSION:
+            state = {'rows': {}, 'counts': {}}
+        self.rows = state['rows']
+        self.counts = state['counts']
+
+    def to_json(self):
+        return {'version': TASK_INDEX_VERSION, 'rows': self.rows, 'counts': self.counts}
+
+    def _add(self, row, delta, layout):
+        sweep, day, role, pending = layout.classify_task(row.split(SEPARATOR))
+        if not pending:
+            return
+        counts = self.counts.setdefault(counts_key(sweep, day), dict.fromkeys(['pending'] + layout.roles, 0))
+        counts['pending'] += delta
+        counts[role] = counts.get(role, 0) + delta
+
+    def update(self, rows, layout):
+        # Bring the counters up to date with the current task rows; returns
+        # how many distinct rows changed
+        current = Counter(SEPARATOR.join(row) for row in rows)
+        changed = 0
+        for row, count in self.rows.items():
+            if current.get(row, 0) != count:
+                self._add(row, current.get(row, 0) - count, layout)
+                changed += 1
+        for row, count in current.items():
+            if row not in self.rows:
+                self._add(row, count, layout)
+                changed += 1
+        self.rows = dict(current)
+        self.counts = {key: counts for key, counts in self.counts.items() if counts['pending']}
+        return changed
+
+
+def task_counts(counts, sweep, day, roles):
+    # (pending, {role: count}) for a sweep and day, including the tasks
+    # that apply to any sweep or any day
+    pending = 0
+    distribution = dict.fromkeys(roles, 0)
+    for key in (counts_key(sweep, day), counts_key(sweep, ANY), counts_key(ANY, day), counts_key(ANY, ANY)):
+        found = counts.get(key)
+        if found:
+            pending += found['pending']
+            for role in roles:
+                distribution[role] += found.get(role, 0)
+    return pending, distribution
+
+
+def export_path():
+    return os.environ.get('ROSTER_TASKS_PATH') or None
+
+
+def export_digest(path):
+    # Changes whenever the export does, so messages rendered from an older
+    # export aren't reused
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+
+
+def read_export(path, layout):
+    # Task rows of a CSV file (header row first) or a JSON list of objects
+    # (or {"tasks": [...]})
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        if isinstance(records, dict):
+            records = records.get('tasks', [])
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            records = list(csv.DictReader(f))
+    return [layout.task_record(record) for record in records]
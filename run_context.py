@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# What a run derives from the clock - local time, weekday, the send slot
+# it falls in and (for the roster) the sweep - computed once when the run
+# starts and passed to every stage, so a run that crosses the hour or
+# midnight can't pick different days or sweeps in different stages. Tests
+# and dry runs build one for any time they like. The runner and scheduler
+# use the same windows and send times (send_time_on), so every entry point
+# agrees on DST.
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def send_time_on(day, hour, minute, tz_name):
+    # A send time on a local date. Times skipped by a DST jump fall after
+    # it (02:30 becomes 03:30); repeated ones are the first occurrence.
+    return datetime(day.year, day.month, day.day, hour, minute, tzinfo=ZoneInfo(tz_name))
+
+
+class RunContext:
+    def __init__(self, now, tz_name, send_times=(), window=timedelta(hours=1), sweep_of=None):
+        self.tz_name = tz_name
+        self.now = now.astimezone(ZoneInfo(tz_name))
+        self.day = self.now.strftime('%A')
+        self.sweep = sweep_of(self.now.hour) if sweep_of else None
+        # The send time whose window (starting at the send time) holds now;
+        # compared in UTC so a window across a DST change keeps its length
+        self.send_time = None
+        utc = now.astimezone(timezone.utc)
+        for hour, minute in send_times:
+            target = send_time_on(self.now, hour, minute, tz_name).astimezone(timezone.utc)
+            if target <= utc < target + window:
+                self.send_time = (hour, minute)
+                break
+
+    @property
+    def slot(self):
+        if self.send_time is None:
+            return None
+        hour, minute = self.send_time
+        return f"{self.now.strftime('%Y-%m-%d')} {hour:02d}:{minute:02d}"
+
+    @property
+    def forced_slot(self):
+        return f"{self.now.strftime('%Y-%m-%d %H:%M:%S')} (forced)"
@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import signal
+import sys
+import time
+from datetime import timedelta, timezone
+
+from http_session import HttpTransport
+from outbox import open_outbox
+from quip_cache import QuipThreadCache
+from quip_client import SimpleQuipClient
+from reminder_log import configure_logging
+from run_context import utc_now
+from sharding import open_shards
+from reminder_runner import FanOutRunner, load_jobs, next_fire_times, process_count
+from state_store import open_state_store
+
+# Resident alternative to the */15 cron polling: keeps a heap of upcoming
+# timer events (a pre-warm fetch a few minutes before each send time, then
+# the send itself), sleeps until the earliest one and fires it on the
+# minute. On start-up, and after the process was suspended past a send
+# time, slots missed by at most --max-catchup-minutes are sent late (and
+# rendered and recorded for their own send time); older ones are skipped.
+# The state store keeps this and any cron run from sending the same slot
+# twice.
+#
+#   python scheduler.py jobs.example.json --prewarm-minutes 3
+
+PREWARM = 'prewarm'
+SEND = 'send'
+MAX_SLEEP_SECONDS = 60  # wake up regularly so clock jumps are noticed
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    def __init__(self, jobs, runner, prewarm=timedelta(minutes=3),
+                 max_catchup=timedelta(minutes=30), clock=None, sleep=time.sleep):
+        self.jobs = jobs
+        self.runner = runner
+        self.prewarm_lead = prewarm
+        self.max_catchup = max_catchup
+        self.clock = clock or utc_now
+        self.sleep = sleep
+        self.queue = []
+        self.sequence = itertools.count()
+        self.stopped = False
+        # Pre-warmed HTML must survive until the send it was fetched for
+        self.runner.warm_max_age = (prewarm + timedelta(minutes=2)).total_seconds()
+
+    def _push(self, when, kind, job, slot_time):
+        heapq.heappush(self.queue, (when, next(self.sequence), kind, job, slot_time))
+
+    def schedule_next(self, jobs, after):
+        for job, slot_time in next_fire_times(jobs, after):
+            if slot_time is None:
+                continue
+            # The heap is ordered in UTC; slot_time keeps the local send time
+            # for the slot key
+            when = slot_time.astimezone(timezone.utc)
+            if when - self.prewarm_lead > self.clock():
+                self._push(when - self.prewarm_lead, PREWARM, job, slot_time)
+            self._push(when, SEND, job, slot_time)
+
+    def catch_up(self, now):
+        # Only the most recent missed slot per job is considered, and only if
+        # it is within max_catchup; anything older is dropped. Returns
+        # (slot time, job, slot) like send()
+        missed = []
+        for job in self.jobs:
+            slot_time = job.previous_slot_time(now)
+            if slot_time is None:
+                continue
+            slot = job.slot_key(slot_time)
+            if now - slot_time > self.max_catchup:
+                continue
+            if self.runner.state_store.was_sent(job.job_id, slot):
+                continue
+            logger.info("[%s] Catching up missed slot %s", job.job_id, slot)
+            missed.append((slot_time, job, slot))
+        return missed
+
+    def send(self, due):
+        # due: (slot time, job, slot). Each send time is run with its own
+        # time, however late, so it renders and records the slot's day
+        by_slot_time = {}
+        for slot_time, job, slot in due:
+            by_slot_time.setdefault(slot_time.astimezone(timezone.utc), []).append((job, slot))
+        for when in sorted(by_slot_time):
+            asyncio.run(self.runner.run_due(by_slot_time[when], when))
+        if by_slot_time:
+            self.report()
+
+    def report(self):
+        # Logged after every send, which also empties the per-request
+        # metrics and deliveries so they don't pile up in the daemon
+        self.runner.delivery.log_report()
+        self.runner.transport.log_metrics()
+
+    def start(self):
+        now = self.clock()
+        self.schedule_next(self.jobs, now)
+        self.send(self.catch_up(now))
+
+    def _pop_due(self, now):
+        # All events due now; a send also schedules the job's next slot
+        kind = self.queue[0][2]
+        fired = []
+        while self.queue and self.queue[0][0] <= now and self.queue[0][2] == kind:
+            when, _, kind, job, slot_time = heapq.heappop(self.queue)
+            fired.append((when, job, slot_time))
+        return kind, fired
+
+    def run_once(self):
+        # Sleep until the earliest event (at most MAX_SLEEP_SECONDS), then
+        # fire everything that is due. Returns False once stopped.
+        if not self.queue:
+            logger.info("No scheduled reminders left")
+            return False
+        now = self.clock()
+        # A sharded worker heartbeats while it waits; when a worker has
+        # left the ring, the slots it missed are caught up by their new owners
+        if self.runner.refresh_shards():
+            self.send(self.catch_up(now))
+        # A post that failed is retried on the next wake-up, not at the
+        # next send time, where it could be coalesced with that send
+        if self.runner.outbox.has_pending(self.runner.owned_job_ids()):
+            asyncio.run(self.runner.deliver(now))
+            self.report()
+        wait = (self.queue[0][0] - now).total_seconds()
+        if wait > 0:
+            self.sleep(min(wait, MAX_SLEEP_SECONDS))
+            return not self.stopped
+
+        kind, fired = self._pop_due(now)
+        if kind == PREWARM:
+            doc_ids = {job.doc_id for _, job, _ in fired}
+            logger.info("Pre-warming %d docs for %d upcoming sends", len(doc_ids), len(fired))
+            asyncio.run(self.runner.prewarm(doc_ids))
+            return not self.stopped
+
+        # Jobs that fired at the same send time are rescheduled together
+        by_slot_time = {}
+        for _, job, slot_time in fired:
+            by_slot_time.setdefault(slot_time, []).append(job)
+        for slot_time, jobs in by_slot_time.items():
+            self.schedule_next(jobs, slot_time)
+
+        due = []
+        for when, job, slot_time in fired:
+            late = now - when
+            if late > self.max_catchup:
+                logger.warning("[%s] Slot %s missed by %s, skipping", job.job_id, job.slot_key(slot_time), late)
+                continue
+            slot = job.slot_key(slot_time)
+            if self.runner.state_store.was_sent(job.job_id, slot):
+                logger.info("[%s] Already sent for %s. Skipping.", job.job_id, slot)
+                continue
+            due.append((slot_time, job, slot))
+        self.send(due)
+        return not self.stopped
+
+    def run_forever(self):
+        self.start()
+        while self.run_once():
+            pass
+
+    def stop(self, *_):
+        logger.info("Stopping scheduler")
+        self.stopped = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the reminder jobs as a resident scheduler')
+    parser.add_argument('jobs', help='path to the JSON job list')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('RUNNER_CONCURRENCY', 8)))
+    parser.add_argument('--state', default=None, help='state store path (default from STATE_PATH)')
+    parser.add_argument('--prewarm-minutes', type=float, default=3)
+    parser.add_argument('--max-catchup-minutes', type=float, default=30)
+    parser.add_argument('--batch-fetch', action='store_true',
+                        default=os.environ.get('QUIP_BATCH_FETCH', 'false').lower() == 'true',
+                        help='fetch the due docs with bulk /threads/?ids= requests')
+    parser.add_argument('--parse-processes', type=process_count,
+                        default=process_count(os.environ.get('PARSE_PROCESSES', '0')),
+                        help="extract in this many processes ('auto' for one per core, 0 for threads)")
+    parser.add_argument('--worker-id', default=os.environ.get('WORKER_ID'),
+                        help='run as this shard worker, sending only its share of the jobs')
+    parser.add_argument('--ledger', default=None, help='shard ledger path (default from SHARD_LEDGER_PATH)')
+    parser.add_argument('--shard', default=os.environ.get('SHARD'),
+                        help='send only static shard i/N of the jobs (no shared ledger needed)')
+    args = parser.parse_args(argv)
+    try:
+        shards = open_shards(args.worker_id, args.ledger, args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    transport = HttpTransport(pool_maxsize=max(args.concurrency, 10))
+    quip_cache = QuipThreadCache()
+    quip_client = SimpleQuipClient(os.environ.get('QUIP_API_TOKEN', ''), cache=quip_cache, transport=transport)
+    jobs = load_jobs(args.jobs)
+    with open_state_store(args.state) as state_store, open_outbox() as outbox:
+        runner = FanOutRunner(jobs, quip_client, transport, state_store, concurrency=args.concurrency,
+                              outbox=outbox, batch_fetch=args.batch_fetch,
+                              parse_processes=args.parse_processes, shards=shards)
+        scheduler = ReminderScheduler(jobs, runner,
+                                      prewarm=timedelta(minutes=args.prewarm_minutes),
+                                      max_catchup=timedelta(minutes=args.max_catchup_minutes))
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+        finally:
+            runner.close()
+            if shards is not None:
+                # The other workers take over this one's jobs right away
+                shards.leave()
+                shards.close()
+        runner.delivery.log_report()
+    quip_cache.save_stats()
+    transport.log_metrics()
+    return 0
+
+
+if __name__ == "__main__":
+    configure_logging()
+    sys.exit(main())
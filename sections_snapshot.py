@@ -0,0 +1,44 @@
+# Compact snapshot of the daily reminder's extracted sections. The
+# sections dict copies every general item into all seven weekday lists;
+# the snapshot stores each distinct text once and every list as indexes
+# into that table. Snapshots carry a format version, and one with another
+# version is ignored (the doc is just extracted again).
+#
+#   {"version": 1,
+#    "items": ["Be kind", "Ship it", ...],
+#    "sections": {"joke": {"Sunday": [0, 1], ...}, "metrics": [2], ...}}
+
+SNAPSHOT_VERSION = 1
+
+
+def pack_sections(sections):
+    index = {}
+    items = []
+
+    def ref(text):
+        if text not in index:
+            index[text] = len(items)
+            items.append(text)
+        return index[text]
+
+    packed = {}
+    for name, value in sections.items():
+        if isinstance(value, dict):
+            packed[name] = {day: [ref(text) for text in texts] for day, texts in value.items()}
+        else:
+            packed[name] = [ref(text) for text in value]
+    return {'version': SNAPSHOT_VERSION, 'items': items, 'sections': packed}
+
+
+def unpack_sections(snapshot):
+    # The sections dict, or None for a snapshot in another format
+    if not snapshot or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    items = snapshot['items']
+    sections = {}
+    for name, value in snapshot['sections'].items():
+        if isinstance(value, dict):
+            sections[name] = {day: [items[i] for i in refs] for day, refs in value.items()}
+        else:
+            sections[name] = [items[i] for i in value]
+    return sections
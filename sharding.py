@@ -0,0 +1,271 @@
+import bisect
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Splits one job catalog across parallel workers (several local processes,
+# or runners sharing a volume). Jobs are placed on a consistent-hash ring
+# of the live workers by job id, so a worker joining or leaving only moves
+# its own share of the jobs. Workers heartbeat into a SQLite ledger, and a
+# worker whose heartbeat is older than the TTL drops out of the ring: its
+# jobs move to the others on their next tick. Before rendering a (job,
+# slot) a worker claims it in the same ledger with a single upsert, so
+# while two workers briefly disagree about the ring only one of them sends.
+# A claim that isn't finished within the lease can be taken over, which
+# covers a worker dying mid-send.
+#
+#   SHARD_LEDGER_PATH  defaults to .reminder_state/shards.db
+#   SHARD_TTL_SECONDS  heartbeat age after which a worker counts as dead;
+#                      keep it above the interval between ticks (1200 for
+#                      the */15 cron, a few minutes for scheduler.py)
+#
+# A dead worker is only noticed once its heartbeat is older than the TTL,
+# so with cron workers its slots move on the first tick after that, which
+# is still in time for jobs whose window spans two ticks. The resident
+# scheduler re-checks the ring every minute and catches up on the slots
+# it inherited.
+#
+#   python reminder_runner.py jobs.json --worker-id a
+#   python sharding.py status [jobs.json]
+#
+# The ledger only works when the workers share it. Workers that share
+# nothing, such as the jobs of a CI matrix, would each see a ring of one
+# and all send every job; they take a static shard instead. `--shard i/N`
+# (or SHARD) owns the jobs whose id hashes to i modulo N, with no ledger,
+# heartbeat or claims. It doesn't rebalance: if one shard stops running,
+# its jobs aren't sent.
+#
+#   python reminder_runner.py jobs.json --shard 0/3
+
+DEFAULT_LEDGER_PATH = os.path.join('.reminder_state', 'shards.db')
+DEFAULT_TTL_SECONDS = 1200
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_REPLICAS = 64
+# Finished claims are kept this long, for `status`
+CLAIM_RETENTION_SECONDS = 7 * 24 * 3600
+
+CLAIMED = 'claimed'
+DONE = 'done'
+
+logger = logging.getLogger(__name__)
+
+
+def _point(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    def __init__(self, members, replicas=DEFAULT_REPLICAS):
+        self.members = sorted(set(members))
+        # Each member is placed at several points to even out the shares
+        points = sorted((_point(f"{member}#{index}"), member)
+                        for member in self.members for index in range(replicas))
+        self.points = [point for point, _ in points]
+        self.owners = [member for _, member in points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        return self.owners[bisect.bisect(self.points, _point(key)) % len(self.points)]
+
+
+def ledger_path(path=None):
+    return path or os.environ.get('SHARD_LEDGER_PATH', DEFAULT_LEDGER_PATH)
+
+
+class ShardLedger:
+    def __init__(self, worker_id, path=None, ttl_seconds=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 replicas=DEFAULT_REPLICAS, clock=time.time):
+        self.worker_id = worker_id
+        self.path = ledger_path(path)
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get('SHARD_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+        self.ttl = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.replicas = replicas
+        self.clock = clock
+        self.ring = HashRing([worker_id], replicas)
+        # The runner claims from the event loop and the scheduler heartbeats
+        # from its own loop; the lock serialises use of the connection
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS workers ('
+            ' worker_id TEXT PRIMARY KEY,'
+            ' heartbeat REAL NOT NULL)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS claims ('
+            ' job_id TEXT NOT NULL,'
+            ' slot TEXT NOT NULL,'
+            ' worker_id TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' lease_until REAL NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' PRIMARY KEY (job_id, slot))')
+
+    def heartbeat(self):
+        now = self.clock()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)',
+                              (self.worker_id, now))
+            self.conn.execute('DELETE FROM claims WHERE status = ? AND updated_at < ?',
+                              (DONE, now - CLAIM_RETENTION_SECONDS))
+
+    def workers(self):
+        # (worker id, heartbeat age in seconds), oldest heartbeat last
+        now = self.clock()
+        with self.lock:
+            rows = self.conn.execute('SELECT worker_id, heartbeat FROM workers ORDER BY heartbeat DESC').fetchall()
+        return [(worker_id, now - heartbeat) for worker_id, heartbeat in rows]
+
+    def live_workers(self):
+        return sorted(worker_id for worker_id, age in self.workers() if age <= self.ttl)
+
+    def refresh(self):
+        # Heartbeat and rebuild the ring from the live workers; True if the
+        # ring changed
+        self.heartbeat()
+        members = self.live_workers()
+        if members == self.ring.members:
+            return False
+        logger.info("Shard ring is now %s (was %s)", members, self.ring.members)
+        self.ring = HashRing(members, self.replicas)
+        return True
+
+    def owns(self, job_id):
+        return self.ring.owner(job_id) == self.worker_id
+
+    def claim(self, job_id, slot):
+        # True if this worker may send the slot: nobody claimed it yet, this
+        # worker already holds it, or the holder's lease ran out unfinished
+        now = self.clock()
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT INTO claims (job_id, slot, worker_id, status, lease_until, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (job_id, slot) DO UPDATE SET worker_id = excluded.worker_id,'
+                ' lease_until = excluded.lease_until, updated_at = excluded.updated_at'
+                ' WHERE claims.status = ? AND (claims.worker_id = excluded.worker_id'
+                ' OR claims.lease_until < excluded.updated_at)',
+                (job_id, slot, self.worker_id, CLAIMED, now + self.lease_seconds, now, CLAIMED))
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, slot):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE claims SET status = ?, updated_at = ? WHERE job_id = ? AND slot = ? AND worker_id = ?',
+                (DONE, self.clock(), job_id, slot, self.worker_id))
+
+    def claims(self, limit=50):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT job_id, slot, worker_id, status FROM claims ORDER BY updated_at DESC LIMIT ?',
+                (limit,)).fetchall()
+
+    def leave(self):
+        # On a clean shutdown the others take over at once instead of
+        # waiting for the TTL
+        with self.lock:
+            self.conn.execute('DELETE FROM workers WHERE worker_id = ?', (self.worker_id,))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StaticShard:
+    # Shard index of count, fixed for the run; the same interface as
+    # ShardLedger, minus the shared state
+    def __init__(self, index, count):
+        if not 0 <= index < count:
+            raise ValueError(f"Shard {index}/{count} is out of range; use 0/{count} to {count - 1}/{count}")
+        self.index = index
+        self.count = count
+        self.worker_id = f"{index}/{count}"
+
+    def owns(self, job_id):
+        return _point(job_id) % self.count == self.index
+
+    def refresh(self):
+        return False
+
+    def claim(self, job_id, slot):
+        # No other worker owns the job, so there is nothing to claim against
+        return True
+
+    def finish(self, job_id, slot):
+        pass
+
+    def leave(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def parse_shard(value):
+    # "i/N" -> StaticShard(i, N), with i counted from 0
+    index, _, count = value.partition('/')
+    if not (index.isdigit() and count.isdigit()):
+        raise ValueError(f"Shard '{value}' is not of the form i/N")
+    return StaticShard(int(index), int(count))
+
+
+def open_ledger(worker_id, path=None):
+    return ShardLedger(worker_id, path)
+
+
+def open_shards(worker_id=None, path=None, shard=None):
+    # The runner's shard: a static shard, a ledger worker, or None to send
+    # every job
+    if shard and worker_id:
+        raise ValueError("Use either a static shard or a worker id, not both")
+    if shard:
+        return parse_shard(shard)
+    if worker_id:
+        return open_ledger(worker_id, path)
+    return None
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Show the shard workers, job owners and recent claims')
+    parser.add_argument('--ledger', default=None, help='ledger path (default from SHARD_LEDGER_PATH)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    status = subparsers.add_parser('status', help='list workers and recent claims')
+    status.add_argument('jobs', nargs='?', help='job list, to show how many jobs each worker owns')
+    status.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with ShardLedger('status', args.ledger) as ledger:
+        live = set(ledger.live_workers())
+        ring = HashRing(live)
+        owned = {}
+        if args.jobs:
+            from reminder_runner import load_jobs
+            for job in load_jobs(args.jobs):
+                owned.setdefault(ring.owner(job.job_id), []).append(job.job_id)
+        for worker_id, age in ledger.workers():
+            state = 'live' if worker_id in live else 'dead'
+            jobs = f"  {len(owned.get(worker_id, []))} jobs" if args.jobs else ''
+            print(f"{worker_id:<24} {state:<5} heartbeat {age:8.0f}s ago{jobs}")
+        for job_id, slot, worker_id, claim_status in ledger.claims(args.limit):
+            print(f"{claim_status:<8} {job_id}|{slot}  {worker_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
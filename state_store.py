@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows; the JSON store then relies on atomic renames only
+    fcntl = None
+
+# Ledger of sent reminders, keyed by (job id, slot). A slot is the scheduled
+# send time the message belongs to, e.g. '2024-05-06 10:00'. claim() checks
+# and records a slot in one locked step, so two overlapping runs can't both
+# send the same slot and no update is lost.
+#
+#   STATE_BACKEND  sqlite (default) or json
+#   STATE_PATH     defaults to .reminder_state/state.db or state.json
+
+DEFAULT_STATE_DIR = '.reminder_state'
+JSON_MAX_SLOTS_PER_JOB = 1000
+
+
+def _timestamp(sent_at):
+    return (sent_at or datetime.now(timezone.utc)).isoformat()
+
+
+class StateStore(ABC):
+    @abstractmethod
+    def was_sent(self, job_id, slot):
+        pass
+
+    @abstractmethod
+    def mark_sent(self, job_id, slot, sent_at=None):
+        pass
+
+    @abstractmethod
+    def claim(self, job_id, slot, sent_at=None):
+        # Record the slot as sent; False if it already was
+        pass
+
+    @abstractmethod
+    def last_sent(self, job_id):
+        # (slot, sent_at) of the most recently recorded send, or None
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SQLiteStateStore(StateStore):
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Autocommit; every statement is its own transaction under SQLite's locks
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sent ('
+            ' job_id TEXT NOT NULL,'
+            ' slot TEXT NOT NULL,'
+            ' sent_at TEXT NOT NULL,'
+            ' PRIMARY KEY (job_id, slot))')
+
+    def was_sent(self, job_id, slot):
+        row = self.conn.execute(
+            'SELECT 1 FROM sent WHERE job_id = ? AND slot = ?', (job_id, slot)).fetchone()
+        return row is not None
+
+    def mark_sent(self, job_id, slot, sent_at=None):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO sent (job_id, slot, sent_at) VALUES (?, ?, ?)',
+            (job_id, slot, _timestamp(sent_at)))
+
+    def claim(self, job_id, slot, sent_at=None):
+        cursor = self.conn.execute(
+            'INSERT OR IGNORE INTO sent (job_id, slot, sent_at) VALUES (?, ?, ?)',
+            (job_id, slot, _timestamp(sent_at)))
+        return cursor.rowcount == 1
+
+    def last_sent(self, job_id):
+        row = self.conn.execute(
+            'SELECT slot, sent_at FROM sent WHERE job_id = ? ORDER BY rowid DESC LIMIT 1',
+            (job_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def close(self):
+        self.conn.close()
+
+
+class JsonStateStore(StateStore):
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'sent': {}}
+
+    def _write(self, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _record(self, data, job_id, slot, sent_at):
+        slots = data['sent'].setdefault(job_id, {})
+        slots.pop(slot, None)  # re-insert so it becomes the latest
+        slots[slot] = _timestamp(sent_at)
+        while len(slots) > JSON_MAX_SLOTS_PER_JOB:
+            del slots[next(iter(slots))]
+
+    def was_sent(self, job_id, slot):
+        return slot in self._read()['sent'].get(job_id, {})
+
+    def mark_sent(self, job_id, slot, sent_at=None):
+        with self._locked():
+            data = self._read()
+            self._record(data, job_id, slot, sent_at)
+            self._write(data)
+
+    def claim(self, job_id, slot, sent_at=None):
+        with self._locked():
+            data = self._read()
+            if slot in data['sent'].get(job_id, {}):
+                return False
+            self._record(data, job_id, slot, sent_at)
+            self._write(data)
+            return True
+
+    def last_sent(self, job_id):
+        slots = self._read()['sent'].get(job_id, {})
+        if not slots:
+            return None
+        slot = next(reversed(list(slots)))
+        return slot, slots[slot]
+
+
+def open_state_store(path=None, backend=None):
+    backend = backend or os.environ.get('STATE_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteStateStore(path or os.environ.get('STATE_PATH', os.path.join(DEFAULT_STATE_DIR, 'state.db')))
+    if backend == 'json':
+        return JsonStateStore(path or os.environ.get('STATE_PATH', os.path.join(DEFAULT_STATE_DIR, 'state.json')))
+    raise ValueError(f"Unknown state backend: {backend}")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The scripts are flat modules in the repo root; the synthetic docs and
+# fake services used by the benchmarks live in benchmarks/
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
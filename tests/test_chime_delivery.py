@@ -0,0 +1,49 @@
+import logging
+import socket
+
+import pytest
+
+from chime_delivery import DeliveryQueue
+from fake_services import FakeServices
+from http_session import HttpTransport
+from outbox import DONE, PENDING, Outbox, deliver_pending
+
+
+def test_failed_delivery_keeps_the_token_out_of_the_error(caplog):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    url = f'http://127.0.0.1:{port}/incomingwebhooks/abc123?token=s3cr3t'
+    queue = DeliveryQueue(transport=HttpTransport(max_retries=0), rate=1000, burst=10)
+    with caplog.at_level(logging.DEBUG):
+        delivery = queue.send(url, 'hello')
+    assert not delivery.ok
+    assert delivery.error.startswith('ConnectionError')
+    assert 's3cr3t' not in delivery.error
+    assert 'incomingwebhooks' not in delivery.error
+    assert 's3cr3t' not in caplog.text
+
+
+@pytest.mark.parametrize('status, ok', [(200, True), (201, True), (202, True), (204, True), (302, False)])
+def test_any_2xx_completes_the_outbox_row(status, ok):
+    with FakeServices() as services, Outbox(':memory:') as outbox:
+        services.post_status = status
+        outbox.add([('job', '2024-01-08 10:00', services.webhook_url('room'), 'hello')])
+        queue = DeliveryQueue(transport=HttpTransport(max_retries=0), rate=1000, burst=10)
+        delivered = deliver_pending(outbox, queue)
+        assert [delivered_ok for _, delivered_ok in delivered] == [ok]
+        assert outbox.entries()[0]['status'] == (DONE if ok else PENDING)
+        assert outbox.has_pending() == (not ok)
+
+
+def test_log_report_clears_the_deliveries(caplog):
+    with FakeServices() as services:
+        queue = DeliveryQueue(transport=HttpTransport(max_retries=0), rate=1000, burst=10)
+        queue.send(services.webhook_url('room'), 'hello')
+        queue.send(services.webhook_url('room'), 'hello again')
+        with caplog.at_level(logging.INFO):
+            queue.log_report()
+        assert '2 messages' in caplog.text
+        assert queue.delivered == []
+        # The rate limit carries over to the next report
+        assert list(queue.buckets) == [services.webhook_url('room')]
@@ -0,0 +1,111 @@
+import random
+import re
+
+import pytest
+
+from chime_reminder import extract_content, format_message
+from html_backends import section_items
+from synthetic_docs import DAYS, daily_reminder_doc
+
+# The default daily_sections.json must read and print a doc exactly as the
+# hard-coded extraction it replaced. reference_sections and
+# reference_message are that code, minus the logging.
+
+
+@pytest.fixture(autouse=True)
+def default_sections(monkeypatch):
+    monkeypatch.delenv('DAILY_SECTIONS_PATH', raising=False)
+
+
+def reference_sections(items):
+    sections = {
+        'joke': {day: [] for day in DAYS},
+        'qa_tip': {day: [] for day in DAYS},
+        'important': {day: [] for day in DAYS},
+        'metrics': [],
+        'link': []
+    }
+    current_section = None
+    for text in items:
+        if 'joke of the day' in text.lower():
+            current_section = 'joke'
+            continue
+        elif 'qa tip of the day' in text.lower():
+            current_section = 'qa_tip'
+            continue
+        elif 'important reminder' in text.lower():
+            current_section = 'important'
+            continue
+        elif 'metrics goals' in text.lower():
+            current_section = 'metrics'
+            continue
+
+        if current_section:
+            day_match = re.match(r'\((Sunday|Monday|Tuesday|Wednesday|Thursday|Friday|Saturday)\)', text)
+            if day_match:
+                content = re.sub(r'\([^)]*\)\s*', '', text).strip()
+                if current_section in ['joke', 'qa_tip', 'important']:
+                    sections[current_section][day_match.group(1)].append(content)
+            elif current_section == 'metrics':
+                if 'remember to use the following link' in text.lower():
+                    sections['link'].append(text)
+                else:
+                    sections['metrics'].append(text)
+            else:
+                for day_items in sections[current_section].values():
+                    day_items.append(text.strip())
+    return sections
+
+
+def reference_message(sections, current_day):
+    parts = ["🔔 **Daily Team Reminder**\n\n"]
+    for key, heading in (('joke', "😄 **Joke of the Day**\n"),
+                         ('qa_tip', "💡 **QA Tip of the Day**\n"),
+                         ('important', "⚠️ **Important Reminder**\n")):
+        if sections[key][current_day]:
+            parts.append(heading)
+            parts.extend(f"• {item}\n" for item in sections[key][current_day])
+            parts.append("\n")
+    if sections['metrics']:
+        parts.append("📊 **Metrics Goals**\n")
+        for metric in sections['metrics']:
+            if ':' in metric:
+                key, value = metric.split(':', 1)
+                parts.append(f"• *{key.strip()}*: {value.strip()}\n")
+            else:
+                parts.append(f"• {metric}\n")
+        parts.append("\n")
+    if sections['link']:
+        parts.extend(f"🔗 {link}\n" for link in sections['link'])
+        parts.append("\n")
+    parts.append("-------------------\n")
+    parts.append("Have a great day! 🌟")
+    return ''.join(parts).strip()
+
+
+# Headers in other cases and mid-sentence, several headers in one item,
+# unknown or malformed day tags, extra parentheses and blank padding
+ITEM_POOL = [
+    'Joke of the Day', 'JOKE OF THE DAY!', 'x qa tip of the day y', 'Important Reminder', 'Metrics Goals',
+    '(Monday) hi (there) you', '(monday) lower', '(Funday) x', 'Remember to use the following link: a',
+    'REMEMBER TO USE THE FOLLOWING LINK', 'k: v', ' spaced ', 'multi\nline joke of the day', '(Tuesday)',
+    '(Monday) Joke of the Day', 'plain', '(Sunday) a:b', '(Mondayy', '(Monday', 'Monday)',
+    'Metrics goals and Joke of the Day',
+]
+
+
+def item_lists():
+    for seed in range(20):
+        yield section_items(daily_reminder_doc(30_000, items_per_day=seed % 3 + 1, seed=seed))
+    rng = random.Random(1)
+    for _ in range(300):
+        yield [rng.choice(ITEM_POOL) for _ in range(rng.randint(0, 30))]
+
+
+@pytest.mark.parametrize('items', list(item_lists()))
+def test_default_sections_match_the_hard_coded_reader(items):
+    expected = reference_sections(items)
+    sections = extract_content(None, items=items)
+    assert sections == expected
+    for day in DAYS:
+        assert format_message(sections, day) == reference_message(expected, day)
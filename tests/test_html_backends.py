@@ -0,0 +1,51 @@
+import pytest
+
+from html_backends import DEFAULT_BACKEND, available_backends, default_backend, section_items
+from synthetic_docs import daily_reminder_doc
+
+REFERENCE = 'html.parser'
+
+EDGE_CASES = [
+    # No section list at all
+    '<h1>Daily Reminder</h1><ul><li>not in a section</li></ul>',
+    # Entities, inline markup, comments and line breaks inside items
+    '<div data-section-style="5"><ul><li>Fish &amp; chips <b>bold</b> &lt;tag&gt;</li>'
+    '<li>a<!-- hidden -->b</li><li> spaced\n  out </li><li><a href="x">link</a> text</li></ul></div>',
+    # Single-quoted and unquoted attribute, and a nested list
+    "<div class='x' data-section-style='5'><ul><li>one<ul><li>nested</li></ul></li><li>two</li></ul></div>",
+    '<p>before</p><div data-section-style=5><ul><li>(Monday) tagged</li></ul></div><p>after</p>',
+]
+
+
+def docs():
+    for seed, size in enumerate([2_000, 30_000, 200_000]):
+        for history_first in (False, True):
+            yield daily_reminder_doc(size, items_per_day=seed + 1, history_first=history_first, seed=seed)
+
+
+DOCS = list(docs()) + EDGE_CASES
+OTHERS = [name for name in available_backends() if name != REFERENCE]
+
+
+@pytest.mark.parametrize('backend', OTHERS)
+@pytest.mark.parametrize('html', DOCS, ids=range(len(DOCS)))
+def test_backends_extract_the_same_items(backend, html):
+    assert section_items(html, backend) == section_items(html, REFERENCE)
+
+
+def test_synthetic_docs_have_items():
+    # Docs over STREAM_CHUNK_SIZE are fed to the stream backend in chunks
+    assert all(section_items(html, DEFAULT_BACKEND) for html in DOCS[:6])
+    assert len(DOCS[4]) > 64 * 1024
+
+
+def test_stream_is_the_default(monkeypatch):
+    monkeypatch.delenv('HTML_PARSER_BACKEND', raising=False)
+    assert default_backend() == 'stream'
+    # Needs nothing beyond the standard library
+    assert 'stream' in available_backends()
+
+
+def test_unknown_backend_is_refused():
+    with pytest.raises(ValueError):
+        section_items('<p></p>', 'nope')
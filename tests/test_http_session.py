@@ -0,0 +1,118 @@
+import logging
+import socket
+
+import pytest
+import requests
+
+from fake_services import FakeServices
+from http_session import HttpTransport
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        services.add_doc('doc', '<p>hi</p>')
+        yield services
+
+
+@pytest.fixture
+def transport():
+    transport = HttpTransport(max_retries=3, backoff_base=0.01)
+    transport.delays = []
+    transport.sleep = transport.delays.append
+    return transport
+
+
+def test_get_retries_5xx_then_succeeds(services, transport):
+    services.fail(503, times=2)
+    response = transport.get(services.quip_url + '/threads/doc')
+    assert response.status_code == 200
+    assert response.retries == 2
+    assert len(services.requests) == 3
+
+
+def test_get_gives_up_after_max_retries(services, transport):
+    services.fail(502, times=10)
+    response = transport.get(services.quip_url + '/threads/doc')
+    assert response.status_code == 502
+    assert response.retries == 3
+    assert len(services.requests) == 4
+
+
+def test_retry_after_sets_the_delay(services, transport):
+    services.fail(429, headers={'Retry-After': '7'})
+    response = transport.get(services.quip_url + '/threads/doc')
+    assert response.status_code == 200
+    assert transport.delays == [7.0]
+
+
+def test_retry_after_is_capped(services, transport):
+    transport.backoff_max = 2.0
+    services.fail(503, headers={'Retry-After': '120'})
+    transport.get(services.quip_url + '/threads/doc')
+    assert transport.delays == [2.0]
+
+
+def test_backoff_without_retry_after_stays_under_the_cap(services, transport):
+    services.fail(500, times=3)
+    transport.get(services.quip_url + '/threads/doc')
+    assert len(transport.delays) == 3
+    for attempt, delay in enumerate(transport.delays):
+        assert 0 <= delay <= transport.backoff_base * 2 ** attempt
+
+
+@pytest.mark.parametrize('status', [500, 502, 503, 504])
+def test_post_is_not_retried_on_5xx(services, transport, status):
+    # The post may have been delivered before the error, so resending it
+    # could post the message twice
+    services.fail(status)
+    response = transport.post(services.webhook_url('room'), json={'Content': 'hi'})
+    assert response.status_code == status
+    assert response.retries == 0
+    assert services.requests == [('POST', '/webhook/room')]
+    assert services.posts == []
+
+
+def test_post_is_retried_on_429(services, transport):
+    services.fail(429, headers={'Retry-After': '1'})
+    response = transport.post(services.webhook_url('room'), json={'Content': 'hi'})
+    assert response.status_code == 200
+    assert transport.delays == [1.0]
+    assert services.posts == [('/webhook/room', {'Content': 'hi'})]
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_post_is_retried_when_the_connection_is_refused(transport):
+    # Nothing was sent, so trying again can't post twice
+    url = f'http://127.0.0.1:{closed_port()}/webhook/room'
+    with pytest.raises(requests.ConnectionError):
+        transport.post(url, json={'Content': 'hi'})
+    assert len(transport.delays) == 3
+    assert [metric['attempt'] for metric in transport.metrics] == [0, 1, 2, 3]
+
+
+def test_post_is_not_retried_after_a_read_timeout(transport):
+    # The server accepts the connection and reads the request but never
+    # answers: the post may have gone through
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        transport.timeout = (1.0, 0.2)
+        with pytest.raises(requests.ReadTimeout):
+            transport.post(f'http://127.0.0.1:{server.getsockname()[1]}/webhook/room', json={'Content': 'hi'})
+    assert transport.delays == []
+    assert len(transport.metrics) == 1
+
+
+def test_log_metrics_clears_the_metrics(services, transport, caplog):
+    transport.get(services.quip_url + '/threads/doc')
+    transport.get(services.quip_url + '/threads/doc')
+    with caplog.at_level(logging.INFO):
+        transport.log_metrics()
+    assert '2 requests' in caplog.text
+    assert transport.metrics == []
@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from chime_delivery import DeliveryQueue
+from fake_services import FakeServices
+from http_session import HttpTransport
+from outbox import DONE, EXPIRED, PENDING, SENDING, Outbox, deliver_pending, record_sent, send_due
+from reminder_log import RunRecord
+from run_context import RunContext
+from state_store import open_state_store
+
+SLOT = '2024-01-08 10:00'
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        yield services
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def outbox(clock):
+    with Outbox(':memory:', lease_seconds=300, max_age_hours=6, clock=clock) as outbox:
+        yield outbox
+
+
+def queue():
+    return DeliveryQueue(transport=HttpTransport(max_retries=0), rate=1000, burst=10)
+
+
+def test_failed_post_stays_pending_until_it_goes_through(services, outbox):
+    outbox.add([('job', SLOT, services.webhook_url('room'), 'hello')])
+    services.fail(503)
+    assert [ok for _, ok in deliver_pending(outbox, queue())] == [False]
+    row = outbox.entries()[0]
+    assert (row['status'], row['attempts'], row['last_error']) == (PENDING, 1, 'status 503')
+    assert not outbox.is_done('job', SLOT)
+
+    assert [ok for _, ok in deliver_pending(outbox, queue())] == [True]
+    row = outbox.entries()[0]
+    assert (row['status'], row['attempts']) == (DONE, 2)
+    assert outbox.is_done('job', SLOT)
+    assert len(services.posts) == 1
+
+
+def test_expired_lease_is_reclaimed(outbox, clock):
+    outbox.add([('job', SLOT, 'https://chime.invalid/room', 'hello')])
+    assert len(outbox.claim_pending()) == 1
+    assert outbox.entries()[0]['status'] == SENDING
+    # Held by a run that may still be posting it
+    assert outbox.claim_pending() == []
+    assert not outbox.has_pending()
+    clock.now += 301
+    # That run died: the row is picked up again
+    assert outbox.has_pending()
+    assert len(outbox.claim_pending()) == 1
+    assert outbox.entries()[0]['attempts'] == 2
+
+
+def test_row_older_than_max_age_is_dropped(outbox, clock):
+    outbox.add([('job', SLOT, 'https://chime.invalid/room', 'hello')])
+    clock.now += 6 * 3600 + 1
+    assert outbox.claim_pending() == []
+    assert outbox.entries()[0]['status'] == EXPIRED
+    assert not outbox.has_pending()
+
+
+def test_slot_and_webhook_are_queued_once(outbox):
+    assert outbox.add([('job', SLOT, 'https://chime.invalid/a', 'hello')]) == 1
+    # Rendered again, even with different content: the first row stays
+    assert outbox.add([('job', SLOT, 'https://chime.invalid/a', 'hello again')]) == 0
+    assert outbox.add([('job', SLOT, 'https://chime.invalid/b', 'hello'),
+                       ('job', '2024-01-08 14:00', 'https://chime.invalid/a', 'hello')]) == 2
+    assert [row['message'] for row in outbox.entries(job_id='job') if row['webhook'].endswith('/a')] == \
+        ['hello', 'hello']
+
+
+def test_slot_is_recorded_once_every_webhook_is_done(services, outbox, tmp_path):
+    outbox.add([('job', SLOT, services.webhook_url('a'), 'hello'),
+                ('job', SLOT, services.webhook_url('b'), 'hello')])
+    services.fail(500)
+    with open_state_store(str(tmp_path / 'state.db')) as state_store:
+        assert record_sent(outbox, state_store, deliver_pending(outbox, queue())) == []
+        assert not state_store.was_sent('job', SLOT)
+        assert record_sent(outbox, state_store, deliver_pending(outbox, queue())) == [('job', SLOT)]
+        assert state_store.was_sent('job', SLOT)
+
+
+def test_send_due_retries_outside_the_window_without_sending_twice(services, tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTBOX_PATH', str(tmp_path / 'outbox.db'))
+    monkeypatch.setenv('STATE_PATH', str(tmp_path / 'state.db'))
+    monkeypatch.delenv('FORCE_SEND', raising=False)
+    monkeypatch.delenv('STATE_BACKEND', raising=False)
+    webhook = services.webhook_url('room')
+    renders = []
+
+    def render():
+        renders.append(len(renders))
+        return 'hello'
+
+    def run_at(hour, minute):
+        # 10:00 Pacific is 18:00 UTC in January
+        now = datetime(2024, 1, 8, hour + 8, minute, tzinfo=timezone.utc)
+        send_due(RunRecord('job'), RunContext(now, 'America/Los_Angeles', [(10, 0)]), 'job', webhook, render)
+
+    services.fail(503, method='POST')
+    run_at(10, 5)
+    assert (renders, services.posts) == ([0], [])
+    # Outside the window the pending row is posted, without rendering again
+    run_at(11, 20)
+    assert renders == [0]
+    assert [payload for _, payload in services.posts] == [{'Content': 'hello'}]
+    # Later in the same window: already sent
+    run_at(10, 50)
+    run_at(12, 0)
+    assert renders == [0]
+    assert len(services.posts) == 1
+    with open_state_store() as state_store:
+        assert state_store.was_sent('job', SLOT)
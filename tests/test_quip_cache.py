@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from fake_services import FakeServices
+from http_session import HttpTransport
+from quip_cache import QuipThreadCache
+from quip_client import SimpleQuipClient
+
+HTML = '<h1>Daily Reminder</h1><ul><li>one</li></ul>'
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        services.add_doc('doc', HTML, updated_usec=1)
+        yield services
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = QuipThreadCache(str(tmp_path))
+    # Every file the cache writes, in order
+    cache.writes = []
+    write_text = cache._write_text
+
+    def recording_write(path, text):
+        cache.writes.append(os.path.basename(path))
+        write_text(path, text)
+
+    cache._write_text = recording_write
+    return cache
+
+
+def client(services, cache):
+    return SimpleQuipClient('token', cache=cache, transport=HttpTransport(max_retries=0),
+                            base_url=services.quip_url)
+
+
+def test_not_modified_reuses_the_cached_html_without_writing(services, cache):
+    assert client(services, cache).get_thread('doc')['html'] == HTML
+    assert cache.writes == ['doc.html', 'doc.json']
+    assert cache.load('doc')['etag'] == '"doc-1"'
+
+    cache.writes = []
+    response = client(services, cache).get_thread('doc')
+    assert response['html'] == HTML
+    assert response['thread']['updated_usec'] == 1
+    assert cache.stats['not_modified'] == 1
+    assert cache.stats['bytes_saved'] == len(HTML)
+    assert cache.writes == []
+
+
+def test_changed_revision_replaces_the_html_and_drops_extracts(services, cache):
+    client(services, cache).get_thread('doc')
+    cache.put_extract('doc', 'sections', {'joke': ['a']})
+    assert cache.get_extract('doc', 'sections') == {'joke': ['a']}
+
+    services.add_doc('doc', HTML.replace('one', 'two'), updated_usec=2)
+    assert client(services, cache).get_thread('doc')['html'] == HTML.replace('one', 'two')
+    assert cache.get_extract('doc', 'sections') is None
+    assert cache.load('doc')['revision'] == 2
+    assert cache.stats['misses'] == 2
+    with open(cache._html_path('doc'), encoding='utf-8') as f:
+        assert f.read() == HTML.replace('one', 'two')
+
+
+def test_bulk_response_for_the_same_revision_keeps_the_validators(services, cache):
+    client(services, cache).get_thread('doc')
+    cache.put_extract('doc', 'sections', {'joke': ['a']})
+    cache.writes = []
+    # Bulk responses carry no ETag
+    cache.store('doc', services.thread_json('doc'))
+    assert cache.writes == []
+    assert cache.load('doc')['etag'] == '"doc-1"'
+    assert cache.get_extract('doc', 'sections') == {'joke': ['a']}
+
+
+def test_legacy_entry_with_inline_html_is_converted(services, cache):
+    # Entries used to keep the HTML in the response, with no .html file
+    legacy = {'thread_id': 'doc', 'revision': 1, 'etag': '"doc-1"', 'last_modified': None,
+              'validated_at': 0, 'response': services.thread_json('doc'),
+              'extracts': {'sections': {'joke': ['a']}}, 'sections': {}}
+    with open(cache._path('doc'), 'w') as f:
+        json.dump(legacy, f)
+
+    # No validators are sent without the HTML file, so this is a full 200
+    assert cache.conditional_headers(cache.load('doc')) == {}
+    assert client(services, cache).get_thread('doc')['html'] == HTML
+    assert cache.stats['not_modified'] == 0
+    entry = cache.load('doc')
+    assert 'html' not in entry['response']
+    assert entry['etag'] == '"doc-1"'
+    # Same revision, so the derived results are still good
+    assert cache.get_extract('doc', 'sections') == {'joke': ['a']}
+
+    assert client(services, cache).get_thread('doc')['html'] == HTML
+    assert cache.stats['not_modified'] == 1
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from fake_services import FakeServices
+from http_session import HttpTransport
+from outbox import Outbox
+from quip_client import SimpleQuipClient
+from reminder_runner import FanOutRunner, Job
+from state_store import open_state_store
+from synthetic_docs import daily_reminder_doc
+
+DOC_IDS = [f'doc{index}' for index in range(7)]
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        for index, doc_id in enumerate(DOC_IDS):
+            services.add_doc(doc_id, daily_reminder_doc(2_000, seed=index))
+        yield services
+
+
+def client(services):
+    return SimpleQuipClient('token', transport=HttpTransport(max_retries=0), base_url=services.quip_url)
+
+
+def bulk_requests(services):
+    # The ids of every bulk request, in order
+    return [parse_qs(urlparse(path).query)['ids'][0].split(',')
+            for method, path in services.requests if '?ids=' in path]
+
+
+def test_ids_are_fetched_in_chunks_of_quip_batch_size(services, monkeypatch):
+    monkeypatch.setenv('QUIP_BATCH_SIZE', '3')
+    threads, failed = client(services).get_threads(DOC_IDS + ['doc0'])
+    assert bulk_requests(services) == [DOC_IDS[0:3], DOC_IDS[3:6], DOC_IDS[6:]]
+    assert failed == {}
+    assert sorted(threads) == DOC_IDS
+    assert threads['doc4']['html'] == services.docs['doc4']['html']
+    assert threads['doc4']['thread']['id'] == 'doc4'
+
+
+def test_batch_size_argument_wins_over_the_environment(services, monkeypatch):
+    monkeypatch.setenv('QUIP_BATCH_SIZE', '3')
+    client(services).get_threads(DOC_IDS, batch_size=5)
+    assert [len(ids) for ids in bulk_requests(services)] == [5, 2]
+
+
+def test_missing_and_failed_docs_are_reported(services):
+    services.bulk_omit.add('doc1')
+    services.fail(503)
+    threads, failed = client(services).get_threads(DOC_IDS + ['ghost'], batch_size=4)
+    # The first chunk got the 503; in the second, doc5 was left out and
+    # ghost doesn't exist
+    assert failed == {'doc0': 'status 503', 'doc1': 'status 503', 'doc2': 'status 503',
+                      'doc3': 'status 503', 'ghost': 'not returned'}
+    assert sorted(threads) == ['doc4', 'doc5', 'doc6']
+
+
+def test_runner_fetches_docs_missing_from_the_bulk_response_alone(services, tmp_path, monkeypatch):
+    monkeypatch.setenv('CHIME_RATE_PER_SECOND', '1000')
+    monkeypatch.setenv('CHIME_BURST', '1000')
+    services.bulk_omit.add('doc2')
+    jobs = [Job.from_dict({'id': doc_id, 'doc_id': doc_id, 'webhooks': [services.webhook_url(doc_id)],
+                           'schedule': {'times': ['10:00']}}) for doc_id in DOC_IDS[:4]]
+    transport = HttpTransport(max_retries=0)
+    with open_state_store(str(tmp_path / 'state.db')) as state_store:
+        runner = FanOutRunner(jobs, client(services), transport, state_store, outbox=Outbox(':memory:'),
+                              batch_fetch=True)
+        now = datetime(2024, 1, 8, 18, 0, tzinfo=timezone.utc)
+        outcome = asyncio.run(runner.run_due([(job, '2024-01-08 10:00') for job in jobs], now))
+        runner.close()
+    assert outcome == {doc_id: True for doc_id in DOC_IDS[:4]}
+    gets = [path for method, path in services.requests if method == 'GET']
+    assert bulk_requests(services) == [DOC_IDS[:4]]
+    assert gets[1:] == ['/1/threads/doc2']
+    assert sorted(path for path, _ in services.posts) == [f'/webhook/{doc_id}' for doc_id in DOC_IDS[:4]]
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+import chime_reminder
+import chime_reminder_1
+from quip_cache import QuipThreadCache
+from quip_client import SimpleQuipClient
+from quip_sections import split_sections
+from synthetic_docs import daily_reminder_doc, roster_doc
+
+EDGE_CASES = [
+    '',
+    'text only',
+    'lead <p id="a">one</p> mid <p>two</p> tail',
+    '<!-- c --><h1>t</h1><!-- <p>not a tag</p> --><p>x</p>',
+    '<div><div><div>nested</div></div><p>same</p></div><div>next</div>',
+    '<br><hr/><img src="a>b.png"><p>after void</p>',
+    '<p title="a > b" data-x=\'</p>\'>quoted</p><p>x</p>',
+    '<script>if (a < b) document.write("<div>")</script><div>after</div>',
+    '</p>stray end<p>x</p>',
+    '<ul><li>unclosed<li>items',
+    '<DIV>upper</div><Div>mixed</DIV>',
+    '<p>multi\nline\n</p>\n<p>\n</p>',
+]
+
+
+@pytest.fixture(autouse=True)
+def default_config(monkeypatch):
+    for name in ('ROSTER_LAYOUT_PATH', 'DAILY_SECTIONS_PATH', 'ROSTER_TASKS_PATH'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def docs():
+    for seed in range(20):
+        yield 'daily', daily_reminder_doc(20_000, items_per_day=seed % 3 + 1, history_first=seed % 2 == 1, seed=seed)
+        yield 'roster', roster_doc(rows_per_sweep=5 + seed, sweeps=3 + seed % 3, extra_columns=seed % 2, seed=seed)
+
+
+DOCS = list(docs())
+
+
+@pytest.mark.parametrize('html', EDGE_CASES + [html for _, html in DOCS], ids=range(len(EDGE_CASES) + len(DOCS)))
+def test_sections_join_back_into_the_document(html):
+    assert ''.join(split_sections(html)) == html
+
+
+def edit_section(html, index):
+    # Adds a word to the first item, name or cell of one top-level section
+    sections = split_sections(html)
+    section = sections[index]
+    for marker in ('(Monday) ', 'Lead0 ', '<li>', '<td>', '>'):
+        position = section.find(marker)
+        if position >= 0:
+            position += len(marker)
+            sections[index] = section[:position] + 'Edited ' + section[position:]
+            break
+    return ''.join(sections)
+
+
+def data_section(html, kind):
+    # Index of the section holding the reminder list or the roster
+    marker = 'Joke of the Day' if kind == 'daily' else 'Morning Sweep'
+    return next(index for index, section in enumerate(split_sections(html)) if marker in section)
+
+
+def full_extract(kind, html):
+    if kind == 'daily':
+        return chime_reminder.extract_content(html)
+    return chime_reminder_1.build_roster_index(BeautifulSoup(html, 'html.parser'))
+
+
+def incremental_extract(client, kind, html):
+    thread = {'html': html}
+    if kind == 'daily':
+        results = client.extract_sections('doc', thread, 'section_list', chime_reminder.section_list_items)
+        items = next((result for result in results if result is not None), [])
+        return chime_reminder.extract_content(html, items=items)
+    return chime_reminder_1.index_from_events(
+        client.extract_sections('doc', thread, 'roster_events', chime_reminder_1.section_roster_events))
+
+
+@pytest.mark.parametrize('kind, html', DOCS, ids=[f'{kind}-{index // 2}' for index, (kind, _) in enumerate(DOCS)])
+def test_incremental_extraction_after_an_edit_matches_a_full_one(kind, html, tmp_path):
+    cache = QuipThreadCache(str(tmp_path))
+    # Section results are kept in the thread's cache entry
+    cache.store('doc', {'thread': {'updated_usec': 1}, 'html': html})
+    client = SimpleQuipClient('token', cache=cache, incremental=True)
+    assert incremental_extract(client, kind, html) == full_extract(kind, html)
+
+    rng = random.Random(len(html))
+    edited = edit_section(html, data_section(html, kind))
+    edited = edit_section(edited, rng.randrange(len(split_sections(edited))))
+    for revision in (edited, html):
+        extracted = cache.stats['sections_extracted']
+        assert incremental_extract(client, kind, revision) == full_extract(kind, revision)
+        # Only the edited sections were extracted again
+        assert cache.stats['sections_extracted'] - extracted <= 2
+    assert full_extract(kind, edited) != full_extract(kind, html)
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import reminder_runner
+from fake_services import FakeServices
+from http_session import HttpTransport
+from outbox import Outbox
+from quip_client import SimpleQuipClient
+from reminder_runner import FanOutRunner, Job, extract_daily, format_daily
+from state_store import open_state_store
+from synthetic_docs import daily_reminder_doc, roster_doc
+
+MONDAY_10_PACIFIC = datetime(2024, 1, 8, 18, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        services.add_doc('doc', daily_reminder_doc(5_000, seed=1))
+        services.add_doc('daily2', daily_reminder_doc(5_000, seed=2))
+        services.add_doc('roster', roster_doc(seed=3))
+        yield services
+
+
+@pytest.fixture
+def state_store(tmp_path):
+    with open_state_store(str(tmp_path / 'state.db')) as state_store:
+        yield state_store
+
+
+@pytest.fixture(autouse=True)
+def fast_chime(monkeypatch):
+    monkeypatch.setenv('CHIME_RATE_PER_SECOND', '1000')
+    monkeypatch.setenv('CHIME_BURST', '1000')
+    for name in ('ROSTER_LAYOUT_PATH', 'ROSTER_TASKS_PATH', 'DAILY_SECTIONS_PATH'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def make_runner(services, state_store, jobs, **kwargs):
+    transport = HttpTransport(max_retries=0)
+    client = SimpleQuipClient('token', transport=transport, base_url=services.quip_url)
+    return FanOutRunner(jobs, client, transport, state_store, outbox=Outbox(':memory:'), **kwargs)
+
+
+def make_job(services, job_id, **kwargs):
+    data = {'id': job_id, 'doc_id': 'doc', 'webhooks': [services.webhook_url(job_id)],
+            'schedule': {'times': ['10:00']}}
+    data.update(kwargs)
+    return Job.from_dict(data)
+
+
+def test_render_memo_is_bounded(services, state_store, monkeypatch):
+    # A formatter without a render key renders per minute; the memo keeps
+    # only the latest RENDER_MEMO_SIZE of them
+    monkeypatch.setattr(reminder_runner, 'RENDER_MEMO_SIZE', 5)
+    job = make_job(services, 'custom', formatter='reminder_runner:format_daily')
+    runner = make_runner(services, state_store, [job])
+    start = MONDAY_10_PACIFIC
+    for minute in range(12):
+        now = start + timedelta(minutes=minute)
+        asyncio.run(runner.run_due([(job, job.slot_key(now))], now))
+    runner.close()
+    [(_, renders)] = runner.rendered.values()
+    assert list(renders) == [job.slot_key(start + timedelta(minutes=minute)) for minute in range(7, 12)]
+    assert len(services.posts) == 12
+
+
+def shared_doc_jobs(services):
+    # Three daily jobs on one doc, a roster job and a daily job on two more
+    jobs = [make_job(services, f'daily-{index}') for index in range(3)]
+    jobs.append(make_job(services, 'roster', doc_id='roster', extractor='roster'))
+    jobs.append(make_job(services, 'other', doc_id='daily2'))
+    return jobs
+
+
+def messages(runner):
+    return {row['job_id']: row['message'] for row in runner.outbox.entries()}
+
+
+def test_each_doc_is_fetched_and_extracted_once_per_tick(services, state_store, monkeypatch):
+    extracted = []
+    for name in ('daily', 'roster'):
+        extract = reminder_runner.EXTRACTORS[name]
+        monkeypatch.setitem(reminder_runner.EXTRACTORS, name,
+                            lambda html, name=name, extract=extract: extracted.append(name) or extract(html))
+    jobs = shared_doc_jobs(services)
+    runner = make_runner(services, state_store, jobs)
+    outcome = asyncio.run(runner.tick(MONDAY_10_PACIFIC))
+    runner.close()
+    assert outcome == {job.job_id: True for job in jobs}
+    gets = sorted(path for method, path in services.requests if method == 'GET')
+    assert gets == ['/1/threads/daily2', '/1/threads/doc', '/1/threads/roster']
+    assert sorted(extracted) == ['daily', 'daily', 'roster']
+    # The three jobs on one doc share a render
+    assert runner.render_stats == {'rendered': 3, 'shared': 2}
+    assert len(services.posts) == len(jobs)
+
+
+def test_process_pool_renders_what_the_threads_render(services, state_store, tmp_path):
+    jobs = shared_doc_jobs(services)
+    renders = []
+    for parse_processes in (0, 2):
+        with open_state_store(str(tmp_path / f'state{parse_processes}.db')) as store:
+            runner = make_runner(services, store, jobs, parse_processes=parse_processes)
+            asyncio.run(runner.tick(MONDAY_10_PACIFIC))
+            runner.close()
+        renders.append(messages(runner))
+    assert renders[0] == renders[1]
+    assert len(renders[0]) == len(jobs)
+
+
+def test_audiences_send_at_their_own_local_times(services, state_store):
+    jobs = Job.list_from_dict({
+        'id': 'team', 'doc_id': 'doc', 'schedule': {'times': ['10:00'], 'window_minutes': 15},
+        'audiences': [
+            {'name': 'tokyo', 'timezone': 'Asia/Tokyo', 'webhooks': [services.webhook_url('tokyo')]},
+            {'name': 'london', 'timezone': 'Europe/London', 'webhooks': [services.webhook_url('london')]},
+            {'name': 'west', 'timezone': 'America/Los_Angeles', 'times': ['17:00'],
+             'webhooks': [services.webhook_url('west')]},
+        ]})
+    runner = make_runner(services, state_store, jobs)
+    sent = {}
+    # Monday 10:00 in Tokyo is Sunday 17:00 in Los Angeles
+    for now in [datetime(2024, 1, 8, 1, 0, tzinfo=timezone.utc),
+                datetime(2024, 1, 8, 10, 5, tzinfo=timezone.utc),
+                datetime(2024, 1, 8, 12, 0, tzinfo=timezone.utc)]:
+        sent[now.hour] = sorted(asyncio.run(runner.tick(now)))
+    runner.close()
+    assert sent == {1: ['team@tokyo', 'team@west'], 10: ['team@london'], 12: []}
+    assert state_store.was_sent('team@tokyo', '2024-01-08 10:00')
+    assert state_store.was_sent('team@west', '2024-01-07 17:00')
+    assert state_store.was_sent('team@london', '2024-01-08 10:00')
+
+    # Each audience gets its own local day's message
+    sections = extract_daily(services.docs['doc']['html'])
+    rendered = messages(runner)
+    tokyo = datetime(2024, 1, 8, 10, 0, tzinfo=timezone.utc)
+    assert rendered['team@tokyo'] == format_daily(sections, tokyo)
+    assert rendered['team@west'] == format_daily(sections, tokyo.replace(day=7))
+    assert rendered['team@tokyo'] != rendered['team@west']
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+import chime_reminder
+import chime_reminder_1
+from daily_sections import DEFAULT_SECTIONS_PATH
+from fake_services import FakeServices
+from reminder_log import RunRecord
+from render_cache import RenderCache, render_key
+from roster_layout import DEFAULT_LAYOUT_PATH
+from synthetic_docs import daily_reminder_doc, roster_doc
+
+WEEK = {render_key('Monday', 'all'): 'Monday message'}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RenderCache(str(tmp_path / 'renders'), max_entries=2)
+
+
+def test_week_is_kept_per_revision(cache):
+    cache.put_week('doc', 'r1', WEEK)
+    assert cache.get_week('doc', 'r1') == WEEK
+    assert cache.get_week('doc', 'r2') is None
+    assert cache.stats == {'hits': 1, 'misses': 1, 'renders': 1}
+
+
+def test_week_is_read_back_from_disk(cache):
+    cache.put_week('doc', 'r1', WEEK)
+    reloaded = RenderCache(cache.cache_dir)
+    assert reloaded.get_week('doc', 'r1') == WEEK
+    # A newer revision replaces the file
+    reloaded.put_week('doc', 'r2', {})
+    assert RenderCache(cache.cache_dir).get_week('doc', 'r1') is None
+
+
+def test_week_without_revision_is_not_cached(cache):
+    cache.put_week('doc', None, WEEK)
+    assert cache.get_week('doc', None) is None
+    assert cache.load('doc') is None
+
+
+def test_memory_is_bounded(cache):
+    for index in range(5):
+        cache.put_week(f'doc{index}', 'r1', WEEK)
+    assert list(cache.memory) == [('doc3', 'r1'), ('doc4', 'r1')]
+
+
+# A changed sections config or roster layout must not be answered from the
+# week rendered with the old one, even though the doc revision is the same
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        services.add_doc('daily', daily_reminder_doc(5_000, seed=1))
+        services.add_doc('roster', roster_doc(seed=2))
+        yield services
+
+
+@pytest.fixture
+def environment(services, tmp_path, monkeypatch):
+    monkeypatch.setenv('QUIP_BASE_URL', services.quip_url)
+    monkeypatch.setenv('QUIP_CACHE_DIR', str(tmp_path / 'quip'))
+    monkeypatch.setenv('RENDER_CACHE_DIR', str(tmp_path / 'renders'))
+    for name in ('DAILY_SECTIONS_PATH', 'ROSTER_LAYOUT_PATH', 'ROSTER_TASKS_PATH', 'QUIP_INCREMENTAL'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(chime_reminder, 'QUIP_API_TOKEN', 'token')
+    monkeypatch.setattr(chime_reminder, 'QUIP_DOC_ID', 'daily')
+    monkeypatch.setattr(chime_reminder_1, 'QUIP_API_TOKEN', 'token')
+    monkeypatch.setattr(chime_reminder_1, 'QUIP_DOCUMENT_ID_1', 'roster')
+
+
+def edited_config(tmp_path, default_path, edit):
+    with open(default_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    edit(config)
+    path = tmp_path / 'edited.json'
+    path.write_text(json.dumps(config), encoding='utf-8')
+    return str(path)
+
+
+def render(module, *args):
+    run = RunRecord('job')
+    message = module.render_message(run, *args)
+    return message, run.record['render_cache_hit']
+
+
+def test_sections_config_change_invalidates_the_week(environment, tmp_path, monkeypatch):
+    first, hit = render(chime_reminder, 'Monday')
+    assert not hit
+    assert render(chime_reminder, 'Monday') == (first, True)
+
+    def retitle(config):
+        config['sections'][0]['title'] = 'Pun of the Day'
+    monkeypatch.setenv('DAILY_SECTIONS_PATH', edited_config(tmp_path, DEFAULT_SECTIONS_PATH, retitle))
+    edited, hit = render(chime_reminder, 'Monday')
+    assert not hit
+    assert 'Pun of the Day' in edited
+    assert edited == first.replace('Joke of the Day', 'Pun of the Day')
+
+
+def test_layout_change_invalidates_the_week(environment, tmp_path, monkeypatch):
+    first, hit = render(chime_reminder_1, 'Monday', 'morning')
+    assert not hit
+    assert render(chime_reminder_1, 'Monday', 'morning') == (first, True)
+
+    def rename_default_role(config):
+        config['default_role'] = 'Specialist'
+    monkeypatch.setenv('ROSTER_LAYOUT_PATH', edited_config(tmp_path, DEFAULT_LAYOUT_PATH, rename_default_role))
+    edited, hit = render(chime_reminder_1, 'Monday', 'morning')
+    assert not hit
+    assert edited != first
+    assert render(chime_reminder_1, 'Monday', 'morning') == (edited, True)
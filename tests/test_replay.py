@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from replay import run_golden
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+
+@pytest.fixture(autouse=True)
+def default_config(monkeypatch):
+    # The goldens were made with the committed layout and sections files
+    for name in ('ROSTER_TASKS_PATH', 'ROSTER_LAYOUT_PATH', 'DAILY_SECTIONS_PATH', 'FORCE_SEND'):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.mark.parametrize('directory, script', [
+    ('daily', 'chime_reminder'),
+    ('roster', 'chime_reminder_1'),
+])
+def test_week_matches_golden(directory, script, capsys):
+    # Messages that differ are printed, so a failure shows the diff
+    failed = run_golden(os.path.join(FIXTURES, directory), script)
+    assert failed == 0, capsys.readouterr().out
@@ -0,0 +1,111 @@
+import csv
+import json
+import random
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from chime_reminder_1 import build_roster_index
+from roster_layout import ANY, load_layout
+from roster_tasks import TaskIndex, read_export, task_counts
+from synthetic_docs import DAYS, TASK_STATUSES, roster_doc
+
+TASK_ROW_RE = re.compile(r'<tr><td>T-\d+</td><td>([^<]*)</td><td>([^<]*)</td><td>([^<]*)</td><td>([^<]*)</td></tr>')
+
+
+@pytest.fixture(autouse=True)
+def default_layout(monkeypatch):
+    monkeypatch.delenv('ROSTER_LAYOUT_PATH', raising=False)
+    monkeypatch.delenv('ROSTER_TASKS_PATH', raising=False)
+
+
+@pytest.fixture
+def layout():
+    return load_layout()
+
+
+def brute_force(rows, layout, sweep, day):
+    # Every row read again: the counts the incremental index must match
+    pending = 0
+    distribution = dict.fromkeys(layout.roles, 0)
+    for status, row_sweep, row_day, assignee in rows:
+        if status.strip().lower() not in layout.pending_statuses:
+            continue
+        if (layout.sweep_named(row_sweep) or ANY) not in (sweep, ANY):
+            continue
+        if layout.day_labels.get(row_day.strip().lower(), ANY) not in (day, ANY):
+            continue
+        pending += 1
+        distribution[layout.role_of(assignee)] += 1
+    return pending, distribution
+
+
+def assert_counts(counts, rows, layout):
+    for sweep in layout.sweeps:
+        for day in layout.days:
+            assert task_counts(counts, sweep, day, layout.roles) == brute_force(rows, layout, sweep, day), (sweep, day)
+
+
+def edit(rng, rows):
+    # A revision: statuses and assignees changed, rows removed, copied and
+    # added, some without a sweep or day
+    rows = list(rows)
+    for _ in range(rng.randint(1, 30)):
+        index = rng.randrange(len(rows))
+        status, sweep, day, assignee = rows[index]
+        change = rng.randrange(5)
+        if change == 0:
+            rows[index] = (rng.choice(TASK_STATUSES), sweep, day, assignee)
+        elif change == 1:
+            rows[index] = (status, sweep, day, assignee + ' [CAPTAIN]' if '[' not in assignee else 'Bob')
+        elif change == 2:
+            del rows[index]
+        elif change == 3:
+            rows.append(rows[index])
+        else:
+            rows.append((rng.choice(TASK_STATUSES), rng.choice(['', 'Morning Sweep', 'night']),
+                         rng.choice(['', 'Mon'] + DAYS), rng.choice(['Ann', 'Cy (CAPTAIN)'])))
+    return rows
+
+
+def test_doc_counts_match_brute_force(layout):
+    html = roster_doc(task_rows=2000, seed=3)
+    index = build_roster_index(BeautifulSoup(html, 'html.parser'), layout)
+    assert_counts(index['tasks'], TASK_ROW_RE.findall(html), layout)
+
+
+def test_incremental_updates_match_a_fresh_index(layout):
+    rng = random.Random(7)
+    rows = TASK_ROW_RE.findall(roster_doc(task_rows=500, seed=5))
+    tasks = TaskIndex()
+    tasks.update(rows, layout)
+    for _ in range(25):
+        rows = edit(rng, rows)
+        # The index is saved and loaded between revisions, as in the snapshot store
+        tasks = TaskIndex(json.loads(json.dumps(tasks.to_json())))
+        tasks.update(rows, layout)
+        fresh = TaskIndex()
+        fresh.update(rows, layout)
+        assert tasks.counts == fresh.counts
+        assert_counts(tasks.counts, rows, layout)
+
+
+def test_exports_match_the_doc_table(layout, tmp_path):
+    html = roster_doc(task_rows=300, seed=11)
+    rows = TASK_ROW_RE.findall(html)
+    expected = build_roster_index(BeautifulSoup(html, 'html.parser'), layout)['tasks']
+
+    csv_path = tmp_path / 'tasks.csv'
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Task', 'Status', 'Sweep', 'Day', 'Assignee'])
+        writer.writerows([f'T-{index}', *row] for index, row in enumerate(rows))
+    json_path = tmp_path / 'tasks.json'
+    json_path.write_text(json.dumps({'tasks': [dict(zip(('status', 'sweep', 'day', 'assignee'), row))
+                                               for row in rows]}), encoding='utf-8')
+
+    for path in (csv_path, json_path):
+        tasks = TaskIndex()
+        tasks.update(read_export(str(path), layout), layout)
+        assert tasks.counts == expected, path.name
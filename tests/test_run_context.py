@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from reminder_runner import Job
+from run_context import RunContext
+
+TZ = 'America/Los_Angeles'
+TIMES = [(1, 30), (2, 30), (10, 0)]
+
+
+def job(window_minutes=60):
+    return Job.from_dict({'id': 'job', 'doc_id': 'doc', 'schedule': {
+        'times': [f'{hour}:{minute:02d}' for hour, minute in TIMES],
+        'timezone': TZ, 'window_minutes': window_minutes}})
+
+
+def every_ten_minutes(day):
+    start = datetime(*day, tzinfo=timezone.utc)
+    return [start + timedelta(minutes=10 * step) for step in range(6 * 36)]
+
+
+# Spring forward (02:30 doesn't exist) and fall back (01:30 happens twice)
+DST_DAYS = [(2024, 3, 10), (2024, 11, 3)]
+
+
+@pytest.mark.parametrize('day', DST_DAYS)
+def test_runner_and_scripts_pick_the_same_slot(day):
+    runner_job = job()
+    for now in every_ten_minutes(day):
+        assert runner_job.due_slot(now) == RunContext(now, TZ, TIMES, runner_job.window).slot, now
+
+
+@pytest.mark.parametrize('day', DST_DAYS)
+def test_scheduler_fires_inside_the_slot_window(day):
+    # The scheduler sends each slot at its next_slot_time; a cron run at
+    # that instant must see the same slot as due
+    runner_job = job()
+    for now in every_ten_minutes(day):
+        fire_at = runner_job.next_slot_time(now)
+        assert fire_at > now
+        assert RunContext(fire_at, TZ, TIMES, runner_job.window).slot == runner_job.slot_key(fire_at)
+        assert runner_job.previous_slot_time(fire_at) == fire_at
+
+
+def test_window_keeps_its_length_across_the_jump():
+    # 02:30 on the spring-forward day is 03:30 PDT; its half hour runs from there
+    runner_job = job(window_minutes=30)
+    jump = datetime(2024, 3, 10, 10, 30, tzinfo=timezone.utc)
+    assert runner_job.due_slot(jump - timedelta(minutes=1)) is None
+    assert runner_job.due_slot(jump) == '2024-03-10 02:30'
+    assert runner_job.due_slot(jump + timedelta(minutes=29)) == '2024-03-10 02:30'
+    assert runner_job.due_slot(jump + timedelta(minutes=30)) is None
@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fake_services import FakeServices
+from http_session import HttpTransport
+from outbox import Outbox
+from quip_client import SimpleQuipClient
+from reminder_runner import FanOutRunner, Job, extract_daily, format_daily
+from scheduler import ReminderScheduler
+from state_store import open_state_store
+from synthetic_docs import daily_reminder_doc
+
+TZ = 'America/Los_Angeles'
+
+
+class FakeClock:
+    # Both the scheduler's clock and its sleep; sleeping moves time on
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += timedelta(seconds=seconds)
+
+
+def local(*args):
+    # A UTC datetime for a wall-clock time in TZ
+    from zoneinfo import ZoneInfo
+    return datetime(*args, tzinfo=ZoneInfo(TZ)).astimezone(timezone.utc)
+
+
+@pytest.fixture
+def services():
+    with FakeServices() as services:
+        services.add_doc('doc', daily_reminder_doc(5_000, seed=1))
+        yield services
+
+
+@pytest.fixture
+def state_store(tmp_path):
+    with open_state_store(str(tmp_path / 'state.db')) as state_store:
+        yield state_store
+
+
+def make_job(services, job_id='daily', times=('10:00', '14:00'), tz=TZ):
+    return Job.from_dict({'id': job_id, 'doc_id': 'doc', 'webhooks': [services.webhook_url(job_id)],
+                          'schedule': {'times': list(times), 'timezone': tz}})
+
+
+def make_scheduler(services, state_store, jobs, clock, **kwargs):
+    transport = HttpTransport(max_retries=0)
+    runner = FanOutRunner(jobs, SimpleQuipClient('token', transport=transport, base_url=services.quip_url),
+                          transport, state_store, outbox=Outbox(':memory:'))
+    return ReminderScheduler(jobs, runner, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def record_calls(scheduler, clock):
+    # (kind, clock at the call, ...) for every prewarm and send
+    calls = []
+    runner = scheduler.runner
+    prewarm, run_due = runner.prewarm, runner.run_due
+
+    async def spy_prewarm(doc_ids):
+        calls.append(('prewarm', clock.now))
+        return await prewarm(doc_ids)
+
+    async def spy_run_due(due, now):
+        calls.append(('send', clock.now, now, [slot for _, slot in due]))
+        return await run_due(due, now)
+
+    runner.prewarm, runner.run_due = spy_prewarm, spy_run_due
+    return calls
+
+
+def run_until(scheduler, clock, until):
+    scheduler.start()
+    while clock.now < until:
+        assert scheduler.run_once()
+    scheduler.runner.close()
+
+
+def test_failed_post_is_retried_on_the_next_wake_up(services, state_store):
+    clock = FakeClock(local(2024, 1, 8, 9, 58))
+    job = make_job(services)
+    scheduler = make_scheduler(services, state_store, [job], clock)
+    services.fail(503, method='POST')
+    run_until(scheduler, clock, local(2024, 1, 8, 10, 2))
+    # The 503 and the retry a wake-up later, well before the 14:00 send
+    assert [method for method, _ in services.requests].count('POST') == 2
+    assert len(services.posts) == 1
+    assert state_store.was_sent(job.job_id, '2024-01-08 10:00')
+
+
+def test_prewarm_comes_before_the_send_and_saves_the_fetch(services, state_store):
+    clock = FakeClock(local(2024, 1, 8, 9, 50))
+    scheduler = make_scheduler(services, state_store, [make_job(services)], clock,
+                               prewarm=timedelta(minutes=3))
+    calls = record_calls(scheduler, clock)
+    run_until(scheduler, clock, local(2024, 1, 8, 10, 5))
+    slot_time = local(2024, 1, 8, 10, 0)
+    assert calls == [('prewarm', local(2024, 1, 8, 9, 57)),
+                     ('send', slot_time, slot_time, ['2024-01-08 10:00'])]
+    # The send used the pre-warmed HTML
+    assert [method for method, _ in services.requests] == ['GET', 'POST']
+    # Reported after the send, so the daemon doesn't keep them
+    assert scheduler.runner.transport.metrics == []
+    assert scheduler.runner.delivery.delivered == []
+    # Never slept past an event, nor longer than a minute
+    assert max(clock.sleeps) <= 60
+
+
+def test_spring_forward_sends_the_gap_slot_once(services, state_store):
+    # 02:30 doesn't exist on 2024-03-10; it is sent at 03:30 PDT
+    clock = FakeClock(local(2024, 3, 10, 0, 0))
+    job = make_job(services, times=('01:30', '02:30'))
+    scheduler = make_scheduler(services, state_store, [job], clock)
+    calls = record_calls(scheduler, clock)
+    run_until(scheduler, clock, local(2024, 3, 10, 6, 0))
+    sends = [(call[1], call[3]) for call in calls if call[0] == 'send']
+    assert sends == [(datetime(2024, 3, 10, 9, 30, tzinfo=timezone.utc), ['2024-03-10 01:30']),
+                     (datetime(2024, 3, 10, 10, 30, tzinfo=timezone.utc), ['2024-03-10 02:30'])]
+    assert len(services.posts) == 2
+
+
+def test_fall_back_sends_the_repeated_hour_once(services, state_store):
+    # 01:30 happens twice on 2024-11-03; only the first one sends
+    clock = FakeClock(local(2024, 11, 3, 0, 0))
+    job = make_job(services, times=('01:30', '09:00'))
+    scheduler = make_scheduler(services, state_store, [job], clock)
+    calls = record_calls(scheduler, clock)
+    run_until(scheduler, clock, local(2024, 11, 3, 8, 0))
+    sends = [(call[1], call[3]) for call in calls if call[0] == 'send']
+    assert sends == [(datetime(2024, 11, 3, 8, 30, tzinfo=timezone.utc), ['2024-11-03 01:30'])]
+
+
+def test_send_missed_by_more_than_max_catchup_is_skipped(services, state_store):
+    clock = FakeClock(local(2024, 1, 8, 9, 58))
+    suspended = []
+
+    def sleep(seconds):
+        # The host is suspended for 45 minutes on the first sleep
+        clock.sleep(seconds + (0 if suspended else 45 * 60))
+        suspended.append(seconds)
+
+    job = make_job(services)
+    scheduler = make_scheduler(services, state_store, [job], clock, max_catchup=timedelta(minutes=30))
+    scheduler.sleep = sleep
+    calls = record_calls(scheduler, clock)
+    run_until(scheduler, clock, local(2024, 1, 8, 11, 0))
+    assert calls == []
+    assert services.posts == []
+    assert not state_store.was_sent(job.job_id, '2024-01-08 10:00')
+    # The next slot is still scheduled
+    assert sorted((when, kind) for when, _, kind, _, _ in scheduler.queue) == [
+        (local(2024, 1, 8, 13, 57), 'prewarm'), (local(2024, 1, 8, 14, 0), 'send')]
+
+
+@pytest.mark.parametrize('late_minutes, caught_up', [(20, True), (45, False)])
+def test_start_catches_up_recent_missed_slots(services, state_store, late_minutes, caught_up):
+    # 23:50 on Monday, started after midnight: the message is still Monday's
+    slot_time = local(2024, 1, 8, 23, 50)
+    clock = FakeClock(slot_time + timedelta(minutes=late_minutes))
+    job = make_job(services, times=('23:50',))
+    scheduler = make_scheduler(services, state_store, [job], clock, max_catchup=timedelta(minutes=30))
+    calls = record_calls(scheduler, clock)
+    scheduler.start()
+    scheduler.runner.close()
+    if not caught_up:
+        assert calls == [] and services.posts == []
+        return
+    assert calls == [('send', clock.now, slot_time, ['2024-01-08 23:50'])]
+    assert state_store.last_sent(job.job_id) == ('2024-01-08 23:50', slot_time.isoformat())
+    sections = extract_daily(services.docs['doc']['html'])
+    monday = slot_time.astimezone(job.timezone)
+    assert [payload['Content'] for _, payload in services.posts] == [format_daily(sections, monday)]
+    assert format_daily(sections, monday + timedelta(days=1)) != format_daily(sections, monday)
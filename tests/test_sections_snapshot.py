@@ -0,0 +1,63 @@
+import pytest
+
+import chime_reminder
+from chime_reminder import extract_content, format_message
+from daily_sections import load_sections
+from fake_services import FakeServices
+from quip_cache import QuipThreadCache
+from reminder_log import RunRecord
+from sections_snapshot import SNAPSHOT_VERSION, pack_sections, unpack_sections
+from synthetic_docs import daily_reminder_doc
+
+HTML = daily_reminder_doc(5_000, seed=1)
+
+
+@pytest.fixture(autouse=True)
+def default_sections(monkeypatch):
+    monkeypatch.delenv('DAILY_SECTIONS_PATH', raising=False)
+
+
+def test_round_trip():
+    sections = extract_content(HTML)
+    snapshot = pack_sections(sections)
+    assert snapshot['version'] == SNAPSHOT_VERSION
+    assert unpack_sections(snapshot) == sections
+    # General items copied into every weekday are stored once
+    assert len(snapshot['items']) == len(set(snapshot['items']))
+
+
+def test_empty_sections_round_trip():
+    sections = load_sections().empty_sections()
+    assert unpack_sections(pack_sections(sections)) == sections
+
+
+@pytest.mark.parametrize('snapshot', [
+    None,
+    {},
+    {'version': SNAPSHOT_VERSION - 1, 'items': ['old'], 'sections': {'metrics': [0]}},
+    {'version': SNAPSHOT_VERSION + 1, 'items': [], 'sections': {}},
+], ids=['missing', 'empty', 'older', 'newer'])
+def test_other_versions_are_ignored(snapshot):
+    assert unpack_sections(snapshot) is None
+
+
+def test_older_snapshot_is_extracted_again(tmp_path, monkeypatch):
+    with FakeServices() as services:
+        services.add_doc('daily', HTML, updated_usec=7)
+        monkeypatch.setenv('QUIP_BASE_URL', services.quip_url)
+        monkeypatch.setenv('QUIP_CACHE_DIR', str(tmp_path / 'quip'))
+        monkeypatch.setenv('RENDER_CACHE_DIR', str(tmp_path / 'renders'))
+        monkeypatch.delenv('QUIP_INCREMENTAL', raising=False)
+        monkeypatch.setattr(chime_reminder, 'QUIP_API_TOKEN', 'token')
+        monkeypatch.setattr(chime_reminder, 'QUIP_DOC_ID', 'daily')
+
+        # A snapshot left for this very revision by an older version
+        revision = f"7+{load_sections().digest}"
+        stale = {'version': SNAPSHOT_VERSION - 1, 'items': ['stale'], 'sections': {'metrics': [0]}}
+        QuipThreadCache().put_snapshot('daily', 'sections', revision, stale)
+
+        message = chime_reminder.render_message(RunRecord('job'), 'Monday')
+
+    assert message == format_message(extract_content(HTML), 'Monday')
+    snapshot = QuipThreadCache().get_snapshot('daily', 'sections', revision)
+    assert snapshot['version'] == SNAPSHOT_VERSION
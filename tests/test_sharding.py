@@ -0,0 +1,32 @@
+import pytest
+
+from sharding import StaticShard, open_shards, parse_shard
+
+JOB_IDS = [f'job-{index}' for index in range(200)]
+
+
+def test_static_shards_split_every_job_exactly_once():
+    shards = [parse_shard(f'{index}/3') for index in range(3)]
+    for job_id in JOB_IDS:
+        assert sum(shard.owns(job_id) for shard in shards) == 1
+    assert all(sum(shard.owns(job_id) for job_id in JOB_IDS) > 40 for shard in shards)
+
+
+def test_static_shard_needs_no_ledger(tmp_path):
+    shard = open_shards(shard='1/2', path=str(tmp_path / 'shards.db'))
+    assert isinstance(shard, StaticShard)
+    assert shard.claim('job-1', 'slot') and shard.claim('job-1', 'slot')
+    assert not shard.refresh()
+    assert not (tmp_path / 'shards.db').exists()
+
+
+@pytest.mark.parametrize('value', ['1', '3/3', '-1/3', 'a/b', '1/0'])
+def test_bad_shards_are_refused(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+
+def test_shard_and_worker_id_are_exclusive():
+    with pytest.raises(ValueError):
+        open_shards('a', shard='0/2')
+
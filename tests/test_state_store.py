@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import pytest
+
+from state_store import StateStore, open_state_store
+
+BACKENDS = {'sqlite': 'state.db', 'json': 'state.json'}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def store_path(request, tmp_path):
+    return request.param, str(tmp_path / BACKENDS[request.param])
+
+
+def claim_and_mark(backend, path, worker, slots):
+    # One writer process: every worker claims the same slots and marks its
+    # own; returns the slots this worker won
+    won = []
+    with open_state_store(path, backend) as store:
+        for slot in range(slots):
+            if store.claim('shared', f'slot-{slot}'):
+                won.append(slot)
+            store.mark_sent(f'worker-{worker}', f'slot-{slot}')
+    return won
+
+
+def test_state_store_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+
+def test_claim_only_once(store_path):
+    backend, path = store_path
+    with open_state_store(path, backend) as store:
+        assert store.claim('job', '2024-01-08 10:00')
+        assert not store.claim('job', '2024-01-08 10:00')
+        assert store.claim('job', '2024-01-08 14:00')
+        assert store.claim('other', '2024-01-08 10:00')
+    # Also across reopening
+    with open_state_store(path, backend) as store:
+        assert not store.claim('job', '2024-01-08 10:00')
+
+
+def test_mark_sent_and_last_sent(store_path):
+    backend, path = store_path
+    sent_at = datetime(2024, 1, 8, 18, 0, tzinfo=timezone.utc)
+    with open_state_store(path, backend) as store:
+        assert not store.was_sent('job', '2024-01-08 10:00')
+        assert store.last_sent('job') is None
+        store.mark_sent('job', '2024-01-08 10:00', sent_at)
+        store.mark_sent('job', '2024-01-08 14:00')
+        assert store.was_sent('job', '2024-01-08 10:00')
+        assert not store.was_sent('other', '2024-01-08 10:00')
+        assert store.last_sent('job')[0] == '2024-01-08 14:00'
+        # Marking again makes it the latest, with the new time
+        store.mark_sent('job', '2024-01-08 10:00', sent_at)
+        assert store.last_sent('job') == ('2024-01-08 10:00', sent_at.isoformat())
+        # A marked slot can't be claimed
+        assert not store.claim('job', '2024-01-08 14:00')
+
+
+def test_concurrent_writers_lose_nothing(store_path):
+    backend, path = store_path
+    workers, slots = 4, 40
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        won = list(executor.map(claim_and_mark, [backend] * workers, [path] * workers,
+                                range(workers), [slots] * workers))
+    # Each shared slot was won by exactly one worker
+    assert sorted(slot for worker_won in won for slot in worker_won) == list(range(slots))
+    # And no worker's marks were overwritten by another's
+    with open_state_store(path, backend) as store:
+        for worker in range(workers):
+            assert all(store.was_sent(f'worker-{worker}', f'slot-{slot}') for slot in range(slots))
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]